@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Alert Engine
+Pumps libtorrent alerts into the asyncio event loop
+"""
+
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional, Set
+
+class AlertEngine:
+    """Dispatches libtorrent alerts to handlers running on the event loop
+
+    libtorrent calls the notify callback from one of its own threads whenever
+    the alert queue goes from empty to non-empty. The callback only wakes the
+    event loop; alerts are popped and dispatched on the loop itself, so the
+    handlers never race with the Telegram command handlers.
+
+    Handlers receive the alert object and may be plain functions or
+    coroutines. Alert objects are only valid until the next pop, so handlers
+    must copy whatever they need before awaiting anything.
+    """
+
+    def __init__(self, session, logger: Optional[logging.Logger] = None, idle_timeout: float = 5.0):
+        self.session = session
+        self.logger = logger or logging.getLogger(__name__)
+        self.idle_timeout = idle_timeout
+        self.handlers: Dict[str, List[Callable]] = {}
+        self.tick_handlers: List[Callable] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._running = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    def on(self, alert_type: str, handler: Callable):
+        """Register a handler for an alert type, e.g. 'torrent_finished_alert'"""
+        self.handlers.setdefault(alert_type, []).append(handler)
+
+    def on_tick(self, handler: Callable):
+        """Register a handler that runs after every wakeup of the engine"""
+        self.tick_handlers.append(handler)
+
+    def _notify(self):
+        """Called by libtorrent from its network thread; must not block"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Loop is shutting down
+            pass
+
+    def wakeup(self):
+        """Wake the engine from the event loop, e.g. after posting a request"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _call(self, handler: Callable, *args):
+        """Run a handler, scheduling it as a task if it is a coroutine"""
+        try:
+            result = handler(*args)
+            if asyncio.iscoroutine(result):
+                task = asyncio.create_task(result)
+                self._tasks.add(task)
+                task.add_done_callback(self._task_done)
+        except Exception as e:
+            self.logger.error(f"Error in alert handler {getattr(handler, '__name__', handler)}: {e}")
+
+    def _task_done(self, task: asyncio.Task):
+        """Forget a finished handler task and log its failure, if any"""
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.logger.error(f"Error in alert handler task: {task.exception()}")
+
+    def dispatch(self, alerts):
+        """Dispatch a batch of popped alerts to the registered handlers"""
+        for alert in alerts:
+            for handler in self.handlers.get(type(alert).__name__, ()):
+                self._call(handler, alert)
+
+    async def run(self):
+        """Wait for alerts and dispatch them until stopped"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._running = True
+
+        try:
+            self.session.set_alert_notify(self._notify)
+        except AttributeError:
+            # Very old bindings: fall back to waking up on the idle timeout only
+            self.logger.warning("libtorrent has no set_alert_notify, falling back to timed alert polling")
+
+        while self._running:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                self.dispatch(self.session.pop_alerts())
+            except Exception as e:
+                self.logger.error(f"Error processing alerts: {e}")
+
+            for handler in self.tick_handlers:
+                self._call(handler)
+
+    def stop(self):
+        """Stop the engine and detach from libtorrent"""
+        self._running = False
+        self.wakeup()
+        try:
+            self.session.set_alert_notify(lambda: None)
+        except AttributeError:
+            pass
+        self._loop = None
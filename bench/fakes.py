@@ -0,0 +1,1085 @@
+#!/usr/bin/env python3
+"""
+Benchmark Fakes
+In-process stand-ins for libtorrent and python-telegram-bot
+"""
+
+import asyncio
+import importlib.util
+import itertools
+import json
+import sys
+import threading
+import time
+import types
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# ---------------------------------------------------------------------------
+# libtorrent
+# ---------------------------------------------------------------------------
+
+class error_code:
+    """libtorrent error_code: value() is 0 on success"""
+    
+    def __init__(self, value: int = 0, message: str = ''):
+        self._value = value
+        self._message = message
+    
+    def value(self) -> int:
+        return self._value
+    
+    def message(self) -> str:
+        return self._message
+
+class torrent_status:
+    """Snapshot of a fake torrent's state, with libtorrent's state constants"""
+    queued_for_checking = 0
+    checking_files = 1
+    downloading_metadata = 2
+    downloading = 3
+    finished = 4
+    seeding = 5
+    allocating = 6
+    checking_resume_data = 7
+    
+    def __init__(self, handle: 'torrent_handle'):
+        self.handle = handle
+        self.name = handle._name
+        self.state = handle._state
+        self.progress = handle._progress
+        self.download_rate = handle._download_rate
+        self.upload_rate = handle._upload_rate
+        self.num_peers = handle._num_peers
+        self.num_seeds = handle._num_seeds
+        self.total_wanted = handle._total_wanted
+        self.total_wanted_done = int(handle._total_wanted * handle._progress)
+        self.all_time_download = self.total_wanted_done
+        self.all_time_upload = handle._uploaded
+        self.is_seeding = handle._state == torrent_status.seeding
+        self.is_finished = handle._state in (torrent_status.finished, torrent_status.seeding)
+        self.paused = handle._paused
+        self.has_metadata = handle._has_metadata
+        self.need_save_resume = handle._need_save
+        self.errc = error_code()
+
+class file_storage:
+    """File list of a fake torrent: [path, size] pairs"""
+    flag_pad_file = 1
+    
+    def __init__(self, files: List[List]):
+        self._files = files
+    
+    def num_files(self) -> int:
+        return len(self._files)
+    
+    def file_path(self, index: int) -> str:
+        return self._files[index][0]
+    
+    def file_size(self, index: int) -> int:
+        return self._files[index][1]
+    
+    def file_flags(self, index: int) -> int:
+        return 0
+    
+    def file_offset(self, index: int) -> int:
+        return sum(size for _, size in self._files[:index])
+
+class torrent_info:
+    """Parsed metainfo; the benchmark builds these from a JSON payload"""
+    
+    def __init__(self, data):
+        if isinstance(data, (bytes, bytearray)):
+            data = json.loads(bytes(data).decode())
+        self._name = data['name']
+        self._info_hash = data['info_hash']
+        # Optional [path, size] pairs; a single file named after the torrent otherwise
+        self._files = data.get('files') or [[self._name, data.get('total_size', 1 << 30)]]
+        self._total_size = sum(size for _, size in self._files)
+        self._piece_length = data.get('piece_length', 16384)
+    
+    def name(self) -> str:
+        return self._name
+    
+    def info_hash(self) -> str:
+        return self._info_hash
+    
+    def total_size(self) -> int:
+        return self._total_size
+    
+    def files(self) -> file_storage:
+        return file_storage(self._files)
+    
+    def piece_length(self) -> int:
+        return self._piece_length
+    
+    def num_pieces(self) -> int:
+        return -(-self._total_size // self._piece_length)
+    
+    def payload(self, start: int, end: int) -> bytes:
+        """Simulated torrent content between two byte positions (not part of libtorrent)"""
+        seed = sum(self._info_hash.encode()) & 0xFF
+        return bytes((position * 7 + seed) & 0xFF for position in range(start, min(end, self._total_size)))
+    
+    def to_dict(self) -> Dict:
+        return {
+            'name': self._name, 'info_hash': self._info_hash, 'total_size': self._total_size,
+            'files': self._files, 'piece_length': self._piece_length
+        }
+    
+    def info_section(self) -> bytes:
+        return json.dumps(self.to_dict()).encode()
+
+class add_torrent_params:
+    """Parameters for session.add_torrent()"""
+    
+    def __init__(self):
+        self.ti: Optional[torrent_info] = None
+        self.name = ''
+        self.save_path = ''
+        self.info_hash = ''
+        self.trackers: List[str] = []
+        self.storage_mode = storage_mode_t.storage_mode_sparse
+        self.file_priorities: List[int] = []
+
+def parse_magnet_uri(uri: str) -> add_torrent_params:
+    """Parse the btih, dn and tr fields of a magnet link"""
+    query = parse_qs(urlparse(uri).query)
+    params = add_torrent_params()
+    for xt in query.get('xt', []):
+        if xt.startswith('urn:btih:'):
+            params.info_hash = xt[len('urn:btih:'):].lower()
+    if not params.info_hash:
+        raise ValueError(f"invalid magnet link: {uri}")
+    params.name = query.get('dn', [''])[0]
+    params.trackers = query.get('tr', [])
+    return params
+
+def make_magnet_uri(info: torrent_info) -> str:
+    """Magnet link for a torrent_info"""
+    return f"magnet:?xt=urn:btih:{info.info_hash()}&dn={info.name()}"
+
+def write_resume_data_buf(params: add_torrent_params) -> bytes:
+    """Serialise add_torrent_params (JSON instead of bencode)"""
+    return json.dumps({
+        'info_hash': params.info_hash,
+        'name': params.name,
+        'save_path': params.save_path,
+        'ti': params.ti.to_dict() if params.ti is not None else None,
+        'file_priorities': list(params.file_priorities)
+    }).encode()
+
+def read_resume_data(buffer: bytes) -> add_torrent_params:
+    """Inverse of write_resume_data_buf"""
+    data = json.loads(buffer)
+    params = add_torrent_params()
+    params.info_hash = data['info_hash']
+    params.name = data['name']
+    params.save_path = data['save_path']
+    if data.get('ti'):
+        params.ti = torrent_info(data['ti'])
+    params.file_priorities = data.get('file_priorities', [])
+    return params
+
+class torrent_handle:
+    """Handle to a torrent in a fake session"""
+    piece_granularity = 1
+    
+    def __init__(self, session: 'session', info_hash: str, name: str, has_metadata: bool,
+                 save_path: str, total_wanted: int, info: Optional[torrent_info] = None,
+                 file_priorities: Optional[List[int]] = None):
+        self._session = session
+        self._info = info
+        self._file_priorities = list(file_priorities or [])
+        self._info_hash = info_hash
+        self._name = name
+        self._has_metadata = has_metadata
+        self._save_path = save_path
+        self._state = torrent_status.downloading if has_metadata else torrent_status.downloading_metadata
+        self._progress = 0.0
+        self._download_rate = 0
+        self._upload_rate = 0
+        self._num_peers = 0
+        self._num_seeds = 0
+        self._total_wanted = total_wanted
+        self._need_save = True
+        self._trackers: List[str] = []
+        self._announces = 0
+        self._uploaded = 0
+        self._paused = False
+        self._flags = torrent_flags.auto_managed
+        # Downloaded pieces, piece deadlines and pieces to post a read_piece_alert for once they arrive
+        self._pieces: set = set()
+        self._deadlines: Dict[int, int] = {}
+        self._read_waiting: set = set()
+    
+    def info_hash(self) -> str:
+        return self._info_hash
+    
+    def name(self) -> str:
+        return self._name
+    
+    def has_metadata(self) -> bool:
+        return self._has_metadata
+    
+    def is_valid(self) -> bool:
+        return self._info_hash in self._session._handles
+    
+    def status(self, flags: int = 0) -> torrent_status:
+        return torrent_status(self)
+    
+    def need_save_resume_data(self) -> bool:
+        return self._need_save
+    
+    def save_resume_data(self, flags: int = 0):
+        params = add_torrent_params()
+        params.info_hash = self._info_hash
+        params.name = self._name
+        params.save_path = self._save_path
+        params.ti = self._info
+        params.file_priorities = list(self._file_priorities)
+        self._need_save = False
+        self._session._post(save_resume_data_alert(self, params))
+    
+    def add_tracker(self, entry: Dict):
+        self._trackers.append(entry['url'])
+    
+    def force_reannounce(self, seconds: int = 0):
+        self._announces += 1
+    
+    def force_dht_announce(self):
+        self._announces += 1
+    
+    def flags(self) -> int:
+        return self._flags
+    
+    def set_flags(self, flags: int):
+        self._flags |= flags
+    
+    def unset_flags(self, flags: int):
+        self._flags &= ~flags
+    
+    def have_piece(self, piece: int) -> bool:
+        return self._state == torrent_status.seeding or piece in self._pieces
+    
+    def set_piece_deadline(self, piece: int, deadline: int, flags: int = 0):
+        self._deadlines[piece] = deadline
+        if not flags & deadline_flags_t.alert_when_available:
+            return
+        if self.have_piece(piece):
+            self._read_piece(piece)
+        else:
+            self._read_waiting.add(piece)
+    
+    def clear_piece_deadlines(self):
+        self._deadlines.clear()
+        self._read_waiting.clear()
+    
+    def _read_piece(self, piece: int):
+        start = piece * self._info.piece_length()
+        data = self._info.payload(start, start + self._info.piece_length())
+        self._deadlines.pop(piece, None)
+        self._session._post(read_piece_alert(self, piece, data))
+    
+    def pause(self):
+        self._update(paused=True, upload_rate=0)
+    
+    def resume(self):
+        self._update(paused=False)
+    
+    def set_metadata(self, metadata: bytes):
+        info = torrent_info(metadata)
+        if info.info_hash() != self._info_hash or self._has_metadata:
+            return
+        self._update(name=info.name(), has_metadata=True, total_wanted=info.total_size(),
+                     state=torrent_status.downloading, info=info)
+        self._session._post(metadata_received_alert(self))
+    
+    def torrent_file(self) -> Optional[torrent_info]:
+        return self._info
+    
+    def get_file_priorities(self) -> List[int]:
+        if self._info is None:
+            return []
+        return self._file_priorities or [4] * self._info.files().num_files()
+    
+    def prioritize_files(self, priorities: List[int]):
+        files = self._info.files()
+        wanted = sum(files.file_size(i) for i, priority in enumerate(priorities) if priority)
+        self._update(file_priorities=list(priorities), total_wanted=wanted)
+    
+    def file_progress(self, flags: int = 0) -> List[int]:
+        if self._info is None:
+            return []
+        files = self._info.files()
+        return [
+            int(files.file_size(i) * self._progress) if priority else 0
+            for i, priority in enumerate(self.get_file_priorities())
+        ]
+    
+    def _update(self, **fields):
+        """Change the simulated state; the next post_torrent_updates() reports it"""
+        for key, value in fields.items():
+            setattr(self, '_' + key, value)
+        self._need_save = True
+        self._session._changed.add(self._info_hash)
+
+class alert:
+    """Base class of every fake alert; handlers dispatch on the class name"""
+    
+    class category_t:
+        error_notification = 0x1
+        peer_notification = 0x2
+        port_mapping_notification = 0x4
+        storage_notification = 0x8
+        tracker_notification = 0x10
+        connect_notification = 0x20
+        status_notification = 0x40
+        ip_block_notification = 0x100
+        performance_warning = 0x200
+        dht_notification = 0x400
+        stats_notification = 0x800
+        session_log_notification = 0x2000
+        torrent_log_notification = 0x4000
+        peer_log_notification = 0x8000
+        incoming_request_notification = 0x10000
+        dht_log_notification = 0x20000
+        dht_operation_notification = 0x40000
+        port_mapping_log_notification = 0x80000
+        picker_log_notification = 0x100000
+        file_progress_notification = 0x200000
+        piece_progress_notification = 0x400000
+        upload_notification = 0x800000
+        block_progress_notification = 0x1000000
+        all_categories = 0x7fffffff
+    
+    def __init__(self):
+        self.posted = time.perf_counter()
+    
+    def message(self) -> str:
+        return type(self).__name__
+
+class torrent_alert(alert):
+    def __init__(self, handle: torrent_handle):
+        super().__init__()
+        self.handle = handle
+
+class torrent_finished_alert(torrent_alert):
+    pass
+
+class metadata_received_alert(torrent_alert):
+    pass
+
+class torrent_error_alert(torrent_alert):
+    def __init__(self, handle: torrent_handle, error: error_code):
+        super().__init__(handle)
+        self.error = error
+
+class add_torrent_alert(torrent_alert):
+    def __init__(self, handle: torrent_handle, params: add_torrent_params, error: Optional[error_code] = None):
+        super().__init__(handle)
+        self.params = params
+        self.error = error or error_code()
+
+class save_resume_data_alert(torrent_alert):
+    def __init__(self, handle: torrent_handle, params: add_torrent_params):
+        super().__init__(handle)
+        self.params = params
+
+class save_resume_data_failed_alert(torrent_alert):
+    def __init__(self, handle: torrent_handle, error: error_code):
+        super().__init__(handle)
+        self.error = error
+
+class torrent_removed_alert(torrent_alert):
+    def __init__(self, handle: torrent_handle):
+        super().__init__(handle)
+        self.info_hash = handle.info_hash()
+
+class state_update_alert(alert):
+    def __init__(self, status: List[torrent_status]):
+        super().__init__()
+        self.status = status
+
+class session_stats_alert(alert):
+    def __init__(self, values: Dict[str, int]):
+        super().__init__()
+        self.values = values
+
+class read_piece_alert(torrent_alert):
+    def __init__(self, handle: torrent_handle, piece: int, buffer: bytes, error: Optional[error_code] = None):
+        super().__init__(handle)
+        self.piece = piece
+        self.buffer = buffer
+        self.size = len(buffer)
+        self.error = error or error_code()
+
+class save_resume_flags_t:
+    flush_disk_cache = 1
+    save_info_dict = 2
+    only_if_modified = 4
+
+class options_t:
+    delete_files = 1
+
+class torrent_flags:
+    auto_managed = 0x20
+    paused = 0x10
+    sequential_download = 0x200
+
+class deadline_flags_t:
+    alert_when_available = 1
+
+class storage_mode_t:
+    storage_mode_allocate = 0
+    storage_mode_sparse = 1
+
+class save_state_flags_t:
+    save_settings = 1
+    save_dht_state = 4
+
+DEFAULT_SETTINGS: Dict = {
+    'listen_interfaces': '0.0.0.0:6881,[::]:6881',
+    'dht_bootstrap_nodes': 'dht.libtorrent.org:25401',
+    'alert_mask': alert.category_t.error_notification,
+    'active_downloads': 3,
+    'active_seeds': 5,
+    'active_limit': 500,
+    'download_rate_limit': 0,
+    'upload_rate_limit': 0,
+    'connections_limit': 200,
+    'unchoke_slots_limit': 8,
+    'connection_speed': 30,
+    'listen_queue_size': 5,
+    'max_out_request_queue': 500,
+    'max_allowed_in_request_queue': 500,
+    'max_peerlist_size': 3000,
+    'max_paused_peerlist_size': 1000,
+    'aio_threads': 10,
+    'hashing_threads': 1,
+    'file_pool_size': 40,
+    'send_buffer_watermark': 500 * 1024,
+    'send_buffer_low_watermark': 10 * 1024,
+    'send_buffer_watermark_factor': 50,
+    'max_queued_disk_bytes': 1024 * 1024,
+    'checking_mem_usage': 256,
+    'suggest_mode': 0,
+    'mixed_mode_algorithm': 1,
+    'allow_multiple_connections_per_ip': False,
+    'close_redundant_connections': True,
+    'inactivity_timeout': 600,
+    'peer_timeout': 120,
+    'max_failcount': 3,
+}
+
+def default_settings() -> Dict:
+    """libtorrent's default settings_pack as a dict"""
+    return dict(DEFAULT_SETTINGS)
+
+def default_disk_io_constructor():
+    pass
+
+def mmap_disk_io_constructor():
+    pass
+
+def posix_disk_io_constructor():
+    pass
+
+class session_params:
+    """Session construction parameters (libtorrent 2.0)"""
+    
+    def __init__(self):
+        self.settings: Dict = {}
+        self.disk_io_constructor = default_disk_io_constructor
+        self.dht_state: Dict = {}
+
+def write_session_params_buf(params: session_params, flags: int = 0xffffffff) -> bytes:
+    """Serialise session_params (JSON instead of bencode)"""
+    data = {}
+    if flags & save_state_flags_t.save_dht_state:
+        data['dht_state'] = params.dht_state
+    if flags & save_state_flags_t.save_settings:
+        data['settings'] = params.settings
+    return json.dumps(data).encode()
+
+def read_session_params(buffer: bytes, flags: int = 0xffffffff) -> session_params:
+    """Inverse of write_session_params_buf"""
+    data = json.loads(bytes(buffer))
+    params = session_params()
+    if flags & save_state_flags_t.save_dht_state:
+        params.dht_state = data.get('dht_state', {})
+    if flags & save_state_flags_t.save_settings:
+        params.settings = data.get('settings', {})
+    return params
+
+class session:
+    """Fake lt.session with a thread-safe alert queue and libtorrent's notify semantics
+    
+    The notify callback fires (from whichever thread posts the alert) only
+    when the queue goes from empty to non-empty, exactly like the real
+    session, so AlertEngine is exercised the way it runs in production.
+    """
+    
+    def __init__(self, settings=None):
+        if isinstance(settings, session_params):
+            self.disk_io_constructor = settings.disk_io_constructor
+            self.dht_state = dict(settings.dht_state)
+            settings = settings.settings
+        else:
+            self.disk_io_constructor = default_disk_io_constructor
+            self.dht_state = {}
+        # A restored routing table starts out populated
+        self.dht_state.setdefault('node_id', '%040x' % id(self))
+        self.dht_state.setdefault('nodes', [])
+        self.settings: Dict = default_settings()
+        self.settings.update(settings or {})
+        self._handles: Dict[str, torrent_handle] = {}
+        self._changed = set()
+        self._alerts: List[alert] = []
+        self._lock = threading.Lock()
+        self._posted = threading.Condition(self._lock)
+        self._notify: Optional[Callable[[], None]] = None
+        self._counters = {
+            'net.recv_payload_bytes': 0,
+            'net.sent_payload_bytes': 0,
+            'net.recv_bytes': 0,
+            'net.sent_bytes': 0,
+            'disk.queued_disk_jobs': 0,
+            'disk.queued_write_bytes': 0,
+            'disk.num_running_disk_jobs': 0,
+            'peer.num_peers_connected': 0,
+            'peer.num_peers_half_open': 0,
+            'dht.dht_nodes': len(self.dht_state['nodes']),
+            'ses.num_downloading_torrents': 0,
+            'ses.num_seeding_torrents': 0,
+        }
+    
+    # -- settings -----------------------------------------------------------
+    
+    def listen_on(self, low: int, high: int):
+        self.settings['listen_interfaces'] = f"0.0.0.0:{low}"
+    
+    def apply_settings(self, settings: Dict):
+        self.settings.update(settings)
+    
+    def get_settings(self) -> Dict:
+        return dict(self.settings)
+    
+    # -- DHT ----------------------------------------------------------------
+    
+    def add_dht_node(self, node):
+        host, port = node
+        if f"{host}:{port}" not in self.dht_state['nodes']:
+            self.dht_state['nodes'].append(f"{host}:{port}")
+        self._counters['dht.dht_nodes'] = len(self.dht_state['nodes'])
+    
+    def session_state(self, flags: int = 0xffffffff) -> session_params:
+        params = session_params()
+        params.settings = self.get_settings()
+        params.dht_state = dict(self.dht_state, nodes=list(self.dht_state['nodes']))
+        return params
+    
+    # -- alerts -------------------------------------------------------------
+    
+    def set_alert_notify(self, callback: Callable[[], None]):
+        self._notify = callback
+    
+    def _post(self, item: alert):
+        with self._lock:
+            was_empty = not self._alerts
+            self._alerts.append(item)
+            notify = self._notify
+            self._posted.notify_all()
+        if was_empty and notify is not None:
+            notify()
+    
+    def wait_for_alert(self, timeout_ms: int) -> Optional[alert]:
+        with self._posted:
+            if not self._alerts:
+                self._posted.wait(timeout_ms / 1000)
+            return self._alerts[0] if self._alerts else None
+    
+    def pop_alerts(self) -> List[alert]:
+        with self._lock:
+            alerts, self._alerts = self._alerts, []
+        return alerts
+    
+    def post_torrent_updates(self, flags: int = 0):
+        with self._lock:
+            changed, self._changed = self._changed, set()
+        statuses = [self._handles[h].status() for h in changed if h in self._handles]
+        self._post(state_update_alert(statuses))
+    
+    def post_session_stats(self):
+        self._counters['ses.num_downloading_torrents'] = sum(
+            1 for handle in self._handles.values() if handle._state == torrent_status.downloading
+        )
+        self._post(session_stats_alert(dict(self._counters)))
+    
+    # -- torrents -----------------------------------------------------------
+    
+    def _add(self, params: add_torrent_params) -> torrent_handle:
+        if params.ti is not None:
+            info_hash, name, has_metadata = params.ti.info_hash(), params.ti.name(), True
+            files = params.ti.files()
+            total_wanted = sum(
+                files.file_size(i) for i in range(files.num_files())
+                if i >= len(params.file_priorities) or params.file_priorities[i]
+            )
+        else:
+            info_hash, name, has_metadata = params.info_hash, params.name, False
+            total_wanted = 0
+        if not info_hash:
+            raise ValueError("add_torrent_params has neither ti nor info_hash")
+        
+        handle = self._handles.get(info_hash)
+        if handle is None:
+            handle = self._handles[info_hash] = torrent_handle(
+                self, info_hash, name, has_metadata, params.save_path, total_wanted, params.ti, params.file_priorities
+            )
+            with self._lock:
+                self._changed.add(info_hash)
+        self._post(add_torrent_alert(handle, params))
+        return handle
+    
+    def add_torrent(self, params: add_torrent_params) -> torrent_handle:
+        return self._add(params)
+    
+    def async_add_torrent(self, params: add_torrent_params):
+        self._add(params)
+    
+    def remove_torrent(self, handle: torrent_handle, flags: int = 0):
+        if self._handles.pop(handle.info_hash(), None) is not None:
+            self._post(torrent_removed_alert(handle))
+    
+    def get_torrents(self) -> List[torrent_handle]:
+        return list(self._handles.values())
+    
+    def find_torrent(self, info_hash: str) -> Optional[torrent_handle]:
+        return self._handles.get(info_hash)
+    
+    # -- simulation hooks (not part of libtorrent) ----------------------------
+    
+    def finish(self, handle: torrent_handle):
+        """Complete a torrent the way libtorrent does: state change, then torrent_finished_alert"""
+        handle._update(state=torrent_status.seeding, progress=1.0, download_rate=0)
+        self.download_pieces(handle, range(handle._info.num_pieces()) if handle._info else [])
+        self._post(torrent_finished_alert(handle))
+    
+    def download_pieces(self, handle: torrent_handle, pieces: Iterable[int]):
+        """Mark pieces downloaded, posting the read_piece_alerts set_piece_deadline asked for"""
+        for piece in pieces:
+            handle._pieces.add(piece)
+            if piece in handle._read_waiting:
+                handle._read_waiting.discard(piece)
+                handle._read_piece(piece)
+    
+    def upload(self, handle: torrent_handle, amount: int):
+        """Count uploaded payload for a torrent"""
+        handle._update(uploaded=handle._uploaded + amount)
+    
+    def fail(self, handle: torrent_handle, message: str = 'No space left on device'):
+        """Raise a torrent error"""
+        self._post(torrent_error_alert(handle, error_code(28, message)))
+
+def libtorrent_module() -> types.ModuleType:
+    """Build the fake 'libtorrent' module"""
+    module = types.ModuleType('libtorrent')
+    module.__version__ = '2.0.fake'
+    module.version = '2.0.fake'
+    for item in (
+        error_code, torrent_status, torrent_info, add_torrent_params, torrent_handle, session,
+        alert, torrent_alert, torrent_finished_alert, metadata_received_alert, torrent_error_alert,
+        add_torrent_alert, save_resume_data_alert, save_resume_data_failed_alert,
+        torrent_removed_alert, state_update_alert, session_stats_alert, read_piece_alert,
+        save_resume_flags_t, options_t, torrent_flags, deadline_flags_t, storage_mode_t, save_state_flags_t, parse_magnet_uri, make_magnet_uri, write_resume_data_buf,
+        read_resume_data, session_params, write_session_params_buf, read_session_params, default_settings, default_disk_io_constructor, mmap_disk_io_constructor,
+        posix_disk_io_constructor
+    ):
+        setattr(module, item.__name__, item)
+    return module
+
+# ---------------------------------------------------------------------------
+# python-telegram-bot
+# ---------------------------------------------------------------------------
+
+class RetryAfter(Exception):
+    """telegram.error.RetryAfter"""
+    
+    def __init__(self, retry_after: float):
+        super().__init__(f"Flood control exceeded. Retry in {retry_after:.1f} seconds")
+        self.retry_after = retry_after
+
+class TelegramError(Exception):
+    """telegram.error.TelegramError"""
+
+class FakeMessage:
+    """A message the fake bot 'sent'"""
+    
+    def __init__(self, message_id: int, chat_id: int, text: str):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.text = text
+        self.sent = time.perf_counter()
+
+class FakeBot:
+    """Telegram bot API stand-in that enforces Telegram's flood limits
+    
+    Like the real API it answers RetryAfter when a chat gets more than
+    chat_limit messages per chat_window seconds, or when more than
+    global_limit messages per second are sent overall. Every delivered
+    message is kept in sent for the benchmark to inspect.
+    """
+    
+    def __init__(self, chat_limit: int = 20, chat_window: float = 60.0, global_limit: int = 30,
+                 latency: float = 0.0):
+        self.chat_limit = chat_limit
+        self.chat_window = chat_window
+        self.global_limit = global_limit
+        self.latency = latency
+        self.sent: List[FakeMessage] = []
+        self.edits = 0
+        self.flood_errors = 0
+        self.history: Dict[int, Deque[float]] = {}
+        self.recent: Deque[float] = deque()
+        self.ids = itertools.count(1)
+        self.on_send: Optional[Callable[[FakeMessage], None]] = None
+        self.files: Dict[str, bytes] = {}
+    
+    def _check_flood(self, chat_id: int):
+        now = time.monotonic()
+        chat = self.history.setdefault(int(chat_id), deque())
+        while chat and now - chat[0] >= self.chat_window:
+            chat.popleft()
+        while self.recent and now - self.recent[0] >= 1.0:
+            self.recent.popleft()
+        if len(chat) >= self.chat_limit:
+            self.flood_errors += 1
+            raise RetryAfter(self.chat_window - (now - chat[0]))
+        if len(self.recent) >= self.global_limit:
+            self.flood_errors += 1
+            raise RetryAfter(1.0 - (now - self.recent[0]))
+        chat.append(now)
+        self.recent.append(now)
+    
+    async def send_message(self, chat_id, text: str, parse_mode: Optional[str] = None, **kwargs) -> FakeMessage:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_flood(chat_id)
+        message = FakeMessage(next(self.ids), int(chat_id), text)
+        self.sent.append(message)
+        if self.on_send is not None:
+            self.on_send(message)
+        return message
+    
+    async def edit_message_text(self, text: str, chat_id=None, message_id: Optional[int] = None,
+                                parse_mode: Optional[str] = None, **kwargs) -> FakeMessage:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_flood(chat_id)
+        self.edits += 1
+        return FakeMessage(message_id, int(chat_id), text)
+    
+    async def pin_chat_message(self, chat_id, message_id: int, **kwargs) -> bool:
+        return True
+    
+    async def unpin_chat_message(self, chat_id, message_id: Optional[int] = None, **kwargs) -> bool:
+        return True
+    
+    async def get_file(self, file_id: str) -> 'FakeFile':
+        if file_id not in self.files:
+            raise TelegramError(f"file {file_id} not found")
+        return FakeFile(self.files[file_id])
+
+class FakeFile:
+    def __init__(self, data: bytes):
+        self.data = data
+    
+    async def download_as_bytearray(self) -> bytearray:
+        return bytearray(self.data)
+
+class FakeDocument:
+    def __init__(self, file_id: str, file_name: str, file_size: int):
+        self.file_id = file_id
+        self.file_name = file_name
+        self.file_size = file_size
+
+class FakeUser:
+    def __init__(self, user_id: int, username: str):
+        self.id = user_id
+        self.username = username
+        self.first_name = username
+
+class FakeChat:
+    def __init__(self, chat_id: int):
+        self.id = chat_id
+
+class FakeIncomingMessage:
+    """The command message of an Update; replies are recorded instead of sent"""
+    
+    def __init__(self, bot: FakeBot, chat: FakeChat, text: str):
+        self.bot = bot
+        self.chat = chat
+        self.chat_id = chat.id
+        self.text = text
+        self.caption = None
+        self.document = None
+        self.replies: List[FakeMessage] = []
+    
+    async def reply_text(self, text: str, parse_mode: Optional[str] = None, **kwargs) -> FakeMessage:
+        message = FakeMessage(next(self.bot.ids), self.chat.id, text)
+        self.replies.append(message)
+        return message
+
+class Update:
+    """telegram.Update with just the fields the bot reads"""
+    
+    def __init__(self, message: FakeIncomingMessage, user: FakeUser):
+        self.message = message
+        self.effective_message = message
+        self.effective_user = user
+        self.effective_chat = message.chat
+
+class CallbackContext:
+    def __init__(self, bot: FakeBot, args: List[str]):
+        self.bot = bot
+        self.args = args
+
+class ContextTypes:
+    DEFAULT_TYPE = CallbackContext
+
+class CommandHandler:
+    def __init__(self, command: str, callback: Callable, **kwargs):
+        self.command = command
+        self.callback = callback
+
+class MessageHandler:
+    def __init__(self, filters, callback: Callable, **kwargs):
+        self.filters = filters
+        self.callback = callback
+
+class _Filter:
+    """Composable placeholder for telegram.ext.filters objects"""
+    
+    def __and__(self, other):
+        return self
+    
+    def __or__(self, other):
+        return self
+    
+    def __invert__(self):
+        return self
+
+class FakeUpdater:
+    def __init__(self, application: 'Application'):
+        self.application = application
+        self.running = False
+    
+    async def start_polling(self, **kwargs):
+        self.running = True
+        self.application.ready.set()
+    
+    async def start_webhook(self, listen: str = '127.0.0.1', port: int = 80, url_path: str = '',
+                            webhook_url: Optional[str] = None, secret_token: Optional[str] = None, **kwargs):
+        """Serve webhook POSTs like PTB's listener: check the secret token, then dispatch the update"""
+        self.url_path = '/' + url_path.strip('/')
+        self.webhook_url = webhook_url
+        self.secret_token = secret_token
+        self.server = await asyncio.start_server(self._serve_webhook, listen, port)
+        await self.start_polling()
+    
+    async def _serve_webhook(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Handle one HTTP request to the webhook listener"""
+        try:
+            method, path, _ = (await reader.readline()).decode().split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode().partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            if method != 'POST' or path != self.url_path:
+                status = '404 Not Found'
+            elif self.secret_token and headers.get('x-telegram-bot-api-secret-token') != self.secret_token:
+                status = '403 Forbidden'
+            else:
+                status = '200 OK'
+                message = json.loads(body).get('message') or {}
+                sender = message.get('from') or {}
+                if message.get('text', '').startswith('/'):
+                    try:
+                        await self.application.command(
+                            message['text'], sender.get('id', 1), sender.get('username', 'bench'), message['chat']['id']
+                        )
+                    except KeyError:
+                        pass
+        except (ValueError, asyncio.IncompleteReadError):
+            status = '400 Bad Request'
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        writer.close()
+    
+    async def stop(self):
+        self.running = False
+        server = getattr(self, 'server', None)
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+class ApplicationBuilder:
+    def __init__(self):
+        self._token = None
+    
+    def token(self, token: str) -> 'ApplicationBuilder':
+        self._token = token
+        return self
+    
+    def __getattr__(self, name: str):
+        # Any other builder option (concurrent_updates, read_timeout, ...) is accepted and ignored
+        return lambda *args, **kwargs: self
+    
+    def build(self) -> 'Application':
+        return Application(self._token)
+
+class Application:
+    """telegram.ext.Application that routes commands to handlers in-process
+    
+    Application.bot is shared by every Application built in the process, so
+    the benchmark can configure it (flood limits, latency) before the bot
+    under test builds its own.
+    """
+    shared_bot: Optional[FakeBot] = None
+    
+    def __init__(self, token: Optional[str] = None):
+        self.token = token
+        self.bot = Application.shared_bot or FakeBot()
+        self.handlers: List = []
+        self.updater = FakeUpdater(self)
+        self.ready = asyncio.Event()
+    
+    @staticmethod
+    def builder() -> ApplicationBuilder:
+        return ApplicationBuilder()
+    
+    def add_handler(self, handler, group: int = 0):
+        self.handlers.append(handler)
+    
+    async def initialize(self):
+        pass
+    
+    async def start(self):
+        pass
+    
+    async def stop(self):
+        pass
+    
+    async def shutdown(self):
+        pass
+    
+    async def command(self, text: str, user_id: int = 1, username: str = 'bench', chat_id: int = -100) -> List[FakeMessage]:
+        """Deliver '/command args...' to its handler and return the replies"""
+        command, *args = text.split()
+        command = command.lstrip('/')
+        message = FakeIncomingMessage(self.bot, FakeChat(chat_id), text)
+        update = Update(message, FakeUser(user_id, username))
+        for handler in self.handlers:
+            if isinstance(handler, CommandHandler) and handler.command == command:
+                await handler.callback(update, CallbackContext(self.bot, args))
+                return message.replies
+        raise KeyError(f"no handler for /{command}")
+    
+    async def upload(self, file_name: str, data: bytes, caption: Optional[str] = None, user_id: int = 1,
+                     username: str = 'bench', chat_id: int = -100) -> List[FakeMessage]:
+        """Deliver a document upload to the first MessageHandler and return the replies"""
+        file_id = f"file{next(self.bot.ids)}"
+        self.bot.files[file_id] = data
+        message = FakeIncomingMessage(self.bot, FakeChat(chat_id), '')
+        message.caption = caption
+        message.document = FakeDocument(file_id, file_name, len(data))
+        update = Update(message, FakeUser(user_id, username))
+        for handler in self.handlers:
+            if isinstance(handler, MessageHandler):
+                await handler.callback(update, CallbackContext(self.bot, []))
+                return message.replies
+        raise KeyError("no document handler")
+
+def telegram_modules() -> Dict[str, types.ModuleType]:
+    """Build the fake 'telegram', 'telegram.ext' and 'telegram.error' modules"""
+    telegram = types.ModuleType('telegram')
+    telegram.Update = Update
+    telegram.Bot = FakeBot
+    telegram.Message = FakeMessage
+    
+    error = types.ModuleType('telegram.error')
+    error.RetryAfter = RetryAfter
+    error.TelegramError = TelegramError
+    
+    ext = types.ModuleType('telegram.ext')
+    ext.Application = Application
+    ext.ApplicationBuilder = ApplicationBuilder
+    ext.CommandHandler = CommandHandler
+    ext.MessageHandler = MessageHandler
+    ext.ContextTypes = ContextTypes
+    ext.CallbackContext = CallbackContext
+    ext.filters = types.SimpleNamespace(
+        Document=types.SimpleNamespace(ALL=_Filter(), FileExtension=lambda *args, **kwargs: _Filter()),
+        TEXT=_Filter(),
+        COMMAND=_Filter(),
+        ALL=_Filter()
+    )
+    
+    telegram.ext = ext
+    telegram.error = error
+    return {'telegram': telegram, 'telegram.ext': ext, 'telegram.error': error}
+
+# ---------------------------------------------------------------------------
+# httpx (only when it is not installed; the benchmark never touches the network)
+# ---------------------------------------------------------------------------
+
+def httpx_module() -> types.ModuleType:
+    """Build an offline 'httpx' whose client refuses every request"""
+    module = types.ModuleType('httpx')
+    
+    class HTTPError(Exception):
+        pass
+    
+    class TimeoutException(HTTPError):
+        pass
+    
+    class ConnectError(HTTPError):
+        pass
+    
+    class Timeout:
+        def __init__(self, *args, **kwargs):
+            pass
+    
+    class Limits:
+        def __init__(self, *args, **kwargs):
+            pass
+    
+    class AsyncClient:
+        def __init__(self, *args, **kwargs):
+            pass
+        
+        def stream(self, method: str, url: str, **kwargs):
+            raise ConnectError(f"offline benchmark: {url}")
+        
+        async def get(self, url: str, **kwargs):
+            raise ConnectError(f"offline benchmark: {url}")
+        
+        async def aclose(self):
+            pass
+    
+    for item in (HTTPError, TimeoutException, ConnectError, Timeout, Limits, AsyncClient):
+        setattr(module, item.__name__, item)
+    return module
+
+def install():
+    """Register the fakes in sys.modules; must run before torrent_bot is imported"""
+    sys.modules['libtorrent'] = libtorrent_module()
+    sys.modules.update(telegram_modules())
+    if importlib.util.find_spec('httpx') is None:
+        sys.modules['httpx'] = httpx_module()
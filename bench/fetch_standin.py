@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Fetcher Stand-in
+Runs TorrentFetcher against a local HTTP server that serves, stalls and oversizes .torrent files
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from torrent_fetch import FetchError, TorrentFetcher  # noqa: E402
+
+class TorrentSite:
+    """Local HTTP server standing in for a .torrent host
+    
+    /torrent/<name>   a small JSON metainfo (the checks parse it with json.loads)
+    /slow/<name>      the same, after `delay` seconds
+    /stall            no response until the client hangs up
+    /large            `large` bytes without a Content-Length
+    /declared         announces `large` bytes in Content-Length
+    
+    Requests are counted, and the peak number of concurrent requests is recorded.
+    """
+    
+    def __init__(self, delay: float = 0.2, large: int = 1024 * 1024):
+        self.delay = delay
+        self.large = large
+        self.server = None
+        self.port = 0
+        self.requests: List[str] = []
+        self.active = 0
+        self.peak = 0
+    
+    async def start(self):
+        """Listen on a free local port"""
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+    
+    async def stop(self):
+        """Stop listening"""
+        self.server.close()
+        await self.server.wait_closed()
+    
+    def url(self, path: str) -> str:
+        """URL of a path on the stand-in"""
+        return f"http://127.0.0.1:{self.port}{path}"
+    
+    @staticmethod
+    def metainfo(name: str) -> bytes:
+        """A torrent payload whose info-hash is derived from its name"""
+        return json.dumps({'name': name, 'info_hash': name.rjust(40, '0')[:40]}).encode()
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer one request and close the connection"""
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            path = request_line.decode('latin-1').split()[1]
+            self.requests.append(path)
+            
+            kind, _, name = path.strip('/').partition('/')
+            if kind == 'stall':
+                await reader.read()
+                return
+            if kind == 'slow':
+                await asyncio.sleep(self.delay)
+            if kind in ('torrent', 'slow'):
+                body = self.metainfo(name)
+                writer.write(f"HTTP/1.1 200 OK\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            elif kind == 'large':
+                writer.write(b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\n")
+                for _ in range(self.large // 65536):
+                    writer.write(b'x' * 65536)
+                    await writer.drain()
+            elif kind == 'declared':
+                writer.write(f"HTTP/1.1 200 OK\r\nContent-Length: {self.large}\r\nConnection: close\r\n\r\n".encode())
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+        except ConnectionError:
+            # The fetcher hung up, e.g. after the size cap
+            pass
+        finally:
+            self.active -= 1
+            writer.close()
+
+def fetcher(**kwargs) -> TorrentFetcher:
+    """A fetcher parsing the stand-in's JSON payloads"""
+    return TorrentFetcher(json.loads, lambda info: info['info_hash'], **kwargs)
+
+async def expect_error(fetch, url: str, text: str) -> Tuple[bool, str]:
+    """Fetch a URL that has to fail with a FetchError mentioning text"""
+    try:
+        await fetch.fetch(url)
+    except FetchError as e:
+        return text in str(e), str(e)
+    return False, "no error"
+
+async def check_timeout(site: TorrentSite, args) -> Tuple[bool, str]:
+    fetch = fetcher(timeout=args.timeout)
+    started = time.monotonic()
+    ok, detail = await expect_error(fetch, site.url('/stall'), 'Timed out')
+    elapsed = time.monotonic() - started
+    await fetch.close()
+    return ok and elapsed < args.timeout * 2, f"{detail} after {elapsed:.2f}s"
+
+async def check_size_cap(site: TorrentSite, args) -> Tuple[bool, str]:
+    fetch = fetcher(max_size=args.max_size)
+    streamed, detail = await expect_error(fetch, site.url('/large'), 'larger than')
+    declared, declared_detail = await expect_error(fetch, site.url('/declared'), 'too large')
+    await fetch.close()
+    return streamed and declared, f"{detail}; {declared_detail}"
+
+async def check_host_limit(site: TorrentSite, args) -> Tuple[bool, str]:
+    fetch = fetcher(per_host_limit=args.per_host_limit)
+    site.peak = 0
+    started = time.monotonic()
+    results = await asyncio.gather(*(fetch.fetch(site.url(f'/slow/limit{i}')) for i in range(args.per_host_limit * 3)))
+    elapsed = time.monotonic() - started
+    await fetch.close()
+    ok = len(results) == args.per_host_limit * 3 and site.peak == args.per_host_limit
+    return ok, f"{len(results)} fetches, at most {site.peak} at once, {elapsed:.2f}s"
+
+async def check_cache(site: TorrentSite, args) -> Tuple[bool, str]:
+    fetch = fetcher()
+    url = site.url('/torrent/cached')
+    before = len(site.requests)
+    # Concurrent fetches share one request, later ones hit the URL cache
+    first = await asyncio.gather(*(fetch.fetch(url) for _ in range(5)))
+    again = await fetch.fetch(url)
+    requests = len(site.requests) - before
+    by_hash = fetch.get_cached(first[0]['info_hash'])
+    await fetch.close()
+    ok = requests == 1 and again is first[0] and by_hash is first[0]
+    return ok, f"6 fetches made {requests} request(s), info-hash lookup {'hit' if by_hash is not None else 'missed'}"
+
+CHECKS = {
+    'timeout': check_timeout,
+    'size cap': check_size_cap,
+    'per-host limit': check_host_limit,
+    'cache': check_cache
+}
+
+async def run(args) -> Dict[str, bool]:
+    """Run every check against one stand-in server"""
+    site = TorrentSite(large=args.max_size * 4)
+    await site.start()
+    results = {}
+    try:
+        for name, check in CHECKS.items():
+            ok, detail = await check(site, args)
+            results[name] = ok
+            print(f"{'✅' if ok else '❌'} {name}: {detail}")
+    finally:
+        await site.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument('--timeout', type=float, default=0.5, help="fetcher timeout in seconds (default: 0.5)")
+    parser.add_argument('--max-size', type=int, default=256 * 1024, help="fetcher size cap in bytes")
+    parser.add_argument('--per-host-limit', type=int, default=2)
+    args = parser.parse_args()
+    
+    results = asyncio.run(run(args))
+    if not all(results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Flood Check
+Drives MessageDispatcher against a fake bot that enforces Telegram's flood limits
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import sys
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from message_dispatcher import MessageDispatcher  # noqa: E402
+
+CHAT = -100
+# Every RetryAfter logs a warning; only failures matter here
+LOGGER = logging.getLogger('flood_check')
+LOGGER.setLevel(logging.ERROR)
+
+class RetryAfter(Exception):
+    """Shaped like telegram.error.RetryAfter; the dispatcher only looks at retry_after"""
+    
+    def __init__(self, retry_after: float):
+        super().__init__(f"Flood control exceeded. Retry in {retry_after:.2f} seconds")
+        self.retry_after = retry_after
+
+class FloodLimitedBot:
+    """Bot API stand-in that answers RetryAfter like Telegram
+    
+    A chat may receive chat_limit messages per chat_window seconds, and the
+    bot may send global_limit messages per second overall. Delivered
+    messages are kept in sent as (chat_id, text).
+    """
+    
+    def __init__(self, chat_limit: int = 20, chat_window: float = 60.0, global_limit: int = 30):
+        self.chat_limit = chat_limit
+        self.chat_window = chat_window
+        self.global_limit = global_limit
+        self.sent: List[Tuple[int, str]] = []
+        self.flood_errors = 0
+        self.history: Dict[int, Deque[float]] = {}
+        self.recent: Deque[float] = deque()
+        self.ids = itertools.count(1)
+    
+    def _check_flood(self, chat_id: int):
+        now = time.monotonic()
+        chat = self.history.setdefault(int(chat_id), deque())
+        while chat and now - chat[0] >= self.chat_window:
+            chat.popleft()
+        while self.recent and now - self.recent[0] >= 1.0:
+            self.recent.popleft()
+        if len(chat) >= self.chat_limit:
+            self.flood_errors += 1
+            raise RetryAfter(self.chat_window - (now - chat[0]))
+        if len(self.recent) >= self.global_limit:
+            self.flood_errors += 1
+            raise RetryAfter(1.0 - (now - self.recent[0]))
+        chat.append(now)
+        self.recent.append(now)
+    
+    async def send_message(self, chat_id, text: str, parse_mode=None, **kwargs) -> int:
+        self._check_flood(chat_id)
+        self.sent.append((int(chat_id), text))
+        return next(self.ids)
+    
+    async def edit_message_text(self, text: str, chat_id=None, message_id=None, parse_mode=None, **kwargs) -> int:
+        self._check_flood(chat_id)
+        return message_id
+
+async def check_burst(args) -> Tuple[bool, str]:
+    """More messages to one chat than its limit allows: all arrive, in order, via RetryAfter"""
+    bot = FloodLimitedBot(chat_limit=args.chat_limit, chat_window=args.window)
+    # Allowed to send faster than the bot accepts, so delivery depends on honouring RetryAfter
+    dispatcher = MessageDispatcher(
+        bot, LOGGER, chat_rate=args.chat_limit * 4 / args.window, chat_burst=args.chat_limit, global_rate=1000,
+        digest_window=0
+    )
+    started = time.monotonic()
+    for i in range(args.messages):
+        dispatcher.send(CHAT, f"message {i}")
+    await dispatcher.flush(timeout=args.window * (args.messages / args.chat_limit + 2))
+    elapsed = time.monotonic() - started
+    await dispatcher.close()
+    delivered = [text for _, text in bot.sent]
+    ok = delivered == [f"message {i}" for i in range(args.messages)] and dispatcher.failed == 0 and bot.flood_errors > 0
+    return ok, (
+        f"{len(delivered)}/{args.messages} delivered in order, {bot.flood_errors} RetryAfter answers, "
+        f"{dispatcher.retried} retries, {elapsed:.1f}s"
+    )
+
+async def check_global(args) -> Tuple[bool, str]:
+    """One message to each of many chats: the global limit is hit and nothing is lost"""
+    bot = FloodLimitedBot(global_limit=args.global_limit)
+    dispatcher = MessageDispatcher(bot, LOGGER, global_rate=args.global_limit * 4, digest_window=0)
+    chats = args.global_limit * 3
+    for chat in range(chats):
+        dispatcher.send(chat, f"hello {chat}")
+    await dispatcher.flush(timeout=10)
+    await dispatcher.close()
+    ok = len(bot.sent) == chats and dispatcher.failed == 0
+    return ok, f"{len(bot.sent)}/{chats} chats reached, {bot.flood_errors} RetryAfter answers"
+
+async def check_digest(args) -> Tuple[bool, str]:
+    """A season pack finishing at once: one digest message instead of one per torrent"""
+    bot = FloodLimitedBot(chat_limit=args.chat_limit, chat_window=args.window)
+    dispatcher = MessageDispatcher(bot, LOGGER, digest_window=0.2)
+    for i in range(30):
+        dispatcher.send_digest(CHAT, f"✅ Episode {i} finished", f"🎬 Episode {i}", "✅ *{count} Downloads Complete!*")
+    await asyncio.sleep(0.3)
+    await dispatcher.flush()
+    await dispatcher.close()
+    text = bot.sent[0][1] if bot.sent else ''
+    ok = len(bot.sent) == 1 and text.startswith("✅ *30 Downloads") and all(f"Episode {i}\n" in text + "\n" for i in range(30))
+    return ok, f"30 completions sent as {len(bot.sent)} message(s)"
+
+CHECKS = {
+    'burst to one chat': check_burst,
+    'global limit': check_global,
+    'digest': check_digest
+}
+
+async def run(args) -> Dict[str, bool]:
+    """Run every check"""
+    results = {}
+    for name, check in CHECKS.items():
+        ok, detail = await check(args)
+        results[name] = ok
+        print(f"{'✅' if ok else '❌'} {name}: {detail}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument('--messages', type=int, default=60, help="messages in the burst to one chat")
+    parser.add_argument('--chat-limit', type=int, default=20, help="messages a chat accepts per window")
+    parser.add_argument('--window', type=float, default=2.0, help="per-chat window in seconds (Telegram: 60)")
+    parser.add_argument('--global-limit', type=int, default=30, help="messages per second across chats")
+    args = parser.parse_args()
+    
+    results = asyncio.run(run(args))
+    if not all(results.values()):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
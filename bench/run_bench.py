@@ -0,0 +1,439 @@
+#!/usr/bin/env python3
+"""
+TeleTorrent Benchmarks
+Runs TorrentBot against fake libtorrent/Telegram back ends and reports JSON
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import fakes  # noqa: E402
+
+fakes.install()
+
+import libtorrent as lt  # noqa: E402
+from history_store import HistoryStore  # noqa: E402
+from message_dispatcher import MessageDispatcher  # noqa: E402
+from perf import percentile  # noqa: E402
+from torrent_bot import TorrentBot  # noqa: E402
+
+CONFIG = """[telegram]
+bot_token = 0:benchmark
+group_id = -100
+admin_ids = 1
+messages_per_minute = 100000
+digest_window = 0
+
+[paths]
+download_dir = {root}/downloads
+
+[settings]
+max_concurrent_downloads = 0
+resume_save_interval = 86400
+live_status_interval = 86400
+"""
+
+def summarize(samples: List[float], scale: float = 1000.0) -> Dict[str, float]:
+    """p50/p95/max/mean of samples (seconds), scaled to milliseconds by default"""
+    return {
+        'n': len(samples),
+        'p50_ms': round(percentile(samples, 0.5) * scale, 3),
+        'p95_ms': round(percentile(samples, 0.95) * scale, 3),
+        'max_ms': round(max(samples) * scale, 3),
+        'mean_ms': round(statistics.mean(samples) * scale, 3)
+    }
+
+def magnet(index: int, prefix: str = 'bench') -> str:
+    """A deterministic magnet link"""
+    info_hash = hashlib.sha1(f"{prefix}-{index}".encode()).hexdigest()
+    return f"magnet:?xt=urn:btih:{info_hash}&dn={prefix.title()}+Torrent+{index:05d}"
+
+def write_log(path: Path, size_mb: int, seed: int = 1) -> float:
+    """Fill a log file with realistic lines (about 0.1% ERROR); returns seconds taken"""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    lines = []
+    for i in range(20000):
+        stamp = f"2024-01-01 00:{i // 600 % 60:02d}:{i // 10 % 60:02d},{i % 1000:03d}"
+        roll = rng.random()
+        if roll < 0.001:
+            lines.append(f"{stamp} - ERROR - Torrent error for Bench Torrent {i}: No space left on device\n")
+        elif roll < 0.01:
+            lines.append(f"{stamp} - WARNING - Flood limit for chat -100, retrying in 3.0s\n")
+        else:
+            lines.append(f"{stamp} - INFO - Download started by bench: magnet:?xt=urn:btih:{rng.getrandbits(160):040x}\n")
+    block = ''.join(lines).encode()
+    
+    target = size_mb * 1024 * 1024
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        # The needle only exists at the very start, so searching for it scans the whole file
+        f.write(b"2024-01-01 00:00:00,000 - INFO - benchmark-needle\n")
+        written = 0
+        while written < target:
+            f.write(block)
+            written += len(block)
+    return time.perf_counter() - started
+
+class Bench:
+    """Drives one TorrentBot instance through the benchmark scenarios"""
+    
+    def __init__(self, args: argparse.Namespace, root: Path):
+        self.args = args
+        self.root = root
+        self.results: Dict[str, Dict] = {}
+        self.bot: TorrentBot = None
+        self.app = None
+    
+    async def wait_for(self, predicate, timeout: float = 60.0, what: str = 'condition'):
+        """Poll until predicate() is true"""
+        deadline = time.monotonic() + timeout
+        while not predicate():
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"timed out waiting for {what}")
+            await asyncio.sleep(0.005)
+    
+    async def add_torrents(self, count: int, prefix: str) -> List:
+        """Start count downloads through the bot and wait until libtorrent reported them"""
+        handles = []
+        for i in range(count):
+            params = lt.parse_magnet_uri(magnet(i, prefix))
+            params.save_path = str(self.root / 'downloads')
+            await self.bot.start_download(params, 'bench', magnet(i, prefix), -100)
+            handles.append(self.bot.session.find_torrent(params.info_hash))
+        
+        rng = random.Random(count)
+        for handle in handles:
+            handle._update(
+                progress=rng.random(),
+                download_rate=rng.randint(0, 20 * 1024 * 1024),
+                num_peers=rng.randint(0, 200),
+                state=lt.torrent_status.downloading
+            )
+        
+        self.bot.session.post_torrent_updates()
+        expected = {handle.info_hash() for handle in handles}
+        await self.wait_for(
+            lambda: all(self.bot.status_cache.get(h) is not None for h in expected),
+            what='state updates'
+        )
+        await self.wait_for(lambda: not self.bot.pending_resume, what='resume data writes')
+        
+        # Adding thousands of torrents in one go blocks the loop; keep that out of the lag figures
+        self.bot.loop_lag.samples.clear()
+        self.bot.loop_lag.worst = 0.0
+        return handles
+    
+    async def bench_status(self):
+        """/status render time as the number of active torrents grows"""
+        results = {}
+        total = 0
+        for size in self.args.status_sizes:
+            await self.add_torrents(size - total, f'status{size}')
+            total = size
+            samples = []
+            reply = ''
+            for _ in range(self.args.repeat):
+                started = time.perf_counter()
+                replies = await self.app.command('/status')
+                samples.append(time.perf_counter() - started)
+                reply = replies[-1].text
+            results[str(size)] = dict(summarize(samples), reply_chars=len(reply))
+        self.results['status_render'] = results
+    
+    async def bench_completion(self):
+        """Latency from torrent_finished_alert being posted to the bot acting on it"""
+        count = self.args.completions
+        handles = await self.add_torrents(count, 'complete')
+        names = {handle.info_hash(): handle.name() for handle in handles}
+        
+        detected: Dict[str, float] = {}
+        handlers = self.bot.alerts.handlers['torrent_finished_alert']
+        original = handlers[0]
+        
+        def instrumented(alert):
+            detected[alert.handle.info_hash()] = time.perf_counter()
+            return original(alert)
+        handlers[0] = instrumented
+        
+        notified: Dict[str, float] = {}
+        by_name = {name: info_hash for info_hash, name in names.items()}
+        
+        def on_send(message):
+            for name, info_hash in by_name.items():
+                if name in message.text and 'Completed' in message.text:
+                    notified.setdefault(info_hash, message.sent)
+        self.app.bot.on_send = on_send
+        
+        posted: Dict[str, float] = {}
+        
+        def finisher():
+            # libtorrent posts alerts from its own network thread
+            for handle in handles:
+                posted[handle.info_hash()] = time.perf_counter()
+                self.bot.session.finish(handle)
+                time.sleep(self.args.completion_spacing)
+        
+        try:
+            await asyncio.to_thread(finisher)
+            await self.wait_for(lambda: len(notified) == count, what='completion notifications')
+            await self.wait_for(lambda: not self.bot.pending_resume, what='resume data writes')
+        finally:
+            handlers[0] = original
+            self.app.bot.on_send = None
+        
+        self.results['completion_latency'] = {
+            'detect': summarize([detected[h] - posted[h] for h in posted]),
+            'notify': summarize([notified[h] - posted[h] for h in posted])
+        }
+    
+    async def bench_history(self):
+        """History writes: raw store throughput and the bot's off-loop save path"""
+        count = self.args.history_rows
+        store = HistoryStore(str(self.root / 'history-bench.db'))
+        entries = [
+            {
+                'info_hash': hashlib.sha1(f"history-{i}".encode()).hexdigest(),
+                'name': f"History Torrent {i}",
+                'user': f"user{i % 7}",
+                'started': datetime.now().isoformat(),
+                'completed': datetime.now().isoformat(),
+                'status': 'completed',
+                'url': magnet(i, 'history')
+            }
+            for i in range(count)
+        ]
+        started = time.perf_counter()
+        for entry in entries:
+            store.add(entry)
+        store_elapsed = time.perf_counter() - started
+        store.close()
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(self.bot.save_history(entry) for entry in entries))
+        bot_elapsed = time.perf_counter() - started
+        
+        query_samples = []
+        for _ in range(self.args.repeat):
+            started = time.perf_counter()
+            await self.app.command('/history 3 user=user3')
+            query_samples.append(time.perf_counter() - started)
+        
+        self.results['history_write'] = {
+            'rows': count,
+            'store_rows_per_s': round(count / store_elapsed, 1),
+            'save_history_rows_per_s': round(count / bot_elapsed, 1),
+            'history_command': summarize(query_samples)
+        }
+    
+    async def bench_logs(self, generation_s: float):
+        """/logs latency on a large log file"""
+        cases = {
+            'tail_20': '/logs',
+            'tail_500': '/logs 500',
+            'error_20': '/logs 20 ERROR',
+            'pattern_20': '/logs 20 space',
+            'full_scan_needle': '/logs 1 benchmark-needle'
+        }
+        results = {
+            'size_mb': round(os.path.getsize('logs/torrent_bot.log') / 1024 / 1024, 1),
+            'generate_s': round(generation_s, 2)
+        }
+        for name, command in cases.items():
+            repeat = 1 if name == 'full_scan_needle' else self.args.repeat
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                replies = await self.app.command(command)
+                samples.append(time.perf_counter() - started)
+            if not replies or 'No matching' in replies[0].text:
+                raise RuntimeError(f"{command} found nothing")
+            results[name] = summarize(samples)
+        self.results['logs'] = results
+    
+    async def bench_flood(self):
+        """A burst of completions and sends against a bot that enforces Telegram's flood limits"""
+        bot = fakes.FakeBot(chat_limit=20, chat_window=self.args.flood_window, global_limit=30)
+        dispatcher = MessageDispatcher(
+            bot,
+            self.bot.logger,
+            chat_rate=60 / self.args.flood_window,
+            digest_window=0.5
+        )
+        
+        started = time.perf_counter()
+        for i in range(30):
+            dispatcher.send_digest(-100, f"done {i}", f"Torrent {i}", "{count} Downloads Completed")
+        await self.wait_for(lambda: bot.sent, what='digest')
+        await dispatcher.flush(timeout=60)
+        digest_s = time.perf_counter() - started
+        digest_messages = len(bot.sent)
+        
+        # Dispatcher configured faster than the chat limit, so it must recover from RetryAfter
+        started = time.perf_counter()
+        futures = [dispatcher.send(-200, f"message {i}") for i in range(45)]
+        delivered = await asyncio.gather(*futures)
+        send_s = time.perf_counter() - started
+        await dispatcher.close()
+        
+        self.results['dispatcher_flood'] = {
+            'digest_burst': {'completions': 30, 'messages': digest_messages, 'elapsed_s': round(digest_s, 3)},
+            'send_burst': {
+                'messages': len(futures),
+                'delivered': sum(1 for message in delivered if message is not None),
+                'flood_errors': bot.flood_errors,
+                'retries': dispatcher.retried,
+                'elapsed_s': round(send_s, 3)
+            }
+        }
+    
+    async def run(self, generation_s: float):
+        """Start the bot, run every scenario, stop the bot"""
+        # The bot under test gets an unthrottled API; flood limits are benchmarked in bench_flood
+        fakes.Application.shared_bot = fakes.FakeBot(chat_limit=10 ** 6, global_limit=10 ** 6)
+        self.bot = TorrentBot(str(self.root / 'config.ini'))
+        for handler in logging.getLogger().handlers:
+            if type(handler) is logging.StreamHandler:
+                handler.setLevel(logging.WARNING)
+        self.bot.loop_lag.interval = 0.05
+        
+        task = asyncio.create_task(self.bot.run())
+        await self.wait_for(lambda: self.bot.app is not None and self.bot.app.ready.is_set(), what='bot start')
+        self.app = self.bot.app
+        try:
+            scenarios = [
+                ('status', self.bench_status),
+                ('completion', self.bench_completion),
+                ('history', self.bench_history),
+                ('logs', lambda: self.bench_logs(generation_s)),
+                ('flood', self.bench_flood)
+            ]
+            for name, scenario in scenarios:
+                if name in self.args.only:
+                    started = time.perf_counter()
+                    await scenario()
+                    print(f"{name}: {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            lag = self.bot.loop_lag.stats()
+            self.results['event_loop_lag'] = {
+                'p99_ms': round(lag['p99'] * 1000, 3),
+                'worst_ms': round(lag['worst'] * 1000, 3)
+            }
+        finally:
+            self.bot.stop_event.set()
+            await task
+
+def flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    """Flatten nested results into dotted metric names"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def compare(results: Dict, baseline_path: str, tolerance: float) -> List[str]:
+    """List the metrics that got worse than the baseline by more than tolerance"""
+    with open(baseline_path, 'r') as f:
+        baseline = flatten(json.load(f)['results'])
+    current = flatten(results)
+    regressions = []
+    for name, old in baseline.items():
+        new = current.get(name)
+        if new is None or old <= 0:
+            continue
+        if name.endswith('_ms') or name.endswith('elapsed_s'):
+            worse = new > old * (1 + tolerance)
+        elif name.endswith('_per_s'):
+            worse = new < old * (1 - tolerance)
+        else:
+            continue
+        if worse:
+            regressions.append(f"{name}: {old} -> {new}")
+    return regressions
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--status-sizes', type=int, nargs='+', default=[10, 1000, 10000],
+                        help='numbers of active torrents to render /status for')
+    parser.add_argument('--completions', type=int, default=50, help='torrents to complete for the latency run')
+    parser.add_argument('--completion-spacing', type=float, default=0.05,
+                        help='seconds between completions (below the global send rate)')
+    parser.add_argument('--history-rows', type=int, default=5000, help='history entries to write')
+    parser.add_argument('--log-mb', type=int, default=500, help='size of the generated log file')
+    parser.add_argument('--flood-window', type=float, default=3.0,
+                        help='seconds per simulated per-chat window of 20 messages (Telegram: 60)')
+    parser.add_argument('--repeat', type=int, default=20, help='repetitions per latency measurement')
+    parser.add_argument('--only', nargs='+', default=['status', 'completion', 'history', 'logs', 'flood'],
+                        choices=['status', 'completion', 'history', 'logs', 'flood'])
+    parser.add_argument('--quick', action='store_true', help='small sizes for a smoke run')
+    parser.add_argument('--output', help='also write the JSON results to this file')
+    parser.add_argument('--baseline', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative slowdown tolerated before --baseline reports a regression')
+    args = parser.parse_args()
+    if args.quick:
+        args.status_sizes = [10, 100]
+        args.completions = 10
+        args.history_rows = 500
+        args.log_mb = 5
+        args.repeat = 5
+    return args
+
+def main():
+    args = parse_args()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='teletorrent-bench-') as tmp:
+        root = Path(tmp)
+        (root / 'config.ini').write_text(CONFIG.format(root=root))
+        os.chdir(root)
+        try:
+            generation_s = write_log(root / 'logs' / 'torrent_bot.log', args.log_mb) if 'logs' in args.only else 0.0
+            bench = Bench(args, root)
+            asyncio.run(bench.run(generation_s))
+        finally:
+            os.chdir(cwd)
+    
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': {key: value for key, value in vars(args).items() if key not in ('output', 'baseline')}
+        },
+        'results': bench.results
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    
+    if args.baseline:
+        regressions = compare(bench.results, args.baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Webhook Stand-in
+Posts Telegram Update payloads to the bot's local webhook listener, the way Telegram does
+"""
+
+import argparse
+import configparser
+import json
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from webhook import SECRET_HEADER, command_update, load_webhook_settings  # noqa: E402
+
+def post(url: str, payload: dict, secret_token: str) -> int:
+    """POST one update and return the HTTP status"""
+    headers = {'Content-Type': 'application/json'}
+    if secret_token:
+        headers[SECRET_HEADER] = secret_token
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-1])
+    parser.add_argument('text', nargs='?', default='/status', help="message text (default: /status)")
+    parser.add_argument('--config', default='config.ini', help="bot config with a [webhook] section")
+    parser.add_argument('--chat-id', type=int, help="chat the update comes from (default: [telegram] group_id)")
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--username', default='webhook-test')
+    parser.add_argument('--secret', help="secret token to send instead of the configured one ('' sends none)")
+    parser.add_argument('--count', type=int, default=1, help="number of updates to post")
+    args = parser.parse_args()
+    
+    config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'))
+    if not config.read(args.config) or not config.has_section('webhook'):
+        sys.exit(f"{args.config} has no [webhook] section")
+    settings = load_webhook_settings(config['webhook'])
+    chat_id = args.chat_id if args.chat_id is not None else int(config['telegram']['group_id'])
+    secret_token = settings.secret_token if args.secret is None else args.secret
+    
+    update_id = int(time.time() * 1000) % 2 ** 31
+    for offset in range(args.count):
+        payload = command_update(args.text, update_id + offset, args.user_id, args.username, chat_id)
+        started = time.perf_counter()
+        status = post(settings.local_url, payload, secret_token)
+        print(f"{settings.local_url} -> {status} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        if status != 200:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Bulk Ingest
+Pulls many torrents out of one message: links, .torrent files and zip archives
+"""
+
+import io
+import re
+import zipfile
+import zlib
+from typing import List, Optional, Tuple
+
+# Magnets end at whitespace; URLs also stop at quotes and angle brackets
+LINK_RE = re.compile(r'magnet:\?[^\s]+|https?://[^\s<>"\']+', re.IGNORECASE)
+
+ZIP_MAGIC = b'PK\x03\x04'
+
+def extract_links(text: str) -> List[str]:
+    """Magnet links and http(s) URLs in a message, in order, without duplicates"""
+    links = []
+    for match in LINK_RE.finditer(text or ''):
+        link = match.group(0).rstrip('.,;)')
+        if link not in links:
+            links.append(link)
+    return links
+
+def torrent_files(filename: str, data: bytes, max_size: int, max_files: int = 500,
+                  max_total: int = 50 * 1024 * 1024) -> List[Tuple[str, bytes]]:
+    """Split an upload into (name, .torrent bytes) pairs
+    
+    A .torrent upload yields itself; a zip archive yields every .torrent
+    inside it. Members larger than max_size are skipped and at most
+    max_files are read. An archive whose members add up to more than
+    max_total decompressed bytes is rejected before anything is extracted,
+    so memory use stays bounded by max_total. zipfile stops reading a member
+    at its declared size, so an archive cannot lie its way past the limits.
+    Raises ValueError for anything else, including encrypted or corrupt
+    archives.
+    """
+    if not data.startswith(ZIP_MAGIC):
+        if not filename.lower().endswith('.torrent'):
+            raise ValueError(f"{filename} is neither a .torrent file nor a zip archive")
+        if len(data) > max_size:
+            raise ValueError(f"{filename} is larger than {max_size} bytes")
+        return [(filename, data)]
+    
+    files = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            members = [
+                member for member in archive.infolist()
+                if not member.is_dir() and member.filename.lower().endswith('.torrent')
+                and '__MACOSX/' not in member.filename and member.file_size <= max_size
+            ][:max_files]
+            total = sum(member.file_size for member in members)
+            if total > max_total:
+                raise ValueError(f"{filename} expands to {total} bytes, more than the {max_total} allowed")
+            for member in members:
+                files.append((member.filename.rsplit('/', 1)[-1], archive.read(member)))
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"{filename} is not a valid zip archive: {e}") from e
+    except (RuntimeError, NotImplementedError, zlib.error, EOFError) as e:
+        # Encrypted members, unsupported compression methods, corrupt or truncated data
+        raise ValueError(f"Could not extract {filename}: {e}") from e
+    if not files:
+        raise ValueError(f"{filename} contains no .torrent files")
+    return files
+
+class IngestResult:
+    """Outcome of one bulk request, rendered as a single reply"""
+    
+    def __init__(self):
+        self.started: List[str] = []
+        self.queued: List[Tuple[str, int]] = []
+        self.failed: List[Tuple[str, str]] = []
+        self.duplicates: List[Tuple[str, str]] = []
+    
+    def __len__(self) -> int:
+        return len(self.started) + len(self.queued) + len(self.failed) + len(self.duplicates)
+    
+    def add(self, name: str, position: int):
+        """Record an admitted torrent (position 0 means it started right away)"""
+        if position:
+            self.queued.append((name, position))
+        else:
+            self.started.append(name)
+    
+    def skip(self, name: str, reason: str):
+        """Record a duplicate that was not added"""
+        self.duplicates.append((name, reason))
+    
+    def fail(self, source: str, error: str):
+        """Record a source that could not be added"""
+        self.failed.append((source, error))
+    
+    def summary(self, user_name: Optional[str] = None, max_lines: int = 30) -> str:
+        """One message listing what was started, queued and rejected"""
+        header = [f"📥 Received {len(self)} torrent{'s' if len(self) != 1 else ''}"]
+        if self.started:
+            header.append(f"✅ Started: {len(self.started)}")
+        if self.queued:
+            header.append(f"⏳ Queued: {len(self.queued)}")
+        if self.duplicates:
+            header.append(f"♻️ Duplicates: {len(self.duplicates)}")
+        if self.failed:
+            header.append(f"❌ Failed: {len(self.failed)}")
+        if user_name:
+            header.append(f"👤 Requested by: {user_name}")
+        
+        lines = [f"✅ {name}" for name in self.started]
+        lines += [f"⏳ #{position} {name}" for name, position in self.queued]
+        lines += [f"♻️ {name}: {reason}" for name, reason in self.duplicates]
+        lines += [f"❌ {source[:60]}: {error}" for source, error in self.failed]
+        if len(lines) > max_lines:
+            hidden = len(lines) - max_lines
+            lines = lines[:max_lines] + [f"… and {hidden} more"]
+        return '\n'.join(header + [''] + lines) if lines else '\n'.join(header)
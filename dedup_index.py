@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Dedup Index
+In-memory info-hash index of active, queued and completed torrents
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+ACTIVE = 'active'
+QUEUED = 'queued'
+COMPLETED = 'completed'
+SEEDING = 'seeding'
+ON_DISK = 'on_disk'
+
+class DedupEntry(NamedTuple):
+    """What the bot already knows about an info-hash"""
+    state: str
+    name: str
+    user: str
+    since: str = ''
+    
+    def describe(self) -> str:
+        """Human-readable reason a request is a duplicate"""
+        if self.state == ACTIVE:
+            return f"already downloading (requested by {self.user})"
+        if self.state == QUEUED:
+            return f"already queued (requested by {self.user})"
+        if self.state == COMPLETED:
+            return f"already downloaded by {self.user} on {self.since[:10]}"
+        if self.state == SEEDING:
+            return f"still seeding (downloaded by {self.user} on {self.since[:10]}), see /seeding"
+        return "already in the download folder"
+
+class DedupIndex:
+    """One entry per info-hash, so duplicate checks are a dict lookup
+    
+    Completed entries are loaded from the history database at start-up;
+    active and queued entries follow the torrents through admission,
+    completion, cancellation and removal. claim() checks and records in
+    one step, so two requests for the same torrent cannot both get in.
+    Only used from the event loop, so it needs no lock.
+    """
+    
+    def __init__(self):
+        self._entries: Dict[str, DedupEntry] = {}
+        # Completed entries replaced by a forced request, restored if it never completes
+        self._replaced: Dict[str, DedupEntry] = {}
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, info_hash: str) -> Optional[DedupEntry]:
+        """Return the entry for an info-hash"""
+        return self._entries.get(info_hash)
+    
+    def load_history(self, rows: Iterable[Tuple[str, str, str, str]]) -> int:
+        """Index completed downloads from (info_hash, name, user, completed) rows"""
+        loaded = 0
+        for info_hash, name, user, completed in rows:
+            if info_hash and info_hash not in self._entries:
+                self._entries[info_hash] = DedupEntry(COMPLETED, name, user, completed)
+                loaded += 1
+        return loaded
+    
+    def set(self, info_hash: str, state: str, name: str, user: str, since: str = ''):
+        """Record an info-hash's current state"""
+        if state == COMPLETED:
+            self._replaced.pop(info_hash, None)
+        self._entries[info_hash] = DedupEntry(state, name, user, since)
+    
+    def claim(self, info_hash: str, state: str, name: str, user: str,
+              allow_completed: bool = False) -> Optional[DedupEntry]:
+        """Record a new request, or return the entry it duplicates
+        
+        With allow_completed a torrent that was already downloaded may be
+        requested again; active and queued torrents are never added twice.
+        """
+        existing = self._entries.get(info_hash)
+        if existing is not None and (existing.state != COMPLETED or not allow_completed):
+            return existing
+        if existing is not None:
+            self._replaced[info_hash] = existing
+        self._entries[info_hash] = DedupEntry(state, name, user)
+        return None
+    
+    def discard(self, info_hash: str, state: str):
+        """Forget an info-hash if it is still in the given state (e.g. a cancelled queue entry)
+        
+        A completed entry that a forced request replaced comes back.
+        """
+        entry = self._entries.get(info_hash)
+        if entry is None or entry.state != state:
+            return
+        previous = self._replaced.pop(info_hash, None)
+        if previous is not None:
+            self._entries[info_hash] = previous
+        else:
+            del self._entries[info_hash]
+
+def content_exists(download_dir: str, name: str, total_size: int) -> bool:
+    """True if download_dir/name exists with exactly the torrent's total size"""
+    path = Path(download_dir) / name
+    try:
+        if path.is_file():
+            return path.stat().st_size == total_size
+        if not path.is_dir():
+            return False
+        size = 0
+        for root, _, files in os.walk(path):
+            for file_name in files:
+                size += os.path.getsize(os.path.join(root, file_name))
+                if size > total_size:
+                    return False
+        return size == total_size
+    except OSError:
+        return False
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Disk Space
+Free-space admission checks for the download directory
+"""
+
+import os
+import shutil
+from typing import NamedTuple, Tuple
+
+STORAGE_MODES = ('sparse', 'allocate')
+DISK_FULL_ACTIONS = ('queue', 'reject')
+
+class SpaceCheck(NamedTuple):
+    """Result of checking whether a torrent fits on disk"""
+    fits: bool
+    needed: int
+    free: int
+    reserved: int
+    margin: int
+    # Size of the filesystem; 0 when it could not be read
+    capacity: int = 0
+    
+    @property
+    def available(self) -> int:
+        """Space left for new torrents after reservations and the safety margin"""
+        return max(0, self.free - self.reserved - self.margin)
+    
+    @property
+    def too_large(self) -> bool:
+        """True when the torrent would not fit even on an empty filesystem"""
+        return self.capacity > 0 and self.needed > self.capacity - self.margin
+    
+    def admits(self, size: int) -> bool:
+        """Whether a torrent of size bytes fits as well (anything does if the filesystem could not be read)"""
+        return self.capacity == 0 or size <= self.free - self.reserved - self.margin
+    
+    def describe(self) -> str:
+        """Human-readable summary, e.g. for a rejection message"""
+        if self.too_large:
+            return f"needs {format_size(self.needed)}, the disk only holds {format_size(self.capacity)}"
+        return (
+            f"needs {format_size(self.needed)}, {format_size(self.available)} available "
+            f"({format_size(self.free)} free, {format_size(self.reserved)} reserved by active downloads)"
+        )
+
+def disk_bytes(path: str) -> Tuple[int, int]:
+    """Bytes an unprivileged process can still write, and the size of the filesystem holding path"""
+    if hasattr(os, 'statvfs'):
+        stat = os.statvfs(path)
+        return stat.f_bavail * stat.f_frsize, stat.f_blocks * stat.f_frsize
+    usage = shutil.disk_usage(path)
+    return usage.free, usage.total
+
+def check_space(path: str, needed: int, reserved: int, margin: int = 0) -> SpaceCheck:
+    """Check whether needed more bytes fit next to what active downloads have reserved"""
+    free, capacity = disk_bytes(path)
+    return SpaceCheck(needed <= free - reserved - margin, needed, free, reserved, margin, capacity)
+
+def format_size(size: float) -> str:
+    """Format a byte count as B/KB/MB/GB/TB"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
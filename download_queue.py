@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Download Queue
+Admission scheduler with per-user round-robin fairness
+"""
+
+import heapq
+import itertools
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+class QueuedDownload:
+    """A download waiting for a free slot"""
+    
+    def __init__(self, url: str, user: str, priority: int = 0, chat_id: Optional[int] = None,
+                 name: Optional[str] = None, params: Any = None, queued: Optional[str] = None,
+                 info_hash: Optional[str] = None, size: Optional[int] = None):
+        self.url = url
+        self.user = user
+        self.priority = priority
+        self.chat_id = chat_id
+        self.name = name or url
+        self.params = params
+        self.queued = queued or datetime.now().isoformat()
+        self.info_hash = info_hash
+        self.size = size
+        self.seq = 0
+    
+    def to_dict(self) -> Dict:
+        """Return the persistable fields (add params are rebuilt from the URL)"""
+        return {
+            'url': self.url,
+            'user': self.user,
+            'priority': self.priority,
+            'chat_id': self.chat_id,
+            'name': self.name,
+            'queued': self.queued,
+            'info_hash': self.info_hash,
+            'size': self.size
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'QueuedDownload':
+        """Rebuild a queued download saved with to_dict"""
+        return cls(
+            url=data['url'],
+            user=data['user'],
+            priority=data.get('priority', 0),
+            chat_id=data.get('chat_id'),
+            name=data.get('name'),
+            queued=data.get('queued'),
+            info_hash=data.get('info_hash'),
+            size=data.get('size')
+        )
+
+class DownloadScheduler:
+    """Priority queue that serves users round-robin
+    
+    Each user has their own heap ordered by priority (higher first) and then
+    arrival. pop() picks the highest priority among the users' next items;
+    ties go to whichever user has waited longest since they were last
+    served, so one user queueing a whole season cannot starve everyone else.
+    """
+    
+    def __init__(self, max_active: int = 3):
+        self.max_active = max_active
+        self.users: 'OrderedDict[str, List]' = OrderedDict()
+        self.counter = itertools.count(1)
+    
+    def __len__(self) -> int:
+        return sum(len(heap) for heap in self.users.values())
+    
+    def has_slot(self, active: int) -> bool:
+        """Return True if another download may start (0 means unlimited)"""
+        return self.max_active <= 0 or active < self.max_active
+    
+    def push(self, item: QueuedDownload) -> int:
+        """Queue a download, returning its 1-based position in service order"""
+        item.seq = next(self.counter)
+        heap = self.users.get(item.user)
+        if heap is None:
+            heap = self.users[item.user] = []
+        heapq.heappush(heap, (-item.priority, item.seq, item))
+        return self.position(item.seq)
+    
+    def _pick(self, users: 'OrderedDict[str, List]') -> Optional[str]:
+        """Return the user whose next item should be served"""
+        best_user = None
+        best_priority = None
+        for user, heap in users.items():
+            priority = heap[0][0]
+            if best_priority is None or priority < best_priority:
+                best_user, best_priority = user, priority
+        return best_user
+    
+    def peek(self) -> Optional[QueuedDownload]:
+        """Return the next download to start without removing it"""
+        user = self._pick(self.users)
+        return self.users[user][0][2] if user is not None else None
+    
+    def pop(self) -> Optional[QueuedDownload]:
+        """Remove and return the next download to start"""
+        user = self._pick(self.users)
+        if user is None:
+            return None
+        heap = self.users.pop(user)
+        _, _, item = heapq.heappop(heap)
+        if heap:
+            # Served users go to the back of the rotation
+            self.users[user] = heap
+        return item
+    
+    def take(self, seq: int) -> Optional[QueuedDownload]:
+        """Remove and return a queued download that starts out of turn, like pop() does for the next one"""
+        item = self.remove(seq)
+        if item is not None and item.user in self.users:
+            self.users.move_to_end(item.user)
+        return item
+    
+    def remove(self, seq: int) -> Optional[QueuedDownload]:
+        """Cancel a queued download by its sequence number"""
+        for user, heap in self.users.items():
+            for index, entry in enumerate(heap):
+                if entry[1] == seq:
+                    heap.pop(index)
+                    heapq.heapify(heap)
+                    if not heap:
+                        del self.users[user]
+                    return entry[2]
+        return None
+    
+    def ordered(self) -> List[QueuedDownload]:
+        """Return queued downloads in the order they would be started"""
+        users = OrderedDict((user, sorted(heap)) for user, heap in self.users.items())
+        order = []
+        while users:
+            user = self._pick(users)
+            entries = users.pop(user)
+            order.append(entries.pop(0)[2])
+            if entries:
+                users[user] = entries
+        return order
+    
+    def position(self, seq: int) -> int:
+        """Return the 1-based service position of a queued download, or 0"""
+        for index, item in enumerate(self.ordered(), 1):
+            if item.seq == seq:
+                return index
+        return 0
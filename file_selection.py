@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+File Selection
+Per-file priorities: which files of a torrent are downloaded and which are skipped
+"""
+
+import fnmatch
+import re
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Set
+
+# libtorrent file priorities: 0 skips a file, 4 is the default
+SKIP = 0
+DEFAULT = 4
+
+RANGE_RE = re.compile(r'^(\d+)(?:-(\d+))?$')
+
+class TorrentFile(NamedTuple):
+    """One file of a torrent; index is libtorrent's file index"""
+    index: int
+    path: str
+    size: int
+    
+    @property
+    def relative_path(self) -> str:
+        """Path inside the torrent's top-level directory"""
+        _, sep, rest = self.path.replace('\\', '/').partition('/')
+        return rest if sep else self.path
+
+def list_files(info) -> List[TorrentFile]:
+    """The files of a torrent_info, leaving out BEP 47 padding files"""
+    files = info.files()
+    pad_flag = getattr(files, 'flag_pad_file', 0)
+    listed = []
+    for index in range(files.num_files()):
+        if pad_flag and files.file_flags(index) & pad_flag:
+            continue
+        listed.append(TorrentFile(index, files.file_path(index), files.file_size(index)))
+    return listed
+
+def parse_patterns(value: str) -> List[str]:
+    """Split a comma-separated pattern list from config.ini"""
+    return [pattern.strip().lower() for pattern in value.split(',') if pattern.strip()]
+
+def matches(file: TorrentFile, pattern: str) -> bool:
+    """Case-insensitive glob match against the file name, its path in the torrent or its full path"""
+    pattern = pattern.lower()
+    path = file.path.replace('\\', '/').lower()
+    name = path.rsplit('/', 1)[-1]
+    return any(fnmatch.fnmatchcase(candidate, pattern) for candidate in (name, file.relative_path.lower(), path))
+
+def select(files: Sequence[TorrentFile], tokens: Iterable[str]) -> Set[int]:
+    """Resolve 1-based positions ('3', '2-5'), glob patterns and 'all' to file indices; raises ValueError"""
+    selected: Set[int] = set()
+    for token in tokens:
+        match = RANGE_RE.match(token)
+        if token.lower() == 'all':
+            chosen = [file.index for file in files]
+        elif match:
+            first = int(match.group(1))
+            last = int(match.group(2) or first)
+            if not 1 <= first <= last <= len(files):
+                raise ValueError(f"{token} is outside 1-{len(files)}")
+            chosen = [file.index for file in files[first - 1:last]]
+        else:
+            chosen = [file.index for file in files if matches(file, token)]
+        if not chosen:
+            raise ValueError(f"No file matches {token}")
+        selected.update(chosen)
+    return selected
+
+def selected_size(files: Iterable[TorrentFile], priorities: Sequence[int]) -> int:
+    """Total size of the files that will be downloaded"""
+    return sum(
+        file.size for file in files
+        if file.index >= len(priorities) or priorities[file.index] != SKIP
+    )
+
+class FileFilter:
+    """Default include/exclude patterns, applied as soon as a torrent's file list is known
+    
+    With include patterns only matching files are downloaded; exclude
+    patterns then skip files such as *.nfo or samples. A torrent where the
+    patterns would skip everything is downloaded in full instead.
+    """
+    
+    def __init__(self, include: Optional[List[str]] = None, exclude: Optional[List[str]] = None):
+        self.include = include or []
+        self.exclude = exclude or []
+    
+    def __bool__(self) -> bool:
+        return bool(self.include or self.exclude)
+    
+    def wanted(self, file: TorrentFile) -> bool:
+        """True if the patterns keep a file"""
+        if self.include and not any(matches(file, pattern) for pattern in self.include):
+            return False
+        return not any(matches(file, pattern) for pattern in self.exclude)
+    
+    def priorities(self, info) -> Optional[List[int]]:
+        """File priorities for a torrent_info, or None to download every file"""
+        if not self:
+            return None
+        files = info.files()
+        priorities = [DEFAULT] * files.num_files()
+        listed = list_files(info)
+        for file in listed:
+            if not self.wanted(file):
+                priorities[file.index] = SKIP
+        if all(priorities[file.index] == SKIP for file in listed) or SKIP not in priorities:
+            return None
+        return priorities
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+History Store
+Append-only, indexed download history backed by SQLite
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    info_hash TEXT,
+    name TEXT NOT NULL,
+    user TEXT NOT NULL,
+    started TEXT,
+    completed TEXT NOT NULL,
+    status TEXT NOT NULL,
+    url TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_downloads_completed ON downloads (completed);
+CREATE INDEX IF NOT EXISTS idx_downloads_user_completed ON downloads (user, completed);
+CREATE INDEX IF NOT EXISTS idx_downloads_info_hash ON downloads (info_hash);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+COLUMNS = ('id', 'info_hash', 'name', 'user', 'started', 'completed', 'status', 'url')
+
+class HistoryStore:
+    """Download history with unlimited retention
+    
+    Every completion is a single INSERT into a WAL-mode database, so writes
+    cost the same no matter how long the history is. Listing, filtering by
+    user or date range and lookups by info-hash all go through indexes.
+    
+    The methods are blocking; call them through asyncio.to_thread from the
+    event loop.
+    """
+    
+    def __init__(self, path: str = "history.db", logger: Optional[logging.Logger] = None):
+        self.path = Path(path)
+        self.logger = logger or logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+    
+    def add(self, entry: Dict) -> int:
+        """Append a history entry, returning its row id"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO downloads (info_hash, name, user, started, completed, status, url) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    entry.get('info_hash'),
+                    entry['name'],
+                    entry['user'],
+                    entry.get('started'),
+                    entry['completed'],
+                    entry.get('status', 'completed'),
+                    entry.get('url')
+                )
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+    
+    def _where(self, user: Optional[str], since: Optional[str], until: Optional[str]) -> Tuple[str, list]:
+        """Build the WHERE clause for the common filters"""
+        clauses = []
+        params = []
+        if user:
+            clauses.append("user = ?")
+            params.append(user)
+        if since:
+            clauses.append("completed >= ?")
+            params.append(since)
+        if until:
+            clauses.append("completed < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+    
+    def query(
+        self,
+        user: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 10,
+        offset: int = 0
+    ) -> List[Dict]:
+        """Return entries newest first, optionally filtered by user and ISO date range"""
+        where, params = self._where(user, since, until)
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM downloads{where} "
+                "ORDER BY completed DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def count(self, user: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None) -> int:
+        """Count entries matching the filters"""
+        where, params = self._where(user, since, until)
+        with self.lock:
+            return self.conn.execute(f"SELECT COUNT(*) FROM downloads{where}", params).fetchone()[0]
+    
+    def find_by_hash(self, info_hash: str) -> List[Dict]:
+        """Return every entry for an info-hash, newest first"""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM downloads WHERE info_hash = ? "
+                "ORDER BY completed DESC, id DESC",
+                (info_hash,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def completed_hashes(self) -> List[Tuple[str, str, str, str]]:
+        """(info_hash, name, user, completed) of the latest completion of every info-hash"""
+        with self.lock:
+            # SQLite takes the bare columns from the row holding MAX(completed)
+            rows = self.conn.execute(
+                "SELECT info_hash, name, user, MAX(completed) FROM downloads "
+                "WHERE info_hash IS NOT NULL AND status = 'completed' GROUP BY info_hash"
+            ).fetchall()
+        return [tuple(row) for row in rows]
+    
+    def migrate_json(self, json_path: str = "download_history.json") -> int:
+        """Import the legacy JSON history once, then rename the file out of the way"""
+        legacy = Path(json_path)
+        if not legacy.exists():
+            return 0
+        
+        migrated = legacy.with_suffix('.json.migrated')
+        with self.lock:
+            done = self.conn.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done is not None:
+            # Imported before, but the bot stopped before the file was renamed
+            legacy.rename(migrated)
+            self.logger.info(f"{legacy} was already migrated on {done[0]}, renamed it")
+            return 0
+        
+        try:
+            with open(legacy, 'r') as f:
+                entries = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error reading legacy history {legacy}: {e}")
+            return 0
+        
+        rows = [
+            (
+                entry.get('info_hash'),
+                entry.get('name', 'Unknown'),
+                entry.get('user', 'Unknown'),
+                entry.get('started'),
+                entry.get('completed', ''),
+                entry.get('status', 'completed'),
+                entry.get('url')
+            )
+            for entry in entries
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO downloads (info_hash, name, user, started, completed, status, url) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            # Recorded in the same transaction as the rows, so a crash before the rename cannot import twice
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('json_migrated', datetime('now'))"
+            )
+            self.conn.commit()
+        
+        legacy.rename(migrated)
+        self.logger.info(f"Migrated {len(rows)} history entries from {legacy}")
+        return len(rows)
+    
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            self.conn.close()
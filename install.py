@@ -10,6 +10,8 @@ import subprocess
 import configparser
 from pathlib import Path
 
+from webhook import generate_secret_token, load_webhook_settings
+
 def print_banner():
     """Print installation banner"""
     banner = """
@@ -138,6 +140,10 @@ def get_user_input():
         else:
             print("❌ Group ID cannot be empty!")
     
+    # Admin user IDs (optional)
+    admin_ids = input("🛡️  Enter admin Telegram user IDs, comma separated (optional): ").strip()
+    config['admin_ids'] = ','.join(part.strip() for part in admin_ids.split(',') if part.strip().isdigit())
+    
     # Download directory
     while True:
         download_dir = input("📁 Enter download directory path [./downloads]: ").strip()
@@ -154,6 +160,18 @@ def get_user_input():
         except Exception as e:
             print(f"❌ Error creating directory: {e}")
     
+    # Webhook mode (optional, needs an HTTPS reverse proxy in front of the bot)
+    while True:
+        webhook_url = input("🌐 Public HTTPS webhook URL behind your reverse proxy (empty = long polling): ").strip()
+        config['webhook_url'] = webhook_url
+        if not webhook_url:
+            break
+        try:
+            load_webhook_settings({'url': webhook_url, 'secret_token': generate_secret_token()})
+            break
+        except ValueError as e:
+            print(f"❌ {e}")
+    
     return config
 
 def create_config_file(config_data):
@@ -164,7 +182,8 @@ def create_config_file(config_data):
     
     config['telegram'] = {
         'bot_token': config_data['bot_token'],
-        'group_id': config_data['group_id']
+        'group_id': config_data['group_id'],
+        'admin_ids': config_data['admin_ids']
     }
     
     config['paths'] = {
@@ -174,7 +193,23 @@ def create_config_file(config_data):
     config['settings'] = {
         'max_concurrent_downloads': '3',
         'max_download_speed': '0',  # 0 = unlimited
-        'max_upload_speed': '0'     # 0 = unlimited
+        'max_upload_speed': '0',    # 0 = unlimited
+        'session_profile': 'default',
+        'listen_interfaces': '0.0.0.0:6881,[::]:6881'
+    }
+    
+    config['metrics'] = {
+        'enabled': 'false',
+        'host': '127.0.0.1',
+        'port': '9464'
+    }
+    
+    config['webhook'] = {
+        'enabled': 'true' if config_data['webhook_url'] else 'false',
+        'url': config_data['webhook_url'],
+        'listen': '127.0.0.1',
+        'port': '8443',
+        'secret_token': generate_secret_token()
     }
     
     try:
@@ -198,7 +233,7 @@ def create_directories():
         except Exception as e:
             print(f"❌ Error creating {directory}: {e}")
 
-def create_systemd_service():
+def create_systemd_service(config_data):
     """Create systemd service file"""
     print("\n🔧 Creating systemd service...")
     
@@ -206,9 +241,15 @@ def create_systemd_service():
     python_path = current_dir / "venv" / "bin" / "python"
     script_path = current_dir / "torrent_bot.py"
     
+    # The webhook is registered with Telegram at start-up, so wait for the network to be up
+    if config_data['webhook_url']:
+        network = "Wants=network-online.target\nAfter=network-online.target"
+    else:
+        network = "After=network.target"
+    
     service_content = f"""[Unit]
 Description=Telegram Torrent Bot
-After=network.target
+{network}
 
 [Service]
 Type=simple
@@ -300,8 +341,12 @@ def print_final_instructions():
 🤖 Bot Commands:
    • /download <torrent_link> - Download a torrent
    • /status - Show current downloads
+   • /queue - Show queued downloads
+   • /seeding - Show finished torrents that are still seeding
+   • /files <hash> - Pick which files of a torrent to download
    • /logs - Show recent logs
    • /history - Show download history
+   • /help - List every command
 
 ⚠️  Important Notes:
    • Make sure your bot is added to the Telegram group
@@ -313,6 +358,23 @@ def print_final_instructions():
 """
     print(instructions)
 
+def print_webhook_instructions():
+    """Print the reverse proxy settings matching the generated [webhook] section"""
+    config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'))
+    config.read('config.ini')
+    webhook = load_webhook_settings(config['webhook'])
+    print(f"""🌐 Webhook mode:
+   Telegram will post updates to {webhook.url}
+   Point your reverse proxy at the bot's listener, e.g. for nginx:
+
+   location /{webhook.url_path} {{
+       proxy_pass {webhook.local_url};
+   }}
+
+   Test the listener locally (sends /status as if from Telegram):
+   venv/bin/python bench/webhook_post.py
+""")
+
 def main():
     """Main installation function"""
     try:
@@ -334,11 +396,13 @@ def main():
         # Create configuration and files
         create_config_file(config_data)
         create_directories()
-        create_systemd_service()
+        create_systemd_service(config_data)
         create_startup_script()
         
         # Show final instructions
         print_final_instructions()
+        if config_data['webhook_url']:
+            print_webhook_instructions()
         
     except KeyboardInterrupt:
         print("\n❌ Installation cancelled by user")
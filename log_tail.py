@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Log Tail
+Constant-time log tailing and filtered reverse search for /logs
+"""
+
+import re
+from typing import Iterator, List, Optional
+
+LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+
+def iter_lines_reverse(path: str, block_size: int = 64 * 1024) -> Iterator[str]:
+    """Yield the lines of a file from last to first, reading fixed-size blocks from the end
+    
+    Only as much of the file as the caller consumes is ever read, so showing
+    the last few lines of a multi-GB log costs one or two block reads.
+    """
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        position = f.tell()
+        remainder = b''
+        first = True
+        
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size) + remainder
+            lines = block.split(b'\n')
+            # The first piece may be the tail of a line that starts in an earlier block
+            remainder = lines.pop(0)
+            
+            if first:
+                first = False
+                if lines and lines[-1] == b'':
+                    lines.pop()
+            
+            for line in reversed(lines):
+                yield line.decode('utf-8', errors='replace')
+        
+        if remainder:
+            yield remainder.decode('utf-8', errors='replace')
+
+def line_level(line: str) -> Optional[str]:
+    """Return the level of a '%(asctime)s - %(levelname)s - %(message)s' line"""
+    parts = line.split(' - ', 2)
+    if len(parts) >= 2 and parts[1] in LEVELS:
+        return parts[1]
+    return None
+
+def compile_pattern(pattern: Optional[str]) -> Optional['re.Pattern']:
+    """Compile a case-insensitive substring search
+    
+    Patterns come from any group member and are matched against every line
+    in a worker thread that cannot be cancelled, so they are never run as
+    regexes: a pattern like (a+)+$ would backtrack indefinitely.
+    """
+    if not pattern:
+        return None
+    return re.compile(re.escape(pattern), re.IGNORECASE)
+
+def tail_lines(
+    path: str,
+    count: int = 20,
+    level: Optional[str] = None,
+    pattern: Optional[str] = None
+) -> List[str]:
+    """Return the last count lines, optionally at or above a level and matching a pattern
+    
+    Scanning stops as soon as enough matching lines are found.
+    """
+    min_level = LEVELS.index(level.upper()) if level else None
+    regex = compile_pattern(pattern)
+    
+    matched = []
+    for line in iter_lines_reverse(path):
+        if min_level is not None:
+            line_lvl = line_level(line)
+            if line_lvl is None or LEVELS.index(line_lvl) < min_level:
+                continue
+        if regex is not None and not regex.search(line):
+            continue
+        matched.append(line)
+        if len(matched) >= count:
+            break
+    
+    matched.reverse()
+    return matched
+
+def chunk_lines(lines: List[str], limit: int = 4000) -> List[str]:
+    """Join lines into chunks no longer than limit characters, splitting only at line breaks"""
+    chunks = []
+    current = []
+    size = 0
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 3] + '...'
+        if current and size + len(line) + 1 > limit:
+            chunks.append('\n'.join(current))
+            current = []
+            size = 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
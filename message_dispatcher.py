@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Message Dispatcher
+Rate-limited, coalescing outbound Telegram messages
+"""
+
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+class TokenBucket:
+    """Classic token bucket: rate tokens per second, up to capacity"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def delay(self) -> float:
+        """Seconds to wait before a token is available (0 if one is available now)"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+    
+    async def acquire(self):
+        """Wait for and take one token"""
+        while True:
+            wait = self.delay()
+            if wait <= 0:
+                self.tokens -= 1
+                return
+            await asyncio.sleep(wait)
+    
+    def block(self, seconds: float):
+        """Refuse tokens for a while, e.g. after Telegram answered RetryAfter"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+class MessageDispatcher:
+    """Sends bot messages through per-chat queues with flood control
+    
+    Each chat gets a FIFO queue drained by its own worker, gated by a
+    per-chat token bucket and one global bucket. When Telegram answers with
+    RetryAfter (any exception carrying a retry_after attribute), the chat is
+    paused for that long and the message is retried.
+    
+    send_digest() coalesces messages of the same kind that arrive within
+    digest_window seconds into one digest, so 30 torrents of a season pack
+    finishing together produce one notification instead of 30.
+    """
+    
+    def __init__(
+        self,
+        bot,
+        logger: Optional[logging.Logger] = None,
+        chat_rate: float = 20 / 60,
+        chat_burst: float = 3,
+        global_rate: float = 25,
+        digest_window: float = 3.0,
+        max_retries: int = 5,
+        message_limit: int = 4000
+    ):
+        self.bot = bot
+        self.logger = logger or logging.getLogger(__name__)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.digest_window = digest_window
+        self.max_retries = max_retries
+        self.message_limit = message_limit
+        
+        self.buckets: Dict[int, TokenBucket] = {}
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        self.digests: Dict[Tuple[int, str], List[Tuple[str, str, Optional[str]]]] = {}
+        self.digest_tasks: Set[asyncio.Task] = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+    
+    def pending(self) -> int:
+        """Number of messages waiting to be sent"""
+        queued = sum(queue.qsize() for queue in self.queues.values())
+        return queued + sum(len(lines) for lines in self.digests.values())
+    
+    def _queue(self, chat_id: int) -> asyncio.Queue:
+        """Return the queue for a chat, starting its worker if needed"""
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            queue = self.queues[chat_id] = asyncio.Queue()
+            self.buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        worker = self.workers.get(chat_id)
+        if worker is None or worker.done():
+            self.workers[chat_id] = asyncio.create_task(self._worker(chat_id, queue))
+        return queue
+    
+    def send(self, chat_id: int, text: str, parse_mode: Optional[str] = None, **kwargs) -> asyncio.Future:
+        """Queue a message; the returned future resolves to the sent Message (or None on failure)"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue(int(chat_id)).put_nowait((
+            'send_message',
+            dict(chat_id=chat_id, text=text, parse_mode=parse_mode, **kwargs),
+            future
+        ))
+        return future
+    
+    def edit(self, chat_id: int, message_id: int, text: str, parse_mode: Optional[str] = None, **kwargs) -> asyncio.Future:
+        """Queue an edit of an existing message"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue(int(chat_id)).put_nowait((
+            'edit_message_text',
+            dict(chat_id=chat_id, message_id=message_id, text=text, parse_mode=parse_mode, **kwargs),
+            future
+        ))
+        return future
+    
+    def send_digest(self, chat_id: int, text: str, line: str, title: str, parse_mode: Optional[str] = None):
+        """Queue a message that may be merged with others of the same title
+        
+        If it is the only one within the window, text is sent as-is;
+        otherwise one message with the title ('{count}' is replaced by the
+        number of merged messages) and every line is sent.
+        """
+        key = (int(chat_id), title)
+        batch = self.digests.get(key)
+        if batch is None:
+            batch = self.digests[key] = []
+            task = asyncio.create_task(self._flush_digest(key))
+            self.digest_tasks.add(task)
+            task.add_done_callback(self.digest_tasks.discard)
+        batch.append((text, line, parse_mode))
+    
+    async def _flush_digest(self, key: Tuple[int, str]):
+        """Send a digest once its window has passed"""
+        await asyncio.sleep(self.digest_window)
+        self._send_digest(key)
+    
+    def _send_digest(self, key: Tuple[int, str]):
+        """Queue the message(s) for one digest"""
+        chat_id, title = key
+        batch = self.digests.pop(key, [])
+        if not batch:
+            return
+        parse_mode = batch[0][2]
+        if len(batch) == 1:
+            self.send(chat_id, batch[0][0], parse_mode)
+            return
+        
+        header = title.format(count=len(batch)) + "\n\n"
+        message = header
+        for _, line, _ in batch:
+            if message != header and len(message) + len(line) + 1 > self.message_limit:
+                self.send(chat_id, message.rstrip(), parse_mode)
+                message = header
+            message += line + "\n"
+        self.send(chat_id, message.rstrip(), parse_mode)
+    
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        """Extract the flood-wait delay from a RetryAfter-style error"""
+        retry_after = getattr(error, 'retry_after', None)
+        if isinstance(retry_after, timedelta):
+            return retry_after.total_seconds()
+        if isinstance(retry_after, (int, float)):
+            return float(retry_after)
+        return None
+    
+    async def _worker(self, chat_id: int, queue: asyncio.Queue):
+        """Drain one chat's queue in order"""
+        bucket = self.buckets[chat_id]
+        while True:
+            method, kwargs, future = await queue.get()
+            try:
+                result = await self._deliver(bucket, method, kwargs)
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                queue.task_done()
+    
+    async def _deliver(self, bucket: TokenBucket, method: str, kwargs: Dict):
+        """Send one request, honouring rate limits and RetryAfter"""
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                result = await getattr(self.bot, method)(**kwargs)
+                self.sent += 1
+                return result
+            except Exception as e:
+                retry_after = self._retry_after(e)
+                if retry_after is None or attempt == self.max_retries:
+                    self.failed += 1
+                    self.logger.error(f"Failed to {method.replace('_', ' ')} to {kwargs.get('chat_id')}: {e}")
+                    return None
+                self.retried += 1
+                self.logger.warning(f"Flood limit for chat {kwargs.get('chat_id')}, retrying in {retry_after:.1f}s")
+                bucket.block(retry_after)
+        return None
+    
+    async def flush(self, timeout: float = 10.0):
+        """Send pending digests now and wait for the queues to drain"""
+        for task in list(self.digest_tasks):
+            task.cancel()
+        for key in list(self.digests):
+            self._send_digest(key)
+        if not self.queues:
+            return
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self.queues.values())),
+                timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Timed out flushing {self.pending()} outgoing messages")
+    
+    async def close(self):
+        """Stop all workers"""
+        for task in self.workers.values():
+            task.cancel()
+        self.workers.clear()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Metrics
+Minimal Prometheus text-format metrics and a local HTTP endpoint
+"""
+
+import asyncio
+import bisect
+import logging
+import math
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    """Render {name="value",...}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    """Render a sample value"""
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Metric:
+    """Base class: a named family of samples keyed by label values"""
+    kind = 'untyped'
+    
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.values: Dict[Tuple[str, ...], float] = {}
+    
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Label values in declaration order"""
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+    
+    def clear(self):
+        """Drop every sample (for gauges rebuilt on each scrape)"""
+        self.values.clear()
+    
+    def samples(self) -> List[str]:
+        """Render the sample lines"""
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in self.values.items()
+        ]
+    
+    def render(self) -> List[str]:
+        """Render HELP, TYPE and sample lines"""
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+class Counter(Metric):
+    """Monotonically increasing value"""
+    kind = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        """Increase the counter"""
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+    
+    def set(self, value: float, **labels):
+        """Set a counter that is maintained elsewhere (e.g. libtorrent's own counters)"""
+        self.values[self._key(labels)] = value
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+    kind = 'gauge'
+    
+    def set(self, value: float, **labels):
+        """Set the gauge"""
+        self.values[self._key(labels)] = value
+
+class Histogram(Metric):
+    """Cumulative histogram with fixed buckets"""
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.counts: Dict[Tuple[str, ...], List[int]] = {}
+        self.sums: Dict[Tuple[str, ...], float] = {}
+    
+    def observe(self, value: float, **labels):
+        """Record one observation"""
+        key = self._key(labels)
+        counts = self.counts.get(key)
+        if counts is None:
+            counts = self.counts[key] = [0] * (len(self.buckets) + 1)
+            self.sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sums[key] += value
+    
+    def samples(self) -> List[str]:
+        """Render cumulative bucket, sum and count lines"""
+        lines = []
+        for key, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self.sums[key])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """Holds metric families and collectors that refresh them before each scrape"""
+    
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], None]] = []
+    
+    def _register(self, metric: Metric) -> Metric:
+        """Add a metric, returning the existing one if the name is taken"""
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        """Create or return a counter"""
+        return self._register(Counter(name, help_text, labels))
+    
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        """Create or return a gauge"""
+        return self._register(Gauge(name, help_text, labels))
+    
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Create or return a histogram"""
+        return self._register(Histogram(name, help_text, labels, buckets))
+    
+    def add_collector(self, collector: Callable[[], None]):
+        """Register a callable that updates gauges right before rendering"""
+        self.collectors.append(collector)
+    
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format"""
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error in metrics collector: {e}")
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+class MetricsServer:
+    """Serves GET /metrics from a registry on a local port"""
+    
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464,
+                 logger: Optional[logging.Logger] = None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.logger = logger or logging.getLogger(__name__)
+        self.server: Optional[asyncio.AbstractServer] = None
+    
+    async def start(self):
+        """Start listening"""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer one HTTP/1.0-style request and close the connection"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Drain the headers
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+            
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] == '/metrics':
+                body = self.registry.render().encode()
+                status = '200 OK'
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                body = b'Not Found\n'
+                status = '404 Not Found'
+                content_type = 'text/plain'
+            
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except Exception as e:
+            self.logger.debug(f"Metrics request failed: {e}")
+        finally:
+            writer.close()
+    
+    async def stop(self):
+        """Stop listening"""
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Performance Monitoring
+Event-loop lag sampling, handler timings and an on-demand sampling profiler
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Return the given percentile (0-1) of a list of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+class StartupTimer:
+    """Wall-clock timings of the start-up phases, logged as each one finishes
+    
+    Phases overlap when they run concurrently, so their durations add up to
+    more than the time to reach a milestone.
+    """
+    
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+        self.started = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.milestones: List[Tuple[str, float]] = []
+    
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block as a phase"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.phases.append((name, elapsed))
+            self.logger.info(f"Startup phase '{name}' took {elapsed * 1000:.0f} ms")
+    
+    async def run(self, name: str, awaitable):
+        """Await a phase and return its result"""
+        with self.phase(name):
+            return await awaitable
+    
+    def milestone(self, name: str):
+        """Log the time since start-up began"""
+        elapsed = time.perf_counter() - self.started
+        self.milestones.append((name, elapsed))
+        self.logger.info(f"Startup: {name} after {elapsed:.2f}s")
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up from a fixed sleep
+    
+    Anything that blocks the loop (synchronous I/O, a long libtorrent call,
+    CPU-heavy parsing) shows up as lag, because the sampler's own timer
+    fires late by the same amount.
+    """
+    
+    def __init__(self, interval: float = 0.25, window: int = 1200,
+                 on_sample: Optional[Callable[[float], None]] = None):
+        self.interval = interval
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.on_sample = on_sample
+        self.worst = 0.0
+    
+    async def run(self):
+        """Sample lag forever"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            self.worst = max(self.worst, lag)
+            if self.on_sample is not None:
+                self.on_sample(lag)
+    
+    def stats(self) -> Dict[str, float]:
+        """Lag statistics over the sampling window, in seconds"""
+        samples = list(self.samples)
+        return {
+            'current': samples[-1] if samples else 0.0,
+            'p50': percentile(samples, 0.5),
+            'p99': percentile(samples, 0.99),
+            'max': max(samples) if samples else 0.0,
+            'worst': self.worst,
+            'window': len(samples) * self.interval
+        }
+
+class HandlerTimings:
+    """Keeps the most recent durations of every command handler"""
+    
+    def __init__(self, window: int = 200):
+        self.window = window
+        self.durations: Dict[str, Deque[float]] = {}
+        self.calls: Counter = Counter()
+    
+    def record(self, name: str, seconds: float):
+        """Record one handler run"""
+        durations = self.durations.get(name)
+        if durations is None:
+            durations = self.durations[name] = deque(maxlen=self.window)
+        durations.append(seconds)
+        self.calls[name] += 1
+    
+    def summary(self) -> List[Tuple[str, int, float, float, float]]:
+        """(name, calls, p50, p95, max) per handler, slowest p95 first"""
+        rows = []
+        for name, durations in self.durations.items():
+            values = list(durations)
+            rows.append((name, self.calls[name], percentile(values, 0.5), percentile(values, 0.95), max(values)))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+class SamplingProfiler:
+    """Statistical profiler that samples another thread's stack
+    
+    It runs in its own thread and reads the target thread's current frame
+    via sys._current_frames(), so profiling the event loop does not require
+    instrumenting it and costs the loop nothing beyond the GIL switches.
+    """
+    
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+    
+    @staticmethod
+    def describe(frame) -> str:
+        """file:line (function) for a frame"""
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{frame.f_lineno} ({code.co_name})"
+    
+    def run(self, duration: float) -> Tuple[int, Counter, Counter]:
+        """Sample for duration seconds; return (samples, self-time counts, cumulative counts)"""
+        own = Counter()
+        cumulative = Counter()
+        samples = 0
+        deadline = time.monotonic() + duration
+        me = threading.get_ident()
+        
+        while time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None and self.thread_id != me:
+                samples += 1
+                own[self.describe(frame)] += 1
+                seen = set()
+                while frame is not None:
+                    code = frame.f_code
+                    key = f"{os.path.basename(code.co_filename)} ({code.co_name})"
+                    if key not in seen:
+                        cumulative[key] += 1
+                        seen.add(key)
+                    frame = frame.f_back
+            time.sleep(self.interval)
+        
+        return samples, own, cumulative
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Post Process
+Post-completion pipeline: link into the library, extract archives, verify, clean up
+"""
+
+import asyncio
+import errno
+import fnmatch
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import time
+import zipfile
+import zlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+STAGES = ('link', 'extract', 'verify', 'cleanup')
+LINK_MODES = ('hardlink', 'copy')
+
+RAR_PART_RE = re.compile(r'\.part0*(\d+)\.rar$', re.IGNORECASE)
+RAR_VOLUME_RE = re.compile(r'\.(rar|r\d\d|\d{3})$', re.IGNORECASE)
+
+def plural(count: int, noun: str) -> str:
+    """'1 file', '2 files'"""
+    return f"{count} {noun}{'s' if count != 1 else ''}"
+
+# -- process-pool workers (top level so they can be pickled) ------------------
+
+def extract_zip(archive: str, destination: str) -> int:
+    """Extract a zip archive, refusing members outside destination; returns the number of files"""
+    root = os.path.realpath(destination)
+    extracted = 0
+    with zipfile.ZipFile(archive) as zf:
+        for member in zf.infolist():
+            target = os.path.realpath(os.path.join(root, member.filename))
+            if os.path.commonpath([root, target]) != root:
+                raise ValueError(f"unsafe path in {os.path.basename(archive)}: {member.filename}")
+            # Raises BadZipFile if a member's CRC does not match
+            zf.extract(member, root)
+            if not member.is_dir():
+                extracted += 1
+    return extracted
+
+def test_zip(archive: str) -> Optional[str]:
+    """Read every member of a zip archive; returns the first corrupt member, or None"""
+    with zipfile.ZipFile(archive) as zf:
+        return zf.testzip()
+
+def file_crc32(path: str, chunk_size: int = 1024 * 1024) -> int:
+    """CRC32 of a file's contents"""
+    crc = 0
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return crc
+            crc = zlib.crc32(chunk, crc)
+
+def compare_files(pairs: List[Tuple[str, str]]) -> Optional[str]:
+    """Hash each (source, copy) pair; returns the first copy that differs, or None"""
+    for source, copy in pairs:
+        if file_crc32(source) != file_crc32(copy):
+            return copy
+    return None
+
+# -- thread-pool workers ------------------------------------------------------
+
+def link_tree(source: Path, target: Path, mode: str) -> Tuple[int, List[Tuple[str, str]]]:
+    """Mirror source (a file or directory) at target with hardlinks or copies
+    
+    Hardlinks fall back to copies across filesystems. Files that already
+    exist at the target with the same size are left alone. Returns the
+    number of hardlinked files and the (source, copy) pairs that were copied.
+    """
+    if source.is_dir():
+        files = [Path(root) / name for root, _, names in os.walk(source) for name in names]
+    elif source.is_file():
+        files = [source]
+    else:
+        raise FileNotFoundError(f"{source} does not exist")
+    
+    linked, copies = 0, []
+    for path in files:
+        destination = target / path.relative_to(source) if path != source else target
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        if destination.exists():
+            if destination.stat().st_size == path.stat().st_size:
+                continue
+            destination.unlink()
+        if mode == 'hardlink':
+            try:
+                os.link(path, destination)
+                linked += 1
+                continue
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+        shutil.copy2(path, destination)
+        copies.append((str(path), str(destination)))
+    return linked, copies
+
+def extraction_dir(archive: Path) -> Path:
+    """Create an empty directory next to an archive to unpack it into
+    
+    Named after the archive, with a numeric suffix if that name is taken.
+    Extracting into a fresh directory never writes to an existing file,
+    which in the library may be a hardlink to the data being seeded.
+    """
+    part = RAR_PART_RE.search(archive.name)
+    stem = archive.name[:part.start()] if part else archive.name[:-len(archive.suffix)]
+    for index in range(1, 1000):
+        destination = archive.parent / (stem if index == 1 else f"{stem}.{index}")
+        try:
+            destination.mkdir()
+            return destination
+        except FileExistsError:
+            continue
+    raise FileExistsError(f"no free directory to extract {archive.name} into")
+
+def find_archives(root: Path) -> List[Path]:
+    """Zip archives and the first volume of every RAR set under root"""
+    paths = [Path(dirpath) / name for dirpath, _, names in os.walk(root) for name in names] if root.is_dir() else [root]
+    archives = []
+    for path in sorted(paths):
+        name = path.name.lower()
+        if name.endswith('.zip'):
+            archives.append(path)
+        elif name.endswith('.rar'):
+            part = RAR_PART_RE.search(name)
+            if part is None or int(part.group(1)) == 1:
+                archives.append(path)
+    return archives
+
+def archive_volumes(archive: Path) -> List[Path]:
+    """Every file belonging to an archive: itself plus .rNN / .partNN.rar volumes"""
+    if archive.suffix.lower() != '.rar':
+        return [archive]
+    part = RAR_PART_RE.search(archive.name)
+    stem = archive.name[:part.start()] if part else archive.name[:-len(archive.suffix)]
+    volumes = []
+    for path in archive.parent.iterdir():
+        if not path.name.startswith(stem) or not path.is_file():
+            continue
+        rest = path.name[len(stem):]
+        if (part and RAR_PART_RE.fullmatch(rest)) or (not part and RAR_VOLUME_RE.fullmatch(rest)):
+            volumes.append(path)
+    return volumes
+
+def remove_files(paths: Iterable[Path], root: Path) -> int:
+    """Delete files, then any directories under root they leave empty"""
+    removed = 0
+    for path in paths:
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            continue
+        parent = path.parent
+        while parent != root and root in parent.parents:
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+            parent = parent.parent
+    return removed
+
+# -- pipeline -----------------------------------------------------------------
+
+class StageResult(NamedTuple):
+    """Outcome of one pipeline stage"""
+    stage: str
+    status: str
+    seconds: float
+    detail: str = ''
+
+class PostResult:
+    """Outcome of a whole pipeline run, rendered as one chat message"""
+    
+    ICONS = {'ok': '✅', 'failed': '❌', 'skipped': '⏭️'}
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: List[StageResult] = []
+    
+    @property
+    def ok(self) -> bool:
+        return all(stage.status != 'failed' for stage in self.stages)
+    
+    @property
+    def seconds(self) -> float:
+        return sum(stage.seconds for stage in self.stages)
+    
+    def summary(self, user_name: Optional[str] = None) -> str:
+        """One message with a line per stage"""
+        header = "📦 Post-processing done" if self.ok else "⚠️ Post-processing failed"
+        lines = [f"{header} ({self.seconds:.1f}s)", f"🎬 {self.name}"]
+        for stage in self.stages:
+            timing = f" • {stage.seconds:.1f}s" if stage.status != 'skipped' else ""
+            detail = f": {stage.detail}" if stage.detail else ""
+            lines.append(f"{self.ICONS[stage.status]} {stage.stage}{detail}{timing}")
+        if user_name:
+            lines.append(f"👤 Requested by: {user_name}")
+        return '\n'.join(lines)
+
+class PostJob:
+    """Working state of one torrent moving through the pipeline"""
+    
+    def __init__(self, name: str, source: Path):
+        self.name = name
+        self.source = source
+        self.target = source
+        self.copies: List[Tuple[str, str]] = []
+        self.extracted: List[Path] = []
+
+class PostProcessor:
+    """Runs finished torrents through link → extract → verify → cleanup
+    
+    Zip extraction and hashing run in a process pool (started with
+    'spawn', so workers never inherit libtorrent's threads); RAR sets are
+    handed to unrar or 7z as subprocesses; linking, copying and deleting
+    run in a thread pool. The event loop only awaits the results. A failed
+    stage skips the ones after it. Files are linked or copied into
+    library_dir, never moved, so the torrent keeps seeding from the
+    download directory, and cleanup only ever deletes inside the library.
+    """
+    
+    def __init__(
+        self,
+        stages: Iterable[str],
+        library_dir: str = '',
+        link_mode: str = 'hardlink',
+        max_jobs: int = 2,
+        process_workers: int = 2,
+        thread_workers: int = 4,
+        cleanup_patterns: Iterable[str] = (),
+        logger: Optional[logging.Logger] = None
+    ):
+        stages = set(stages)
+        unknown = stages - set(STAGES)
+        if unknown:
+            raise ValueError(f"unknown post-processing stages: {', '.join(sorted(unknown))}")
+        self.stages = [stage for stage in STAGES if stage in stages]
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"link_mode must be one of {', '.join(LINK_MODES)}")
+        if 'link' in self.stages and not library_dir:
+            raise ValueError("the link stage needs [paths] library_dir")
+        self.library_dir = Path(library_dir) if library_dir else None
+        self.link_mode = link_mode
+        self.process_workers = process_workers
+        self.cleanup_patterns = [pattern.lower() for pattern in cleanup_patterns]
+        self.logger = logger or logging.getLogger(__name__)
+        self.jobs = asyncio.Semaphore(max_jobs)
+        self.threads = ThreadPoolExecutor(thread_workers, thread_name_prefix='postprocess')
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self.rar_tool = shutil.which('unrar') or shutil.which('7z') or shutil.which('7za')
+    
+    @property
+    def processes(self) -> ProcessPoolExecutor:
+        """Process pool, started on first use"""
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(
+                self.process_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._processes
+    
+    async def _run_in(self, executor: Executor, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    
+    async def run(self, name: str, source: Path) -> PostResult:
+        """Run every configured stage for a finished torrent"""
+        result = PostResult(name)
+        job = PostJob(name, source)
+        async with self.jobs:
+            failed = False
+            for stage in self.stages:
+                if failed:
+                    result.stages.append(StageResult(stage, 'skipped', 0.0))
+                    continue
+                started = time.perf_counter()
+                try:
+                    detail = await getattr(self, f'stage_{stage}')(job)
+                    status = 'ok'
+                except Exception as e:
+                    detail, status, failed = str(e) or type(e).__name__, 'failed', True
+                    self.logger.error(f"Post-processing {stage} failed for {name}: {detail}")
+                result.stages.append(StageResult(stage, status, time.perf_counter() - started, detail))
+        return result
+    
+    async def stage_link(self, job: PostJob) -> str:
+        """Hardlink (or copy) the download into the library"""
+        job.target = self.library_dir / job.name
+        linked, job.copies = await self._run_in(self.threads, link_tree, job.source, job.target, self.link_mode)
+        if not linked and not job.copies:
+            return "already in the library"
+        parts = []
+        if linked:
+            parts.append(f"{linked} hardlinked")
+        if job.copies:
+            parts.append(f"{len(job.copies)} copied")
+        return ', '.join(parts)
+    
+    async def stage_extract(self, job: PostJob) -> str:
+        """Unpack zip archives in the process pool and RAR sets with unrar/7z"""
+        archives = await self._run_in(self.threads, find_archives, job.target)
+        if not archives:
+            return "no archives"
+        files = 0
+        for archive in archives:
+            destination = await self._run_in(self.threads, extraction_dir, archive)
+            if archive.suffix.lower() == '.zip':
+                files += await self._run_in(self.processes, extract_zip, str(archive), str(destination))
+            else:
+                await self.run_rar_tool(archive, destination, test=False)
+            job.extracted.append(archive)
+        detail = plural(len(archives), 'archive')
+        return f"{detail}, {plural(files, 'file')}" if files else detail
+    
+    async def stage_verify(self, job: PostJob) -> str:
+        """Hash copied files against their sources and test every archive"""
+        checked = []
+        if job.copies:
+            mismatch = await self._run_in(self.processes, compare_files, job.copies)
+            if mismatch:
+                raise ValueError(f"copy differs from the download: {os.path.basename(mismatch)}")
+            checked.append(f"{len(job.copies)} copies match")
+        
+        if 'extract' in self.stages:
+            # Extraction already checked the CRC of every member
+            archives = []
+            if job.extracted:
+                checked.append(f"{plural(len(job.extracted), 'archive')} CRC-checked while extracting")
+        else:
+            archives = await self._run_in(self.threads, find_archives, job.target)
+        for archive in archives:
+            if archive.suffix.lower() == '.zip':
+                corrupt = await self._run_in(self.processes, test_zip, str(archive))
+                if corrupt:
+                    raise ValueError(f"{archive.name} is corrupt at {corrupt}")
+            else:
+                await self.run_rar_tool(archive, None, test=True)
+        if archives:
+            checked.append(f"{plural(len(archives), 'archive')} tested")
+        return ', '.join(checked) if checked else "hardlinks only, nothing to hash"
+    
+    async def stage_cleanup(self, job: PostJob) -> str:
+        """Delete extracted archives and junk files from the library copy"""
+        if job.target == job.source:
+            # Without the link stage the files are the ones being seeded
+            return "skipped, files are still seeding"
+        
+        def collect() -> List[Path]:
+            paths = [volume for archive in job.extracted for volume in archive_volumes(archive)]
+            if self.cleanup_patterns and job.target.is_dir():
+                for root, _, names in os.walk(job.target):
+                    for name in names:
+                        if any(fnmatch.fnmatch(name.lower(), pattern) for pattern in self.cleanup_patterns):
+                            paths.append(Path(root) / name)
+            return paths
+        
+        paths = await self._run_in(self.threads, collect)
+        removed = await self._run_in(self.threads, remove_files, paths, job.target)
+        return f"{plural(removed, 'file')} removed" if removed else "nothing to remove"
+    
+    async def run_rar_tool(self, archive: Path, destination: Optional[Path], test: bool):
+        """Extract or test a RAR set with unrar or 7z in a subprocess"""
+        if self.rar_tool is None:
+            raise RuntimeError(f"cannot open {archive.name}: install unrar or 7z")
+        tool = os.path.basename(self.rar_tool)
+        if test:
+            args = ['t', '-y', str(archive)] if tool == 'unrar' else ['t', str(archive)]
+        else:
+            # Never overwrite: destination comes from extraction_dir and starts out empty
+            if tool == 'unrar':
+                args = ['x', '-o-', '-y', str(archive), f"{destination}{os.sep}"]
+            else:
+                args = ['x', '-y', '-aos', f"-o{destination}", str(archive)]
+        
+        process = await asyncio.create_subprocess_exec(
+            self.rar_tool, *args, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            message = stderr.decode(errors='replace').strip().splitlines()
+            raise RuntimeError(f"{tool} failed on {archive.name}: {message[-1] if message else process.returncode}")
+    
+    def close(self):
+        """Shut down the worker pools without waiting for running jobs"""
+        self.threads.shutdown(wait=False, cancel_futures=True)
+        if self._processes is not None:
+            self._processes.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Resume Store
+Persists libtorrent resume data and bot metadata for fast restarts
+"""
+
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+class ResumeEntry(NamedTuple):
+    """One torrent loaded back from the resume directory"""
+    info_hash: str
+    resume_data: bytes
+    meta: Dict
+
+class ResumeStore:
+    """Keeps one <hash>.fastresume and one <hash>.json file per torrent
+    
+    The .fastresume file is the bencoded output of lt.write_resume_data_buf
+    (including the info dict, so no .torrent file is needed), the .json file
+    holds what the bot knows about the torrent (requester, start time, URL).
+    Files are written atomically so a crash mid-write never corrupts them.
+    """
+    
+    def __init__(self, directory: str = "resume", logger: Optional[logging.Logger] = None):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.logger = logger or logging.getLogger(__name__)
+    
+    def _write(self, path: Path, data: bytes):
+        """Write a file atomically"""
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    
+    def save(self, torrent_hash: str, resume_data: bytes, meta: Optional[Dict] = None):
+        """Save resume data and, optionally, metadata for a torrent"""
+        self._write(self.directory / f"{torrent_hash}.fastresume", resume_data)
+        if meta is not None:
+            self.save_meta(torrent_hash, meta)
+    
+    def save_meta(self, torrent_hash: str, meta: Dict):
+        """Save the bot metadata for a torrent"""
+        self._write(self.directory / f"{torrent_hash}.json", json.dumps(meta).encode())
+    
+    def remove(self, torrent_hash: str):
+        """Delete everything stored for a torrent"""
+        for suffix in ('.fastresume', '.json'):
+            try:
+                (self.directory / f"{torrent_hash}{suffix}").unlink()
+            except FileNotFoundError:
+                pass
+    
+    def _load(self, path: Path) -> Optional[ResumeEntry]:
+        """Load one torrent's resume data and metadata"""
+        torrent_hash = path.stem
+        try:
+            resume_data = path.read_bytes()
+        except OSError as e:
+            self.logger.error(f"Error reading resume data {path}: {e}")
+            return None
+        
+        meta = {}
+        meta_path = path.with_suffix('.json')
+        if meta_path.exists():
+            try:
+                meta = json.loads(meta_path.read_text())
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Error reading resume metadata {meta_path}: {e}")
+        return ResumeEntry(torrent_hash, resume_data, meta)
+    
+    def load_all(self, workers: int = 8) -> List[ResumeEntry]:
+        """Load every stored torrent, reading files in parallel"""
+        paths = list(self.directory.glob('*.fastresume'))
+        if not paths:
+            return []
+        with ThreadPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            return [entry for entry in pool.map(self._load, paths) if entry is not None]
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Seed Policy
+Tracks finished torrents while they seed and decides when to retire them
+"""
+
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+ACTIONS = ('pause', 'remove')
+
+def format_duration(seconds: float) -> str:
+    """Format a duration as '3d 4h', '5h 12m' or '12m'"""
+    minutes = int(seconds // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours}h"
+    if hours:
+        return f"{hours}h {minutes}m"
+    return f"{minutes}m"
+
+def share_ratio(status) -> float:
+    """Uploaded over downloaded bytes; torrents seeded from existing files count their size as downloaded"""
+    downloaded = status.all_time_download or status.total_wanted
+    return status.all_time_upload / downloaded if downloaded else 0.0
+
+class SeedingTorrent:
+    """A finished torrent the bot keeps seeding until the policy retires it"""
+    
+    def __init__(self, info_hash: str, handle: Any, name: str, user: str, started: str = '',
+                 url: str = '', chat_id: Optional[int] = None, completed_at: Optional[str] = None,
+                 seed_time: float = 0.0, retired: str = ''):
+        self.info_hash = info_hash
+        self.handle = handle
+        self.name = name
+        self.user = user
+        self.started = started
+        self.url = url
+        self.chat_id = chat_id
+        self.completed_at = completed_at or datetime.now().isoformat()
+        self.seed_time = seed_time
+        self.retired = retired
+        # Upload activity, only known since this run
+        self.checked = time.monotonic()
+        self.last_upload = -1
+        self.last_active = self.checked
+    
+    def meta(self) -> Dict:
+        """Return the persistable fields, in the same shape as a tracked download's metadata"""
+        return {
+            'info_hash': self.info_hash,
+            'name': self.name,
+            'user': self.user,
+            'started': self.started,
+            'url': self.url,
+            'chat_id': self.chat_id,
+            'completed': True,
+            'completed_at': self.completed_at,
+            'seed_time': round(self.seed_time),
+            'retired': self.retired
+        }
+    
+    @classmethod
+    def from_meta(cls, handle: Any, info_hash: str, meta: Dict) -> 'SeedingTorrent':
+        """Rebuild a seeding torrent from the metadata saved with its resume data"""
+        return cls(
+            info_hash=info_hash,
+            handle=handle,
+            name=meta.get('name') or (handle.name() if handle.has_metadata() else 'Unknown'),
+            user=meta.get('user') or 'Unknown',
+            started=meta.get('started') or '',
+            url=meta.get('url') or '',
+            chat_id=meta.get('chat_id'),
+            completed_at=meta.get('completed_at'),
+            seed_time=float(meta.get('seed_time', 0)),
+            retired=meta.get('retired') or ''
+        )
+    
+    def observe(self, status, now: float):
+        """Account seeding time and upload activity since the previous check
+        
+        Only time spent actually seeding counts: while libtorrent keeps the
+        torrent queued (paused) neither the seed time nor the idle time grows.
+        """
+        elapsed = now - self.checked
+        self.checked = now
+        if status.paused:
+            self.last_active = now
+            return
+        self.seed_time += elapsed
+        if status.all_time_upload != self.last_upload:
+            self.last_upload = status.all_time_upload
+            self.last_active = now
+    
+    def idle_time(self, now: float) -> float:
+        """Seconds of seeding without uploading anything"""
+        return now - self.last_active
+
+class SeedPolicy:
+    """Ratio, seed-time and idle limits for finished torrents (0 disables a limit)"""
+    
+    def __init__(self, ratio_limit: float = 0.0, seed_time_limit: float = 0.0, idle_limit: float = 0.0,
+                 action: str = 'pause'):
+        if action not in ACTIONS:
+            raise ValueError(f"action must be one of {', '.join(ACTIONS)}")
+        self.ratio_limit = ratio_limit
+        self.seed_time_limit = seed_time_limit
+        self.idle_limit = idle_limit
+        self.action = action
+    
+    def describe(self) -> str:
+        """One-line summary for /seeding"""
+        limits = []
+        if self.ratio_limit:
+            limits.append(f"ratio {self.ratio_limit:g}")
+        if self.seed_time_limit:
+            limits.append(f"seed time {format_duration(self.seed_time_limit)}")
+        if self.idle_limit:
+            limits.append(f"idle {format_duration(self.idle_limit)}")
+        if not limits:
+            return "no limits, seeding forever"
+        return f"{' • '.join(limits)} → {self.action}"
+    
+    def check(self, seed: SeedingTorrent, status, now: float) -> Optional[str]:
+        """Return why a seeding torrent should be retired, or None to keep seeding"""
+        if self.ratio_limit:
+            ratio = share_ratio(status)
+            if ratio >= self.ratio_limit:
+                return f"ratio {ratio:.2f} reached"
+        if self.seed_time_limit and seed.seed_time >= self.seed_time_limit:
+            return f"seeded for {format_duration(seed.seed_time)}"
+        if self.idle_limit and seed.idle_time(now) >= self.idle_limit:
+            return f"no uploads for {format_duration(seed.idle_time(now))}"
+        return None
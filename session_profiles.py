@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Session Profiles
+Named libtorrent settings_pack profiles selectable from config.ini,
+and the session state (DHT routing table) kept across restarts
+"""
+
+import configparser
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+DEFAULT_LISTEN_INTERFACES = '0.0.0.0:6881,[::]:6881'
+DEFAULT_DHT_BOOTSTRAP_NODES = (
+    'dht.libtorrent.org:25401,router.bittorrent.com:6881,'
+    'router.utorrent.com:6881,dht.transmissionbt.com:6881'
+)
+DISK_IO_BACKENDS = ('default', 'mmap', 'posix')
+
+# Built-in profiles. Keys are libtorrent settings_pack names, except disk_io
+# which picks the storage backend when the session is created.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # libtorrent's own defaults
+    'default': {
+        'disk_io': 'default',
+    },
+    # Seedbox with fast disks and a multi-gigabit uplink (after libtorrent's high_performance_seed)
+    'high_throughput': {
+        'disk_io': 'mmap',
+        'connections_limit': 8000,
+        'unchoke_slots_limit': 500,
+        'connection_speed': 500,
+        'listen_queue_size': 3000,
+        'max_out_request_queue': 1500,
+        'max_allowed_in_request_queue': 2000,
+        'aio_threads': 16,
+        'hashing_threads': 4,
+        'file_pool_size': 500,
+        'send_buffer_watermark': 3 * 1024 * 1024,
+        'send_buffer_low_watermark': 1024 * 1024,
+        'send_buffer_watermark_factor': 150,
+        'max_queued_disk_bytes': 7 * 1024 * 1024,
+        'checking_mem_usage': 2048,
+        'suggest_mode': 1,
+        'mixed_mode_algorithm': 0,
+        'allow_multiple_connections_per_ip': True,
+        'inactivity_timeout': 20,
+        'peer_timeout': 20,
+        'max_failcount': 1,
+    },
+    # Small VPS or single-board computer (after libtorrent's min_memory_usage)
+    'low_memory': {
+        'disk_io': 'posix',
+        'connections_limit': 100,
+        'unchoke_slots_limit': 8,
+        'max_peerlist_size': 500,
+        'max_paused_peerlist_size': 50,
+        'aio_threads': 1,
+        'hashing_threads': 1,
+        'file_pool_size': 8,
+        'send_buffer_watermark': 64 * 1024,
+        'send_buffer_low_watermark': 16 * 1024,
+        'send_buffer_watermark_factor': 50,
+        'max_queued_disk_bytes': 1024 * 1024,
+        'checking_mem_usage': 8,
+        'max_out_request_queue': 100,
+        'close_redundant_connections': True,
+    },
+}
+
+class SessionProfile(NamedTuple):
+    """A resolved profile: settings_pack entries plus the disk I/O backend"""
+    name: str
+    settings: Dict[str, Any]
+    disk_io: str
+
+def parse_value(value: str) -> Any:
+    """Convert a config.ini string to the bool/int/str libtorrent expects"""
+    lowered = value.strip().lower()
+    if lowered in ('true', 'yes', 'on'):
+        return True
+    if lowered in ('false', 'no', 'off'):
+        return False
+    try:
+        return int(lowered, 0)
+    except ValueError:
+        return value.strip()
+
+def available_profiles(config: configparser.ConfigParser) -> List[str]:
+    """Built-in profiles plus the [profile:<name>] sections of config.ini"""
+    names = list(PROFILES)
+    for section in config.sections():
+        if section.startswith('profile:') and section[8:] not in names:
+            names.append(section[8:])
+    return names
+
+def _resolve(config: configparser.ConfigParser, name: str, seen: tuple) -> Dict[str, Any]:
+    """Merge a profile with its base and its config.ini overrides"""
+    if name in seen:
+        raise ValueError(f"profile inheritance cycle: {' -> '.join(seen + (name,))}")
+    section = f"profile:{name}"
+    if name not in PROFILES and not config.has_section(section):
+        raise ValueError(f"unknown session profile '{name}' (available: {', '.join(available_profiles(config))})")
+    
+    if name in PROFILES:
+        settings = dict(PROFILES[name])
+    else:
+        settings = _resolve(config, config[section].get('base', 'default'), seen + (name,))
+    
+    if config.has_section(section):
+        for key, value in config[section].items():
+            if key != 'base':
+                settings[key] = parse_value(value)
+    return settings
+
+def load_profile(config: configparser.ConfigParser, name: str) -> SessionProfile:
+    """Resolve a profile by name
+    
+    A [profile:<name>] section overrides keys of the built-in profile with
+    the same name, or defines a new profile on top of 'base' (default:
+    'default'). Raises ValueError for unknown names, cycles or bad disk_io.
+    """
+    settings = _resolve(config, name, ())
+    disk_io = str(settings.pop('disk_io', 'default'))
+    if disk_io not in DISK_IO_BACKENDS:
+        raise ValueError(f"invalid disk_io '{disk_io}' in profile '{name}' (use {', '.join(DISK_IO_BACKENDS)})")
+    return SessionProfile(name, settings, disk_io)
+
+def open_session(lt, settings: Dict[str, Any], disk_io: str, logger: logging.Logger,
+                 state: Optional[bytes] = None) -> Tuple[Any, str]:
+    """Create an lt.session from a settings dict, returning it and the disk I/O backend in use
+    
+    Settings the installed libtorrent does not know are dropped with a
+    warning. The disk I/O backend can only be chosen when the session is
+    constructed, through session_params (libtorrent 2.0+).
+    
+    state is a buffer from session_state_buf(). Only its DHT state (node ID
+    and routing table) is restored; settings always come from the profile.
+    """
+    settings = dict(settings)
+    defaults = lt.default_settings() if hasattr(lt, 'default_settings') else None
+    if defaults is not None:
+        for name in [name for name in settings if name not in defaults]:
+            logger.warning(f"Ignoring setting '{name}', unknown to libtorrent {lt.__version__}")
+            del settings[name]
+    
+    if disk_io not in DISK_IO_BACKENDS:
+        logger.warning(f"Invalid disk_io '{disk_io}', using libtorrent's default backend")
+        disk_io = 'default'
+    
+    params = None
+    if state is not None and hasattr(lt, 'read_session_params'):
+        try:
+            params = lt.read_session_params(state, lt.save_state_flags_t.save_dht_state)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable session state: {e}")
+    if disk_io != 'default':
+        try:
+            params = params or lt.session_params()
+            params.disk_io_constructor = getattr(lt, f"{disk_io}_disk_io_constructor")
+        except AttributeError:
+            logger.warning(
+                f"libtorrent {lt.__version__} cannot select {disk_io} disk I/O from Python, "
+                f"using its default backend"
+            )
+            disk_io = 'default'
+    if params is not None:
+        params.settings = settings
+        return lt.session(params), disk_io
+    
+    session = lt.session(settings)
+    if state is not None and hasattr(session, 'load_state'):
+        # libtorrent 1.2 restores the DHT state into a running session
+        try:
+            session.load_state(lt.bdecode(state), lt.save_state_flags_t.save_dht_state)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable session state: {e}")
+    return session, 'default'
+
+def session_state_buf(lt, session) -> bytes:
+    """Serialise a session's DHT state (node ID and routing table)"""
+    flags = lt.save_state_flags_t.save_dht_state
+    if hasattr(lt, 'write_session_params_buf'):
+        return bytes(lt.write_session_params_buf(session.session_state(flags), flags))
+    return bytes(lt.bencode(session.save_state(flags)))
+
+def read_state_file(path: Path) -> Optional[bytes]:
+    """Read a saved session state, or None if there is none"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read() or None
+    except FileNotFoundError:
+        return None
+
+def write_state_file(path: Path, data: bytes):
+    """Write a session state atomically"""
+    path = Path(path)
+    tmp_path = path.with_suffix(path.suffix + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""
+Session Shards
+Spreads torrents over libtorrent sessions in worker processes
+"""
+
+import logging
+import math
+import multiprocessing
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from status_cache import TorrentSnapshot
+
+# Session-wide budgets that are split evenly between the shards
+DIVIDED_SETTINGS = ('download_rate_limit', 'upload_rate_limit', 'connections_limit', 'unchoke_slots_limit')
+
+def shard_for(info_hash: str, shards: int) -> int:
+    """Shard that owns a torrent; stable for a given info-hash and shard count"""
+    return int(info_hash[:8], 16) % shards
+
+def params_info_hash(params) -> str:
+    """Info-hash (v1, hex) of add_torrent_params for a .torrent file or a magnet link"""
+    if params.ti is not None:
+        return str(params.ti.info_hash())
+    info_hashes = getattr(params, 'info_hashes', None)
+    if info_hashes is not None:
+        return str(info_hashes.v1)
+    return str(params.info_hash)
+
+def offset_listen_interfaces(interfaces: str, offset: int) -> str:
+    """Shift every port in a listen_interfaces string, e.g. 0.0.0.0:6881 -> 0.0.0.0:6882"""
+    shifted = []
+    for interface in interfaces.split(','):
+        match = re.match(r'^(.*):(\d+)(s?)$', interface.strip())
+        if match:
+            interface = f"{match.group(1)}:{int(match.group(2)) + offset}{match.group(3)}"
+        shifted.append(interface)
+    return ','.join(shifted)
+
+def shard_settings(settings: Dict[str, Any], index: int, shards: int) -> Dict[str, Any]:
+    """Settings for one shard: its own listen ports and its share of the session-wide budgets"""
+    settings = dict(settings)
+    if 'listen_interfaces' in settings:
+        settings['listen_interfaces'] = offset_listen_interfaces(settings['listen_interfaces'], index)
+    for name in DIVIDED_SETTINGS:
+        value = settings.get(name)
+        if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+            settings[name] = max(1, math.ceil(value / shards))
+    return settings
+
+# ---------------------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------------------
+
+class _PipeHandler(logging.Handler):
+    """Forwards a worker's log records to the bot process"""
+    
+    def __init__(self, send: Callable):
+        super().__init__()
+        self.send = send
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.send(('log', (record.levelno, record.getMessage())))
+        except Exception:
+            pass
+
+def _error(error) -> Tuple[int, str]:
+    """Picklable (value, message) of an lt error_code"""
+    return error.value(), error.message()
+
+def _translate(lt, alert, handles: Dict) -> Optional[Tuple[str, Dict]]:
+    """Turn an lt alert into a picklable (alert type, fields) record, or None to drop it"""
+    kind = type(alert).__name__
+    if kind == 'state_update_alert':
+        return kind, {
+            'status': [TorrentSnapshot.from_status(status) for status in alert.status],
+            'need_save': [str(status.handle.info_hash()) for status in alert.status if status.need_save_resume]
+        }
+    if kind == 'session_stats_alert':
+        return kind, {'values': dict(alert.values)}
+    if kind == 'torrent_removed_alert':
+        info_hash = str(alert.info_hash)
+        handles.pop(info_hash, None)
+        return kind, {'info_hash': info_hash}
+    if kind == 'add_torrent_alert':
+        if alert.error.value():
+            return kind, {'info_hash': params_info_hash(alert.params), 'error': _error(alert.error)}
+        handle = alert.handle
+        handles[str(handle.info_hash())] = handle
+    elif kind not in ('torrent_finished_alert', 'metadata_received_alert', 'torrent_error_alert',
+                      'save_resume_data_alert', 'save_resume_data_failed_alert'):
+        return None
+    
+    handle = alert.handle
+    fields = {'info_hash': str(handle.info_hash())}
+    if handle.is_valid():
+        fields['has_metadata'] = handle.has_metadata()
+        fields['name'] = handle.name() if fields['has_metadata'] else None
+    if hasattr(alert, 'error'):
+        fields['error'] = _error(alert.error)
+    if kind in ('add_torrent_alert', 'metadata_received_alert') and fields.get('has_metadata'):
+        # The bot lists and prioritizes files without a round trip to the worker
+        files = handle.torrent_file().files()
+        fields['files'] = [
+            (files.file_path(i), files.file_size(i), bool(files.file_flags(i) & files.flag_pad_file))
+            for i in range(files.num_files())
+        ]
+        fields['priorities'] = list(handle.get_file_priorities())
+    if kind == 'save_resume_data_alert':
+        fields['resume_data'] = bytes(lt.write_resume_data_buf(alert.params))
+    return kind, fields
+
+def shard_state_file(state_file: str, index: int) -> str:
+    """Session state file of one shard (each shard has its own DHT node ID)"""
+    return f"{state_file}.shard{index}"
+
+def _worker_main(index: int, conn, settings: Dict[str, Any], disk_io: str, state_file: Optional[str] = None):
+    """Own one libtorrent session: apply commands from the bot and stream alerts back"""
+    import libtorrent as lt
+    from session_profiles import open_session, read_state_file, session_state_buf, write_state_file
+    
+    send_lock = threading.Lock()
+    
+    def send(message):
+        with send_lock:
+            conn.send(message)
+    
+    logger = logging.getLogger(f"shard{index}")
+    logger.addHandler(_PipeHandler(send))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
+    state = read_state_file(state_file) if state_file else None
+    session, disk_io = open_session(lt, settings, disk_io, logger, state)
+    handles: Dict[str, Any] = {}
+    stopped = threading.Event()
+    
+    def run_command(command: str, args: tuple):
+        if command == 'add':
+            session.async_add_torrent(lt.read_resume_data(args[0]))
+        elif command == 'save_resume_data':
+            handle = handles.get(args[0])
+            if handle is not None:
+                handle.save_resume_data(lt.save_resume_flags_t.save_info_dict)
+        elif command == 'remove':
+            handle = handles.get(args[0])
+            if handle is not None and args[1] & 1:
+                session.remove_torrent(handle, lt.options_t.delete_files)
+            elif handle is not None:
+                session.remove_torrent(handle)
+        elif command == 'post_torrent_updates':
+            session.post_torrent_updates()
+        elif command == 'post_session_stats':
+            session.post_session_stats()
+        elif command == 'apply_settings':
+            session.apply_settings(args[0])
+            send(('settings', session.get_settings()))
+        elif command == 'add_dht_node':
+            session.add_dht_node(args[0])
+        elif command == 'save_state':
+            if state_file:
+                write_state_file(state_file, session_state_buf(lt, session))
+        elif command == 'call':
+            # Plain torrent_handle methods: force_reannounce, add_tracker, set_metadata, ...
+            handle = handles.get(args[0])
+            if handle is not None:
+                getattr(handle, args[1])(*args[2])
+        elif command == 'stop':
+            stopped.set()
+    
+    def command_loop():
+        while not stopped.is_set():
+            try:
+                command, args = conn.recv()
+            except (EOFError, OSError):
+                # The bot process is gone
+                stopped.set()
+                break
+            try:
+                run_command(command, args)
+            except Exception as e:
+                logger.error(f"Shard {index}: {command} failed: {e}")
+    
+    threading.Thread(target=command_loop, name=f"shard{index}-commands", daemon=True).start()
+    send(('ready', {'settings': session.get_settings(), 'disk_io': disk_io}))
+    
+    while not stopped.is_set():
+        if session.wait_for_alert(250) is None:
+            continue
+        records = []
+        for alert in session.pop_alerts():
+            try:
+                record = _translate(lt, alert, handles)
+            except Exception as e:
+                logger.error(f"Shard {index}: could not forward {type(alert).__name__}: {e}")
+                continue
+            if record is not None:
+                records.append(record)
+        if records:
+            try:
+                send(('alerts', records))
+            except (BrokenPipeError, OSError):
+                break
+
+# ---------------------------------------------------------------------------
+# Bot process
+# ---------------------------------------------------------------------------
+
+class ShardError:
+    """Stand-in for lt error_code"""
+    
+    def __init__(self, value: int = 0, message: str = ''):
+        self._value = value
+        self._message = message
+    
+    def value(self) -> int:
+        """Error number, 0 for success"""
+        return self._value
+    
+    def message(self) -> str:
+        """Human-readable error"""
+        return self._message
+
+class ShardAlert:
+    """Alert forwarded from a worker; subclasses carry libtorrent's alert class names"""
+    
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+_alert_classes: Dict[str, type] = {}
+
+def _alert_class(kind: str) -> type:
+    """ShardAlert subclass named like the libtorrent alert, so AlertEngine dispatches it as usual"""
+    cls = _alert_classes.get(kind)
+    if cls is None:
+        cls = _alert_classes[kind] = type(kind, (ShardAlert,), {})
+    return cls
+
+class ShardFiles:
+    """Stand-in for lt.file_storage, from the file list a worker sends with the metadata"""
+    flag_pad_file = 1
+    
+    def __init__(self, files: List[Tuple[str, int, bool]]):
+        self._files = files
+    
+    def num_files(self) -> int:
+        return len(self._files)
+    
+    def file_path(self, index: int) -> str:
+        return self._files[index][0]
+    
+    def file_size(self, index: int) -> int:
+        return self._files[index][1]
+    
+    def file_flags(self, index: int) -> int:
+        return self.flag_pad_file if self._files[index][2] else 0
+
+class ShardTorrentInfo:
+    """Stand-in for lt.torrent_info of a worker's torrent; only its file list is known"""
+    
+    def __init__(self, files: List[Tuple[str, int, bool]]):
+        self._files = ShardFiles(files)
+    
+    def files(self) -> ShardFiles:
+        return self._files
+
+class ShardHandle:
+    """Stand-in for lt.torrent_handle of a torrent owned by a worker"""
+    
+    def __init__(self, session: 'ShardedSession', shard: int, info_hash: str, name: str, has_metadata: bool):
+        self.session = session
+        self.shard = shard
+        self._info_hash = info_hash
+        self._name = name
+        self._has_metadata = has_metadata
+        self._need_save = True
+        # lt.torrent_info or ShardTorrentInfo once the metadata is known
+        self._info = None
+        self._priorities: List[int] = []
+    
+    def info_hash(self) -> str:
+        """Info-hash as a hex string"""
+        return self._info_hash
+    
+    def name(self) -> str:
+        """Torrent name as last reported by the worker"""
+        return self._name
+    
+    def has_metadata(self) -> bool:
+        """True once the worker has the torrent's metadata"""
+        return self._has_metadata
+    
+    def is_valid(self) -> bool:
+        """True while the torrent is in its shard's session"""
+        return self.session.handles.get(self._info_hash) is self
+    
+    def need_save_resume_data(self) -> bool:
+        """True if the torrent changed since resume data was last requested"""
+        return self._need_save
+    
+    def save_resume_data(self, flags=None):
+        """Ask the worker for resume data (always including the info dict)"""
+        self._need_save = False
+        self.session.send(self.shard, 'save_resume_data', self._info_hash)
+    
+    def _call(self, method: str, *args):
+        """Call a torrent_handle method in the worker"""
+        self.session.send(self.shard, 'call', self._info_hash, method, args)
+    
+    def force_reannounce(self):
+        """Announce to every tracker now"""
+        self._call('force_reannounce')
+    
+    def force_dht_announce(self):
+        """Announce to the DHT now"""
+        self._call('force_dht_announce')
+    
+    def add_tracker(self, entry: Dict):
+        """Add a tracker ({'url': ...})"""
+        self._call('add_tracker', entry)
+    
+    def set_metadata(self, metadata: bytes):
+        """Supply the info dict of a magnet link obtained elsewhere"""
+        self._call('set_metadata', metadata)
+    
+    def unset_flags(self, flags):
+        """Clear torrent flags (lt.torrent_flags values are plain ints, so they pickle)"""
+        self._call('unset_flags', flags)
+    
+    def pause(self):
+        """Pause the torrent"""
+        self._call('pause')
+    
+    def torrent_file(self):
+        """The torrent's file list, or None without metadata"""
+        return self._info
+    
+    def get_file_priorities(self) -> List[int]:
+        """File priorities as last set by the bot or reported by the worker"""
+        return list(self._priorities)
+    
+    def prioritize_files(self, priorities: List[int]):
+        """Set every file's priority (0 skips a file)"""
+        self._priorities = list(priorities)
+        self._call('prioritize_files', self._priorities)
+    
+    def file_progress(self, flags=0) -> List[int]:
+        """Per-file progress is not forwarded by the workers"""
+        return []
+
+class Shard:
+    """Bot-side end of one worker process"""
+    
+    def __init__(self, index: int, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.settings: Dict[str, Any] = {}
+        self.stats: Dict[str, int] = {}
+        self.reader: Optional[threading.Thread] = None
+
+class ShardedSession:
+    """Drop-in for the parts of lt.session the bot uses, backed by N worker processes
+    
+    Each worker owns a libtorrent session, so libtorrent's Python-side work
+    (alert translation, status snapshots) runs outside the bot's GIL.
+    Torrents are assigned to shards by info-hash. Workers stream alerts back
+    as picklable records; reader threads turn them into alert objects with
+    libtorrent's class names and queue them with the same notify semantics
+    as lt.session, so AlertEngine and the bot's handlers work unchanged.
+    Session statistics are summed over the shards.
+    """
+    
+    def __init__(
+        self,
+        shards: int,
+        settings: Dict[str, Any],
+        disk_io: str,
+        write_params: Callable[[Any], bytes],
+        logger: Optional[logging.Logger] = None,
+        start_timeout: float = 30.0,
+        state_file: Optional[str] = None
+    ):
+        self.logger = logger or logging.getLogger(__name__)
+        self.write_params = write_params
+        self.handles: Dict[str, ShardHandle] = {}
+        self.closing = False
+        self._alerts: List[ShardAlert] = []
+        self._lock = threading.Lock()
+        self._notify: Optional[Callable[[], None]] = None
+        
+        context = multiprocessing.get_context('spawn')
+        self.shards: List[Shard] = []
+        for index in range(shards):
+            conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(
+                    index, child_conn, shard_settings(settings, index, shards), disk_io,
+                    shard_state_file(state_file, index) if state_file else None
+                ),
+                name=f"teletorrent-shard-{index}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.shards.append(Shard(index, process, conn))
+        
+        self.disk_io = disk_io
+        for shard in self.shards:
+            if not shard.conn.poll(start_timeout):
+                self.close()
+                raise RuntimeError(f"Session shard {shard.index} did not start within {start_timeout:.0f}s")
+            kind, data = shard.conn.recv()
+            while kind == 'log':
+                self.logger.log(data[0], data[1])
+                kind, data = shard.conn.recv()
+            shard.settings = data['settings']
+            self.disk_io = data['disk_io']
+        
+        for shard in self.shards:
+            shard.reader = threading.Thread(
+                target=self._read, args=(shard,), name=f"shard{shard.index}-alerts", daemon=True
+            )
+            shard.reader.start()
+        self.logger.info(f"Started {shards} libtorrent session shards")
+    
+    def send(self, index: int, command: str, *args):
+        """Send a command to one worker"""
+        shard = self.shards[index]
+        try:
+            with shard.send_lock:
+                shard.conn.send((command, args))
+        except (BrokenPipeError, OSError) as e:
+            self.logger.error(f"Session shard {index} is not reachable: {e}")
+    
+    def broadcast(self, command: str, *args):
+        """Send a command to every worker"""
+        for shard in self.shards:
+            self.send(shard.index, command, *args)
+    
+    # -- lt.session API used by the bot --------------------------------------
+    
+    def set_alert_notify(self, callback: Callable[[], None]):
+        """Called (from a reader thread) whenever the alert queue becomes non-empty"""
+        self._notify = callback
+    
+    def pop_alerts(self) -> List[ShardAlert]:
+        """Return and clear all queued alerts of every shard"""
+        with self._lock:
+            alerts, self._alerts = self._alerts, []
+        return alerts
+    
+    def add_torrent(self, params) -> ShardHandle:
+        """Add a torrent to its shard; errors arrive as add_torrent_alert"""
+        info_hash = params_info_hash(params)
+        handle = self.handles.get(info_hash)
+        if handle is None:
+            has_metadata = params.ti is not None
+            handle = self.handles[info_hash] = ShardHandle(
+                self, shard_for(info_hash, len(self.shards)), info_hash,
+                params.ti.name() if has_metadata else params.name, has_metadata
+            )
+            handle._info = params.ti
+            handle._priorities = list(params.file_priorities)
+        self.send(handle.shard, 'add', bytes(self.write_params(params)))
+        return handle
+    
+    def async_add_torrent(self, params):
+        """Same as add_torrent; the handle arrives with add_torrent_alert"""
+        self.add_torrent(params)
+    
+    def remove_torrent(self, handle: ShardHandle, flags=0):
+        """Remove a torrent from its shard (flags: 0 or lt.options_t.delete_files)"""
+        self.send(handle.shard, 'remove', handle.info_hash(), int(flags))
+    
+    def get_torrents(self) -> List[ShardHandle]:
+        """Handles of every torrent in every shard"""
+        return list(self.handles.values())
+    
+    def post_torrent_updates(self, flags=None):
+        """Ask every shard for a state_update_alert"""
+        self.broadcast('post_torrent_updates')
+    
+    def post_session_stats(self):
+        """Ask every shard for a session_stats_alert"""
+        self.broadcast('post_session_stats')
+    
+    def apply_settings(self, settings: Dict[str, Any]):
+        """Apply settings everywhere, splitting session-wide budgets between the shards"""
+        for shard in self.shards:
+            self.send(shard.index, 'apply_settings', shard_settings(settings, shard.index, len(self.shards)))
+    
+    def get_settings(self) -> Dict[str, Any]:
+        """Effective settings of the first shard"""
+        return dict(self.shards[0].settings)
+    
+    def add_dht_node(self, node: Tuple[str, int]):
+        """Bootstrap every shard's DHT from a (host, port) node"""
+        self.broadcast('add_dht_node', node)
+    
+    def save_state(self):
+        """Have every shard write its DHT state to its own state file"""
+        self.broadcast('save_state')
+    
+    # -- alert plumbing --------------------------------------------------------
+    
+    def _handle(self, shard: Shard, fields: Dict) -> ShardHandle:
+        """Find or create the handle an alert refers to, refreshing its name"""
+        info_hash = fields['info_hash']
+        handle = self.handles.get(info_hash)
+        if handle is None:
+            handle = self.handles[info_hash] = ShardHandle(
+                self, shard.index, info_hash, fields.get('name') or '', bool(fields.get('has_metadata'))
+            )
+        if fields.get('has_metadata'):
+            handle._has_metadata = True
+            handle._name = fields.get('name') or handle._name
+        if 'files' in fields:
+            handle._info = ShardTorrentInfo(fields['files'])
+            handle._priorities = fields['priorities']
+        return handle
+    
+    def _to_alert(self, shard: Shard, kind: str, fields: Dict) -> Optional[ShardAlert]:
+        """Build the bot-side alert for a worker record"""
+        cls = _alert_class(kind)
+        if kind == 'state_update_alert':
+            for info_hash in fields['need_save']:
+                handle = self.handles.get(info_hash)
+                if handle is not None:
+                    handle._need_save = True
+            return cls(status=fields['status'])
+        if kind == 'session_stats_alert':
+            shard.stats = fields['values']
+            totals: Dict[str, int] = {}
+            for other in self.shards:
+                for name, value in other.stats.items():
+                    totals[name] = totals.get(name, 0) + value
+            return cls(values=totals)
+        if kind == 'torrent_removed_alert':
+            self.handles.pop(fields['info_hash'], None)
+            return cls(info_hash=fields['info_hash'])
+        
+        error = ShardError(*fields['error']) if 'error' in fields else ShardError()
+        if kind == 'add_torrent_alert' and error.value():
+            handle = self.handles.pop(fields['info_hash'], None)
+            return cls(handle=handle, error=error)
+        alert = cls(handle=self._handle(shard, fields), error=error)
+        if kind == 'save_resume_data_alert':
+            alert.resume_data = fields['resume_data']
+        return alert
+    
+    def _read(self, shard: Shard):
+        """Reader thread: queue a shard's alerts and log records"""
+        while True:
+            try:
+                kind, data = shard.conn.recv()
+            except (EOFError, OSError):
+                if not self.closing:
+                    self.logger.critical(
+                        f"Session shard {shard.index} exited (code {shard.process.exitcode}); "
+                        f"its torrents stop until the bot is restarted"
+                    )
+                return
+            
+            if kind == 'alerts':
+                alerts = []
+                for record_kind, fields in data:
+                    try:
+                        alert = self._to_alert(shard, record_kind, fields)
+                    except Exception as e:
+                        self.logger.error(f"Bad alert record from shard {shard.index}: {e}")
+                        continue
+                    if alert is not None:
+                        alerts.append(alert)
+                self._post(alerts)
+            elif kind == 'settings':
+                shard.settings = data
+            elif kind == 'log':
+                self.logger.log(data[0], data[1])
+    
+    def _post(self, alerts: List[ShardAlert]):
+        """Queue alerts, waking the alert engine when the queue was empty"""
+        if not alerts:
+            return
+        with self._lock:
+            was_empty = not self._alerts
+            self._alerts.extend(alerts)
+            notify = self._notify
+        if was_empty and notify is not None:
+            notify()
+    
+    def close(self, timeout: float = 10.0):
+        """Stop every worker, terminating the ones that do not exit in time"""
+        self.closing = True
+        self.broadcast('stop')
+        for shard in self.shards:
+            shard.process.join(timeout)
+            if shard.process.is_alive():
+                self.logger.warning(f"Session shard {shard.index} did not stop, terminating it")
+                shard.process.terminate()
+            shard.conn.close()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Status Cache
+Session-wide torrent status snapshot fed by libtorrent state updates
+"""
+
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+class TorrentSnapshot(NamedTuple):
+    """Immutable copy of the fields of lt.torrent_status the bot cares about"""
+    info_hash: str
+    name: str
+    state: int
+    progress: float
+    download_rate: int
+    upload_rate: int
+    num_peers: int
+    num_seeds: int
+    total_wanted: int
+    total_wanted_done: int
+    all_time_download: int
+    all_time_upload: int
+    is_seeding: bool
+    is_finished: bool
+    paused: bool
+    has_metadata: bool
+    error: str
+    updated: float
+    
+    @classmethod
+    def from_status(cls, status) -> 'TorrentSnapshot':
+        """Build a snapshot from an lt.torrent_status"""
+        errc = getattr(status, 'errc', None)
+        error = errc.message() if errc is not None and errc.value() else ''
+        return cls(
+            info_hash=str(status.handle.info_hash()),
+            name=status.name,
+            state=int(status.state),
+            progress=status.progress,
+            download_rate=status.download_rate,
+            upload_rate=status.upload_rate,
+            num_peers=status.num_peers,
+            num_seeds=status.num_seeds,
+            total_wanted=status.total_wanted,
+            total_wanted_done=status.total_wanted_done,
+            all_time_download=status.all_time_download,
+            all_time_upload=status.all_time_upload,
+            is_seeding=status.is_seeding,
+            is_finished=status.is_finished,
+            paused=status.paused,
+            has_metadata=status.has_metadata,
+            error=error,
+            updated=time.time()
+        )
+
+class StatusCache:
+    """Latest known status of every torrent in the session, keyed by info-hash
+    
+    The cache is refreshed from state_update_alert, which libtorrent only
+    fills with torrents whose status changed since the previous
+    post_torrent_updates() call, so a refresh costs nothing for idle torrents.
+    """
+    
+    def __init__(self):
+        self.torrents: Dict[str, TorrentSnapshot] = {}
+        self.last_update: float = 0.0
+    
+    def update(self, statuses: Iterable) -> List[TorrentSnapshot]:
+        """Merge a batch of lt.torrent_status objects (or shard snapshots), returning the new snapshots"""
+        changed = [
+            status if isinstance(status, TorrentSnapshot) else TorrentSnapshot.from_status(status)
+            for status in statuses
+        ]
+        for snapshot in changed:
+            self.torrents[snapshot.info_hash] = snapshot
+        self.last_update = time.time()
+        return changed
+    
+    def get(self, torrent_hash: str) -> Optional[TorrentSnapshot]:
+        """Return the latest snapshot for a torrent, if any"""
+        return self.torrents.get(torrent_hash)
+    
+    def remove(self, torrent_hash: str):
+        """Forget a torrent that left the session"""
+        self.torrents.pop(torrent_hash, None)
+    
+    def values(self) -> List[TorrentSnapshot]:
+        """Return all known snapshots"""
+        return list(self.torrents.values())
+    
+    def __len__(self) -> int:
+        return len(self.torrents)
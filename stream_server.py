@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Stream Server
+Serves files of torrents that are still downloading over HTTP, with Range support
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+import mimetypes
+import re
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import quote, unquote
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single-range Range header into an inclusive (start, end)
+    
+    Returns None to serve the whole file (no header, or a multi-range
+    request, which servers may answer in full). Raises ValueError when the
+    range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        # Multiple ranges or another unit
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        raise ValueError(header)
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(header)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+class StreamServer:
+    """HTTP server streaming torrent files while they download
+    
+    A request's byte range is mapped to pieces. Each piece is requested with
+    set_piece_deadline(alert_when_available): libtorrent downloads it as a
+    time-critical piece, or reads it from disk if it is already there, and
+    posts a read_piece_alert either way, which resolves a future on the
+    event loop. The pieces after the reader's position get increasing
+    deadlines so they arrive in order ahead of it, and the torrent downloads
+    sequentially while it has open streams.
+    
+    URLs carry an HMAC of the torrent and file index, so only links handed out
+    by the bot work.
+    """
+    
+    def __init__(self, resolve: Callable[[str], Any], secret: bytes, alert_when_available: int,
+                 sequential_flag: int, host: str = "127.0.0.1", port: int = 8090, public_url: str = '',
+                 readahead: int = 16 * 1024 * 1024, deadline_step: int = 500, piece_timeout: float = 120.0,
+                 observe_wait: Optional[Callable[[float], None]] = None, logger: Optional[logging.Logger] = None):
+        self.resolve = resolve
+        self.secret = secret
+        self.alert_when_available = alert_when_available
+        self.sequential_flag = sequential_flag
+        self.host = host
+        self.port = port
+        self.public_url = (public_url or f"http://{host}:{port}").rstrip('/')
+        self.readahead = readahead
+        # Milliseconds between the deadlines of consecutive readahead pieces
+        self.deadline_step = deadline_step
+        self.piece_timeout = piece_timeout
+        self.observe_wait = observe_wait
+        self.logger = logger or logging.getLogger(__name__)
+        self.server: Optional[asyncio.AbstractServer] = None
+        # (info_hash, piece) -> future resolved by on_read_piece
+        self.reads: Dict[Tuple[str, int], asyncio.Future] = {}
+        # Open streams per torrent, and torrents the server switched to sequential download
+        self.streams: Dict[str, int] = {}
+        self.made_sequential: set = set()
+        self.connections: set = set()
+    
+    async def start(self):
+        """Start listening"""
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.logger.info(f"Stream server listening on http://{self.host}:{self.port}, links use {self.public_url}")
+    
+    async def stop(self):
+        """Stop listening, fail pending reads and drop open connections"""
+        for future in self.reads.values():
+            if not future.done():
+                # Ends the waiting requests like a dropped connection
+                future.set_exception(ConnectionAbortedError("stream server stopped"))
+        self.reads.clear()
+        if self.server is not None:
+            self.server.close()
+            # wait_closed also waits for clients since Python 3.12
+            for writer in list(self.connections):
+                writer.transport.abort()
+            await self.server.wait_closed()
+    
+    def token(self, info_hash: str, file_index: int) -> str:
+        """Link token for one file of a torrent"""
+        return hmac.new(self.secret, f"{info_hash}/{file_index}".encode(), hashlib.sha256).hexdigest()[:24]
+    
+    def url(self, info_hash: str, file_index: int, path: str) -> str:
+        """Public URL of a torrent file; the trailing name lets players recognise the format"""
+        name = path.replace('\\', '/').rsplit('/', 1)[-1]
+        return f"{self.public_url}/{self.token(info_hash, file_index)}/{info_hash}/{file_index}/{quote(name)}"
+    
+    # -- piece reads -----------------------------------------------------------
+    
+    def on_read_piece(self, alert):
+        """Handle read_piece_alert: hand the piece to whoever is waiting for it"""
+        future = self.reads.pop((str(alert.handle.info_hash()), alert.piece), None)
+        if future is None or future.done():
+            return
+        if alert.error.value():
+            future.set_exception(OSError(f"piece {alert.piece}: {alert.error.message()}"))
+        else:
+            # The alert's buffer is only valid until the next pop_alerts
+            future.set_result(bytes(alert.buffer))
+    
+    async def read_piece(self, handle, info_hash: str, piece: int) -> bytes:
+        """Return a piece's data, downloading it first if needed"""
+        key = (info_hash, piece)
+        future = self.reads.get(key)
+        if future is None:
+            future = self.reads[key] = asyncio.get_running_loop().create_future()
+            # Downloads the piece with top priority, or reads it right away if it is already there
+            handle.set_piece_deadline(piece, 0, self.alert_when_available)
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.piece_timeout)
+        except asyncio.TimeoutError:
+            if self.reads.get(key) is future:
+                del self.reads[key]
+            raise
+        finally:
+            if self.observe_wait is not None:
+                self.observe_wait(time.monotonic() - started)
+    
+    def read_ahead(self, handle, first: int, last: int):
+        """Give the pieces after the reader's position increasing deadlines, so they arrive in order"""
+        for offset, piece in enumerate(range(first, last + 1), 1):
+            handle.set_piece_deadline(piece, self.deadline_step * offset)
+    
+    def open_stream(self, handle, info_hash: str):
+        """Switch the torrent to sequential download while it is being streamed"""
+        self.streams[info_hash] = self.streams.get(info_hash, 0) + 1
+        if self.streams[info_hash] == 1 and not handle.flags() & self.sequential_flag:
+            handle.set_flags(self.sequential_flag)
+            self.made_sequential.add(info_hash)
+    
+    def close_stream(self, handle, info_hash: str):
+        """Undo open_stream once the torrent's last stream is closed"""
+        self.streams[info_hash] -= 1
+        if self.streams[info_hash]:
+            return
+        del self.streams[info_hash]
+        # Pieces nobody waits for any more
+        for key in [key for key in self.reads if key[0] == info_hash]:
+            self.reads.pop(key).cancel()
+        if not handle.is_valid():
+            self.made_sequential.discard(info_hash)
+            return
+        handle.clear_piece_deadlines()
+        if info_hash in self.made_sequential:
+            self.made_sequential.discard(info_hash)
+            handle.unset_flags(self.sequential_flag)
+    
+    # -- HTTP --------------------------------------------------------------------
+    
+    def _route(self, target: str) -> Tuple[Optional[Any], str, int]:
+        """Resolve /<token>/<info_hash>/<file index>/<name> to (handle, info_hash, file index)"""
+        parts = target.split('?')[0].strip('/').split('/')
+        if len(parts) < 3 or not parts[2].isdigit():
+            return None, '', 0
+        token, info_hash, file_index = parts[0], unquote(parts[1]).lower(), int(parts[2])
+        if not hmac.compare_digest(token, self.token(info_hash, file_index)):
+            return None, '', 0
+        return self.resolve(info_hash), info_hash, file_index
+    
+    async def _respond(self, writer: asyncio.StreamWriter, status: str, headers: Dict[str, str], body: bytes = b''):
+        """Write a status line, headers and an optional short body"""
+        headers = {'Content-Length': str(len(body)), **headers, 'Connection': 'close'}
+        head = f"HTTP/1.1 {status}\r\n" + ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode('latin-1') + b"\r\n" + body)
+        await writer.drain()
+    
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Answer one GET or HEAD request and close the connection"""
+        self.connections.add(writer)
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=10)
+            headers = {}
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=10)
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2 or parts[0] not in ('GET', 'HEAD'):
+                await self._respond(writer, '405 Method Not Allowed', {'Allow': 'GET, HEAD'})
+                return
+            handle, info_hash, file_index = self._route(parts[1])
+            info = handle.torrent_file() if handle is not None and handle.is_valid() else None
+            if info is None or file_index >= info.files().num_files():
+                await self._respond(writer, '404 Not Found', {'Content-Type': 'text/plain'}, b'Not Found\n')
+                return
+            await self._stream(writer, parts[0] == 'HEAD', headers.get('range'), handle, info_hash, info, file_index)
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            self.logger.debug(f"Stream request ended: {e!r}")
+        except Exception as e:
+            self.logger.error(f"Stream request failed: {e}")
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+    
+    async def _stream(self, writer: asyncio.StreamWriter, head_only: bool, range_header: Optional[str],
+                      handle, info_hash: str, info, file_index: int):
+        """Send (part of) a file, piece by piece as they become available"""
+        files = info.files()
+        size = files.file_size(file_index)
+        path = files.file_path(file_index)
+        headers = {
+            'Content-Type': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+            'Accept-Ranges': 'bytes'
+        }
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            await self._respond(writer, '416 Range Not Satisfiable', {**headers, 'Content-Range': f"bytes */{size}"})
+            return
+        if handle.get_file_priorities()[file_index] == 0:
+            await self._respond(writer, '409 Conflict', {'Content-Type': 'text/plain'}, b'File is not being downloaded\n')
+            return
+        
+        start, end = byte_range or (0, size - 1)
+        headers['Content-Length'] = str(end - start + 1)
+        if byte_range is not None:
+            status = '206 Partial Content'
+            headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        else:
+            status = '200 OK'
+        writer.write(
+            f"HTTP/1.1 {status}\r\n".encode()
+            + ''.join(f"{name}: {value}\r\n" for name, value in headers.items()).encode('latin-1')
+            + b"Connection: close\r\n\r\n"
+        )
+        await writer.drain()
+        if head_only or size == 0:
+            return
+        
+        # Byte positions in the torrent, and the pieces they fall in
+        piece_length = info.piece_length()
+        offset = files.file_offset(file_index)
+        first_piece = (offset + start) // piece_length
+        last_piece = (offset + end) // piece_length
+        window = max(1, -(-self.readahead // piece_length))
+        
+        self.open_stream(handle, info_hash)
+        try:
+            ahead = first_piece
+            for piece in range(first_piece, last_piece + 1):
+                # Keep the next pieces up to the readahead window on increasing deadlines
+                if ahead < min(last_piece, piece + window):
+                    self.read_ahead(handle, ahead + 1, min(last_piece, piece + window))
+                    ahead = min(last_piece, piece + window)
+                data = await self.read_piece(handle, info_hash, piece)
+                piece_start = piece * piece_length
+                low = max(offset + start, piece_start) - piece_start
+                high = min(offset + end + 1, piece_start + len(data)) - piece_start
+                writer.write(data[low:high])
+                await writer.drain()
+        finally:
+            self.close_stream(handle, info_hash)
@@ -7,24 +7,71 @@ A bot that manages torrent downloads via Telegram commands
 import os
 import sys
 import json
+import hashlib
+import secrets
 import logging
 import asyncio
+import functools
+import signal
 import subprocess
 import threading
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set, Tuple
 import configparser
 
 try:
     from telegram import Update
-    from telegram.ext import Application, CommandHandler, ContextTypes
+    from telegram.ext import Application, CommandHandler, ContextTypes, MessageHandler, filters
     import libtorrent as lt
 except ImportError as e:
     print(f"Missing required dependency: {e}")
     print("Please run: pip install python-telegram-bot libtorrent")
     sys.exit(1)
 
+from alert_engine import AlertEngine
+from bulk_ingest import IngestResult, extract_links, torrent_files
+from dedup_index import ACTIVE, COMPLETED, ON_DISK, QUEUED, SEEDING, DedupEntry, DedupIndex, content_exists
+from disk_space import DISK_FULL_ACTIONS, STORAGE_MODES, SpaceCheck, check_space, format_size
+from file_selection import DEFAULT, SKIP, FileFilter, TorrentFile, list_files, parse_patterns, select, selected_size
+from status_cache import StatusCache
+from torrent_state import TorrentState, TrackedTorrent
+from torrent_fetch import FetchError, TorrentFetcher, magnet_sources
+from resume_store import ResumeStore
+from history_store import HistoryStore
+from log_tail import LEVELS, chunk_lines, tail_lines
+from download_queue import DownloadScheduler, QueuedDownload
+from message_dispatcher import MessageDispatcher
+from metrics import MetricsRegistry, MetricsServer
+from perf import HandlerTimings, LoopLagMonitor, SamplingProfiler, StartupTimer
+from post_process import STAGES, PostProcessor
+from seed_policy import SeedingTorrent, SeedPolicy, format_duration, share_ratio
+from session_profiles import (
+    DEFAULT_DHT_BOOTSTRAP_NODES, DEFAULT_LISTEN_INTERFACES, available_profiles, load_profile, open_session,
+    parse_value, read_state_file, session_state_buf, write_state_file
+)
+from session_shards import ShardedSession, params_info_hash
+from stream_server import StreamServer
+from watch_folder import WatchFolder
+from webhook import WebhookSettings, load_webhook_settings
+
+# libtorrent session counters exported on the metrics endpoint
+SESSION_STATS = [
+    'net.recv_payload_bytes',
+    'net.sent_payload_bytes',
+    'net.recv_bytes',
+    'net.sent_bytes',
+    'disk.queued_disk_jobs',
+    'disk.queued_write_bytes',
+    'disk.num_running_disk_jobs',
+    'peer.num_peers_connected',
+    'peer.num_peers_half_open',
+    'dht.dht_nodes',
+    'ses.num_downloading_torrents',
+    'ses.num_seeding_torrents',
+]
+
 class TorrentBot:
     def __init__(self, config_path: str = "config.ini"):
         self.config_path = config_path
@@ -32,24 +79,181 @@ class TorrentBot:
         
         # Setup logging
         self.setup_logging()
+        self.startup = StartupTimer(self.logger)
+        
+        settings = self.config['settings'] if self.config.has_section('settings') else {}
+        
+        # Torrent session, tuned by a named settings profile ([settings] session_profile)
+        self.session_profile = self.load_session_profile(settings.get('session_profile', 'default'))
+        session_settings = dict(self.session_profile.settings)
+        session_settings['listen_interfaces'] = settings.get('listen_interfaces', DEFAULT_LISTEN_INTERFACES)
+        session_settings['dht_bootstrap_nodes'] = settings.get('dht_bootstrap_nodes', DEFAULT_DHT_BOOTSTRAP_NODES)
+        session_settings['alert_mask'] = (
+            lt.alert.category_t.error_notification
+            | lt.alert.category_t.status_notification
+            | lt.alert.category_t.storage_notification
+        )
+        self.disk_io = settings.get('disk_io', self.session_profile.disk_io)
+        self.session_shards = int(settings.get('session_shards', 0))
+        self.session_state_file = Path(self.config['paths'].get('session_state_file', 'session_state.dat'))
+        self.session_settings = session_settings
+        # Opened by run(), concurrently with the Telegram start-up
+        self.session = None
+        
+        # DHT upkeep and magnet metadata timeouts (see run_session_maintenance)
+        self.dht_bootstrap_nodes = [
+            node.strip() for node in session_settings['dht_bootstrap_nodes'].split(',') if node.strip()
+        ]
+        self.dht_refresh_interval = float(settings.get('dht_refresh_interval', 600))
+        self.dht_min_nodes = int(settings.get('dht_min_nodes', 20))
+        self.session_state_interval = float(settings.get('session_state_interval', 900))
+        self.metadata_timeout = float(settings.get('metadata_timeout', 120))
+        self.metadata_pending: Dict[str, Dict] = {}
+        
+        # Download admission: config.ini [settings] limits, enforced by the scheduler and libtorrent
+        self.max_concurrent = int(settings.get('max_concurrent_downloads', 3))
+        session_settings.update({
+            'active_downloads': self.max_concurrent if self.max_concurrent > 0 else -1,
+            'download_rate_limit': int(settings.get('max_download_speed', 0)) * 1024,
+            'upload_rate_limit': int(settings.get('max_upload_speed', 0)) * 1024
+        })
+        self.scheduler = DownloadScheduler(self.max_concurrent)
+        self.queue_file = Path(self.config['paths'].get('queue_file', 'queue.json'))
+        self.queue_lock: Optional[asyncio.Lock] = None
+        
+        # Disk-space admission: torrents that do not fit next to the active ones are queued or rejected
+        self.storage_mode = self.choice_setting(settings, 'storage_mode', STORAGE_MODES)
+        self.disk_full_action = self.choice_setting(settings, 'disk_full_action', DISK_FULL_ACTIONS)
+        self.disk_margin = int(settings.get('disk_reserve_mb', 1024)) * 1024 * 1024
+        self.disk_claims: Dict[str, Optional[int]] = {}
+        self.space_blocked = False
+        
+        # Default file selection ([files] include/exclude), applied as soon as a torrent's file list is known
+        files = self.config['files'] if self.config.has_section('files') else {}
+        self.file_filter = FileFilter(parse_patterns(files.get('include', '')), parse_patterns(files.get('exclude', '')))
+        
+        # Seeding: finished torrents keep seeding until the [seeding] policy retires them
+        seeding = self.config['seeding'] if self.config.has_section('seeding') else {}
+        self.seed_policy = self.load_seed_policy(seeding)
+        self.seeds: Dict[str, SeedingTorrent] = {}
+        self.seed_check_interval = self.seeding_value(seeding, 'check_interval', 60)
+        if 'max_active_seeds' in seeding:
+            # Per shard; libtorrent queues the other seeds and rotates them through the slots
+            max_seeds = int(self.seeding_value(seeding, 'max_active_seeds', 0))
+            active_seeds = -(-max_seeds // max(1, self.session_shards)) if max_seeds > 0 else -1
+            session_settings.update({
+                'active_seeds': active_seeds,
+                # active_limit caps downloads and seeds together and would override both
+                'active_limit': -1
+            })
+        
+        # Alert-driven event engine (replaces the polling monitor thread); attached to the session by run()
+        self.alerts = AlertEngine(None, self.logger)
+        self.alerts.on('torrent_finished_alert', self.on_torrent_finished)
+        self.alerts.on('metadata_received_alert', self.on_metadata_received)
+        self.alerts.on('torrent_error_alert', self.on_torrent_error)
+        self.alerts.on('state_update_alert', self.on_state_update)
+        self.alerts.on('torrent_removed_alert', self.on_torrent_removed)
+        self.alerts.on('add_torrent_alert', self.on_add_torrent)
+        self.alerts.on('save_resume_data_alert', self.on_save_resume_data)
+        self.alerts.on('save_resume_data_failed_alert', self.on_save_resume_data_failed)
+        self.alerts.on('session_stats_alert', self.on_session_stats)
+        
+        # Session-wide status snapshot, refreshed via post_torrent_updates()
+        self.status_cache = StatusCache()
+        self.status_interval = 1.0
+        self.stats_interval = 5.0
+        self.session_stats: Dict[str, int] = {}
+        self.session_stats_time = 0.0
+        
+        # Metrics, served on a local HTTP endpoint when [metrics] enabled = true
+        self.setup_metrics()
+        
+        # Event-loop lag and handler timings for /perf
+        self.loop_lag = LoopLagMonitor(on_sample=self.record_loop_lag)
+        self.handler_timings = HandlerTimings()
+        self.profiling = False
         
-        # Torrent session
-        self.session = lt.session()
-        self.session.listen_on(6881, 6891)
+        # Opt-in live status boards: one pinned message per chat, edited in place
+        self.live_boards: Dict[int, Dict] = {}
+        self.live_interval = float(settings.get('live_status_interval', 15))
+        self.live_boards_file = Path(self.config['paths'].get('live_boards_file', 'live_boards.json'))
+        self.load_live_boards()
         
-        # Active torrents tracking
-        self.active_torrents: Dict[str, Dict] = {}
-        self.download_history: List[Dict] = []
+        # Pooled .torrent downloader with a parsed metainfo cache
+        self.fetcher = TorrentFetcher(
+            parse=lt.torrent_info,
+            info_hash=lambda info: str(info.info_hash()),
+            timeout=float(settings.get('fetch_timeout', 30)),
+            max_size=int(settings.get('fetch_max_size_mb', 10)) * 1024 * 1024,
+            per_host_limit=int(settings.get('fetch_per_host_limit', 4)),
+            logger=self.logger
+        )
+        self.upload_max_size = int(settings.get('upload_max_size_mb', 20)) * 1024 * 1024
+        
+        # Optional watch folder for .torrent files dropped by other tools ([paths] watch_dir)
+        self.watch_folder: Optional[WatchFolder] = None
+        self.watch_user = settings.get('watch_user', 'watch-folder')
+        watch_dir = self.config['paths'].get('watch_dir', '')
+        if watch_dir:
+            self.watch_folder = WatchFolder(
+                watch_dir,
+                self.ingest_watch_files,
+                self.logger,
+                settle=float(settings.get('watch_settle', 2)),
+                poll_interval=float(settings.get('watch_poll_interval', 5))
+            )
+        
+        # Fast resume: resume data is saved periodically and on shutdown
+        self.resume_store = ResumeStore(
+            self.config['paths'].get('resume_dir', 'resume'), self.logger
+        )
+        self.resume_interval = int(settings.get('resume_save_interval', 300))
+        self.restoring: Dict[str, Dict] = {}
+        self.pending_resume: set = set()
+        self.pending_meta: Dict[str, Dict] = {}
+        self.resume_saved: Optional[asyncio.Event] = None
+        
+        # Tracked torrents, owned by a single actor; readers use self.torrents.snapshot
+        self.torrents = TorrentState(self.logger)
+        
+        # Download history, opened once the bot is accepting commands (see get_history)
+        self.history: Optional[HistoryStore] = None
+        self.history_task: Optional[asyncio.Task] = None
         
-        # Load download history
-        self.load_history()
+        # Info-hash index of active, queued and completed torrents (completed ones come from the history)
+        self.dedup = DedupIndex()
+        self.dedup_check_content = parse_value(str(settings.get('dedup_check_content', 'false'))) is True
+        
+        # Optional post-completion pipeline ([postprocess] enabled = true)
+        self.post_processor = self.create_post_processor()
+        self.post_tasks: Set[asyncio.Task] = set()
+        
+        # Optional HTTP streaming of downloads in progress ([streaming] enabled = true)
+        self.stream_server = self.create_stream_server()
+        if self.stream_server:
+            self.alerts.on('read_piece_alert', self.stream_server.on_read_piece)
+        
+        # Updates arrive through a webhook listener when [webhook] enabled = true, by long polling otherwise
+        self.webhook = self.load_webhook()
         
         # Bot application
         self.app = None
+        self.dispatcher: Optional[MessageDispatcher] = None
+        self.alert_task = None
+        self.status_task = None
+        self.resume_task = None
+        self.live_task = None
+        self.lag_task = None
+        self.maintenance_task = None
+        self.watch_task = None
+        self.startup_task = None
+        self.stop_event: Optional[asyncio.Event] = None
         
     def load_config(self) -> configparser.ConfigParser:
         """Load configuration from file"""
-        config = configparser.ConfigParser()
+        # Values may be followed by a comment, as in the README examples
+        config = configparser.ConfigParser(inline_comment_prefixes=('#', ';'))
         if not os.path.exists(self.config_path):
             raise FileNotFoundError(f"Configuration file {self.config_path} not found. Run install.py first.")
         config.read(self.config_path)
@@ -70,34 +274,450 @@ class TorrentBot:
         )
         self.logger = logging.getLogger(__name__)
     
-    def load_history(self):
-        """Load download history from file"""
-        history_file = Path("download_history.json")
-        if history_file.exists():
-            try:
-                with open(history_file, 'r') as f:
-                    self.download_history = json.load(f)
-            except Exception as e:
-                self.logger.error(f"Error loading history: {e}")
-                self.download_history = []
+    def load_session_profile(self, name: str):
+        """Resolve the configured settings profile, falling back to libtorrent's defaults"""
+        try:
+            profile = load_profile(self.config, name)
+        except ValueError as e:
+            self.logger.error(f"Invalid session profile: {e}; using 'default'")
+            profile = load_profile(self.config, 'default')
+        self.logger.info(f"Using libtorrent settings profile '{profile.name}'")
+        return profile
+    
+    def choice_setting(self, settings, key: str, choices: Tuple[str, ...]) -> str:
+        """Read a [settings] value that must be one of choices, falling back to the first"""
+        value = settings.get(key, choices[0]).strip().lower()
+        if value not in choices:
+            self.logger.error(f"Invalid {key} '{value}' (expected {', '.join(choices)}); using '{choices[0]}'")
+            value = choices[0]
+        return value
+    
+    def seeding_value(self, seeding, key: str, default: float) -> float:
+        """Read a numeric [seeding] value, falling back to default when it is not a number"""
+        value = seeding.get(key, default)
+        try:
+            return float(value)
+        except ValueError:
+            self.logger.error(f"Invalid [seeding] {key} '{value}' (expected a number); using {default}")
+            return float(default)
+    
+    def load_seed_policy(self, seeding) -> SeedPolicy:
+        """Read the ratio, seed-time and idle limits from the [seeding] section"""
+        limits = {
+            'ratio_limit': self.seeding_value(seeding, 'ratio_limit', 0),
+            'seed_time_limit': self.seeding_value(seeding, 'seed_time_limit', 0) * 3600,
+            'idle_limit': self.seeding_value(seeding, 'idle_limit', 0) * 3600
+        }
+        try:
+            return SeedPolicy(action=seeding.get('action', 'pause').strip().lower(), **limits)
+        except ValueError as e:
+            self.logger.error(f"Invalid [seeding] action: {e}; using pause")
+            return SeedPolicy(**limits)
+    
+    def load_webhook(self) -> Optional[WebhookSettings]:
+        """Read the [webhook] section; None means long polling"""
+        section = self.config['webhook'] if self.config.has_section('webhook') else {}
+        if parse_value(str(section.get('enabled', 'false'))) is not True:
+            return None
+        try:
+            return load_webhook_settings(section)
+        except ValueError as e:
+            self.logger.error(f"Invalid [webhook] settings: {e}; using long polling")
+            return None
+    
+    def create_session(self, session_settings: Dict):
+        """Create the libtorrent session, or worker-process shards when session_shards > 1"""
+        if self.session_shards > 1:
+            session = ShardedSession(
+                self.session_shards, session_settings, self.disk_io, lt.write_resume_data_buf, self.logger,
+                state_file=str(self.session_state_file)
+            )
+            self.disk_io = session.disk_io
+            return session
+        state = read_state_file(self.session_state_file)
+        session, self.disk_io = open_session(lt, session_settings, self.disk_io, self.logger, state)
+        if state is not None:
+            self.logger.info(f"Restored DHT state from {self.session_state_file}")
+        return session
+    
+    def create_post_processor(self) -> Optional[PostProcessor]:
+        """Build the post-completion pipeline from the [postprocess] section, if enabled"""
+        post = self.config['postprocess'] if self.config.has_section('postprocess') else {}
+        if parse_value(str(post.get('enabled', 'false'))) is not True:
+            return None
+        try:
+            processor = PostProcessor(
+                stages=[stage.strip() for stage in post.get('stages', ','.join(STAGES)).split(',') if stage.strip()],
+                library_dir=self.config['paths'].get('library_dir', ''),
+                link_mode=post.get('link_mode', 'hardlink'),
+                max_jobs=int(post.get('max_jobs', 2)),
+                process_workers=int(post.get('process_workers', 2)),
+                thread_workers=int(post.get('thread_workers', 4)),
+                cleanup_patterns=[pattern.strip() for pattern in post.get('cleanup_patterns', '').split(',') if pattern.strip()],
+                logger=self.logger
+            )
+        except ValueError as e:
+            self.logger.error(f"Post-processing disabled, invalid [postprocess] settings: {e}")
+            return None
+        self.logger.info(f"Post-processing enabled: {' → '.join(processor.stages)}")
+        return processor
+    
+    def create_stream_server(self) -> Optional[StreamServer]:
+        """Build the stream server from the [streaming] section, if enabled"""
+        streaming = self.config['streaming'] if self.config.has_section('streaming') else {}
+        if parse_value(str(streaming.get('enabled', 'false'))) is not True:
+            return None
+        if self.session_shards > 1:
+            self.logger.error("Streaming disabled: it needs piece reads, which session shards do not forward")
+            return None
+        # Without a configured secret, links stop working when the bot restarts
+        secret = streaming.get('secret', '').strip()
+        # deadline_flags_t in the libtorrent 2.0 bindings, deadline_flags before
+        deadline_flags = getattr(lt, 'deadline_flags_t', None) or lt.deadline_flags
+        try:
+            return StreamServer(
+                resolve=self.stream_handle,
+                secret=secret.encode() if secret else secrets.token_bytes(32),
+                alert_when_available=deadline_flags.alert_when_available,
+                sequential_flag=lt.torrent_flags.sequential_download,
+                host=streaming.get('host', '127.0.0.1'),
+                port=int(streaming.get('port', 8090)),
+                public_url=streaming.get('public_url', '').strip(),
+                readahead=int(float(streaming.get('readahead_mb', 16)) * 1024 * 1024),
+                deadline_step=int(streaming.get('deadline_step_ms', 500)),
+                piece_timeout=float(streaming.get('piece_timeout', 120)),
+                observe_wait=self.stream_piece_wait.observe,
+                logger=self.logger
+            )
+        except ValueError as e:
+            self.logger.error(f"Streaming disabled, invalid [streaming] settings: {e}")
+            return None
+    
+    def stream_handle(self, info_hash: str):
+        """Handle of a downloading or seeding torrent, for the stream server"""
+        torrent = self.torrents.get(info_hash) or self.seeds.get(info_hash)
+        return torrent.handle if torrent else None
+    
+    async def save_session_state(self):
+        """Persist the DHT node ID and routing table so magnets resolve quickly after a restart"""
+        try:
+            if self.session_shards > 1:
+                # Each worker writes its own <session_state_file>.shard<N>
+                self.session.save_state()
+                return
+            data = session_state_buf(lt, self.session)
+            await asyncio.to_thread(write_state_file, self.session_state_file, data)
+        except Exception as e:
+            self.logger.error(f"Error saving session state: {e}")
+    
+    def load_history(self) -> HistoryStore:
+        """Open the download history database, migrating the legacy JSON file once"""
+        history = HistoryStore(self.config['paths'].get('history_db', 'history.db'), self.logger)
+        history.migrate_json("download_history.json")
+        return history
+    
+    async def open_history(self) -> Optional[HistoryStore]:
+        """Open the history in a worker thread and index its completed torrents"""
+        try:
+            self.history = await asyncio.to_thread(self.load_history)
+        except Exception as e:
+            self.logger.error(f"Error opening history: {e}")
+            return None
+        await self.load_dedup_index()
+        return self.history
+    
+    async def get_history(self) -> Optional[HistoryStore]:
+        """Return the history store, opening it on first use; None if it could not be opened"""
+        if self.history_task is None:
+            self.history_task = asyncio.create_task(self.open_history())
+        # Shielded so a cancelled command does not cancel the shared open
+        return await asyncio.shield(self.history_task)
+    
+    async def load_dedup_index(self):
+        """Index every completed download in the history by info-hash"""
+        try:
+            rows = await asyncio.to_thread(self.history.completed_hashes)
+        except Exception as e:
+            self.logger.error(f"Error loading the dedup index: {e}")
+            return
+        loaded = self.dedup.load_history(rows)
+        self.logger.info(f"Dedup index loaded {loaded} completed torrents from history")
     
-    def save_history(self):
-        """Save download history to file"""
+    async def save_history(self, entry: Dict):
+        """Append a download history entry"""
+        history = await self.get_history()
+        if history is None:
+            return
         try:
-            with open("download_history.json", 'w') as f:
-                json.dump(self.download_history[-50:], f, indent=2)  # Keep last 50 entries
+            await asyncio.to_thread(history.add, entry)
         except Exception as e:
             self.logger.error(f"Error saving history: {e}")
     
+    def setup_metrics(self):
+        """Create the metric families and the collector that refreshes them on scrape"""
+        self.metrics = MetricsRegistry()
+        self.metrics_server: Optional[MetricsServer] = None
+        
+        self.command_latency = self.metrics.histogram(
+            'teletorrent_command_duration_seconds', 'Telegram command handler latency', ['command']
+        )
+        self.command_errors = self.metrics.counter(
+            'teletorrent_command_errors_total', 'Telegram command handlers that raised', ['command']
+        )
+        self.session_stat_gauge = self.metrics.gauge(
+            'teletorrent_session_stat', 'libtorrent session counters from session_stats_alert', ['stat']
+        )
+        self.payload_rate_gauge = self.metrics.gauge(
+            'teletorrent_session_payload_rate_bytes', 'Session payload rate in bytes per second', ['direction']
+        )
+        self.torrent_rate_gauge = self.metrics.gauge(
+            'teletorrent_torrent_rate_bytes', 'Per-torrent transfer rate in bytes per second',
+            ['info_hash', 'name', 'direction']
+        )
+        self.torrent_progress_gauge = self.metrics.gauge(
+            'teletorrent_torrent_progress_ratio', 'Per-torrent download progress (0-1)', ['info_hash', 'name']
+        )
+        self.queue_gauge = self.metrics.gauge(
+            'teletorrent_queue_depth', 'Items waiting in internal queues', ['queue']
+        )
+        self.active_gauge = self.metrics.gauge('teletorrent_active_downloads', 'Downloads holding a slot')
+        self.loop_lag_gauge = self.metrics.gauge(
+            'teletorrent_event_loop_lag_seconds', 'Most recent event-loop wakeup delay'
+        )
+        self.loop_lag_histogram = self.metrics.histogram(
+            'teletorrent_event_loop_lag_distribution_seconds', 'Event-loop wakeup delay',
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+        )
+        self.metadata_latency = self.metrics.histogram(
+            'teletorrent_metadata_seconds', 'Time from adding a magnet link to receiving its metadata', ['source'],
+            buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800)
+        )
+        self.metadata_timeouts = self.metrics.counter(
+            'teletorrent_metadata_timeouts_total', 'Magnet links that hit metadata_timeout'
+        )
+        self.post_stage_latency = self.metrics.histogram(
+            'teletorrent_postprocess_stage_seconds', 'Post-completion pipeline stage duration', ['stage', 'result'],
+            buckets=(0.1, 0.5, 1, 5, 15, 60, 300, 900, 3600)
+        )
+        self.stream_piece_wait = self.metrics.histogram(
+            'teletorrent_stream_piece_wait_seconds', 'Time a stream waited for a piece to be read or downloaded',
+            buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 15, 60)
+        )
+        self.metrics.add_collector(self.collect_metrics)
+    
+    def collect_metrics(self):
+        """Refresh scrape-time gauges from the status cache and queues"""
+        self.torrent_rate_gauge.clear()
+        self.torrent_progress_gauge.clear()
+        for status in self.status_cache.values():
+            self.torrent_rate_gauge.set(status.download_rate, info_hash=status.info_hash, name=status.name, direction='down')
+            self.torrent_rate_gauge.set(status.upload_rate, info_hash=status.info_hash, name=status.name, direction='up')
+            self.torrent_progress_gauge.set(status.progress, info_hash=status.info_hash, name=status.name)
+        
+        self.active_gauge.set(self.active_download_count())
+        self.queue_gauge.set(len(self.scheduler), queue='downloads')
+        self.queue_gauge.set(self.dispatcher.pending() if self.dispatcher else 0, queue='outbound_messages')
+        self.queue_gauge.set(len(self.pending_resume), queue='resume_saves')
+        self.queue_gauge.set(len(self.post_tasks), queue='postprocess')
+    
+    def on_session_stats(self, alert):
+        """Handle session_stats_alert: update session counters and payload rates"""
+        values = alert.values
+        now = time.monotonic()
+        previous, previous_time = self.session_stats, self.session_stats_time
+        self.session_stats = {name: values[name] for name in SESSION_STATS if name in values}
+        self.session_stats_time = now
+        
+        for name, value in self.session_stats.items():
+            self.session_stat_gauge.set(value, stat=name)
+        
+        elapsed = now - previous_time
+        if previous and elapsed > 0:
+            for direction, name in (('down', 'net.recv_payload_bytes'), ('up', 'net.sent_payload_bytes')):
+                if name in previous and name in self.session_stats:
+                    rate = (self.session_stats[name] - previous[name]) / elapsed
+                    self.payload_rate_gauge.set(max(rate, 0), direction=direction)
+    
+    def timed_handler(self, command: str, callback):
+        """Wrap a command handler to record its latency and failures"""
+        @functools.wraps(callback)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            except Exception:
+                self.command_errors.inc(command=command)
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                self.command_latency.observe(elapsed, command=command)
+                self.handler_timings.record(command, elapsed)
+        return wrapper
+    
+    def record_loop_lag(self, lag: float):
+        """Export one event-loop lag sample"""
+        self.loop_lag_gauge.set(lag)
+        self.loop_lag_histogram.observe(lag)
+        if lag > 1.0:
+            self.logger.warning(f"Event loop was blocked for {lag:.2f}s")
+    
+    def is_admin(self, user) -> bool:
+        """Return True if the user is listed in [telegram] admin_ids"""
+        admin_ids = self.config['telegram'].get('admin_ids', '')
+        return str(user.id) in {admin_id.strip() for admin_id in admin_ids.split(',') if admin_id.strip()}
+    
+    async def perf_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /perf command (admin only): /perf [profile [seconds]]"""
+        if not self.is_admin(update.effective_user):
+            await update.message.reply_text("⛔ /perf is restricted to admins (see admin_ids in config.ini)")
+            return
+        
+        args = context.args or []
+        if args and args[0] == 'profile':
+            await self.run_profile(update, int(args[1]) if len(args) > 1 and args[1].isdigit() else 10)
+            return
+        
+        lag = self.loop_lag.stats()
+        perf_msg = (
+            f"⏱️ Event loop lag (last {lag['window']:.0f}s)\n"
+            f"  now {lag['current'] * 1000:.1f} ms • p50 {lag['p50'] * 1000:.1f} ms • "
+            f"p99 {lag['p99'] * 1000:.1f} ms • max {lag['max'] * 1000:.1f} ms\n"
+            f"  worst since start {lag['worst'] * 1000:.1f} ms\n\n"
+            f"📦 Torrents: {len(self.status_cache)} in session, {self.active_download_count()} downloading, "
+            f"{len(self.scheduler)} queued\n"
+            f"📨 Outgoing messages pending: {self.dispatcher.pending() if self.dispatcher else 0}\n\n"
+            f"🚀 Startup: {' • '.join(f'{name} after {elapsed:.2f}s' for name, elapsed in self.startup.milestones)}\n"
+            f"  {', '.join(f'{name} {elapsed * 1000:.0f} ms' for name, elapsed in self.startup.phases)}\n\n"
+            f"🧮 Handlers (calls • p50 • p95 • max):\n"
+        )
+        for name, calls, p50, p95, slowest in self.handler_timings.summary():
+            perf_msg += f"  /{name}: {calls} • {p50 * 1000:.1f} • {p95 * 1000:.1f} • {slowest * 1000:.1f} ms\n"
+        
+        await update.message.reply_text(perf_msg)
+    
+    async def settings_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /settings command (admin only): /settings [name filter]"""
+        if not self.is_admin(update.effective_user):
+            await update.message.reply_text("⛔ /settings is restricted to admins (see admin_ids in config.ini)")
+            return
+        
+        try:
+            effective = self.session.get_settings()
+        except Exception as e:
+            await update.message.reply_text(f"❌ Error reading libtorrent settings: {str(e)}")
+            return
+        defaults = lt.default_settings() if hasattr(lt, 'default_settings') else {}
+        query = ' '.join(context.args or []).lower()
+        
+        shards = f" • {self.session_shards} shards (showing shard 0)" if self.session_shards > 1 else ""
+        lines = [
+            f"⚙️ libtorrent {lt.__version__} • profile {self.session_profile.name} • disk I/O {self.disk_io}{shards}",
+            f"Profiles: {', '.join(available_profiles(self.config))}",
+            ""
+        ]
+        if query:
+            names = sorted(name for name in effective if query in name)
+            lines.append(f"Settings matching '{query}' (* = changed from libtorrent's default):")
+        else:
+            names = sorted(
+                name for name in effective
+                if name in self.session_profile.settings or effective[name] != defaults.get(name)
+            )
+            lines.append("Profile and changed settings (* = changed from libtorrent's default):")
+        for name in names:
+            marker = '*' if name in defaults and effective[name] != defaults[name] else ' '
+            lines.append(f"{marker} {name} = {effective[name]}")
+        if not names:
+            lines.append("  (none)")
+        
+        for chunk in chunk_lines(lines, 4000):
+            await update.message.reply_text(chunk)
+    
+    async def run_profile(self, update: Update, seconds: int):
+        """Sample the event-loop thread for a few seconds and report the hottest frames"""
+        if self.profiling:
+            await update.message.reply_text("⏳ A profile is already running")
+            return
+        seconds = min(max(1, seconds), 60)
+        
+        self.profiling = True
+        try:
+            await update.message.reply_text(f"🔬 Profiling the event loop for {seconds}s...")
+            profiler = SamplingProfiler(threading.get_ident())
+            samples, own, cumulative = await asyncio.to_thread(profiler.run, seconds)
+        finally:
+            self.profiling = False
+        
+        if not samples:
+            await update.message.reply_text("❌ No samples collected")
+            return
+        
+        lines = [f"{samples} samples (idle time shows up as selectors.py select)", "", "Top frames (self):"]
+        for frame, count in own.most_common(15):
+            lines.append(f"{count * 100 / samples:5.1f}%  {frame}")
+        lines += ["", "Top functions (cumulative):"]
+        for frame, count in cumulative.most_common(10):
+            lines.append(f"{count * 100 / samples:5.1f}%  {frame}")
+        
+        for chunk in chunk_lines(lines, 4000):
+            await update.message.reply_text(chunk)
+    
+    def add_command(self, command: str, callback):
+        """Register a timed CommandHandler"""
+        self.app.add_handler(CommandHandler(command, self.timed_handler(command, callback)))
+    
+    def add_upload_handler(self, callback):
+        """Register a timed handler for .torrent and .zip document uploads"""
+        self.app.add_handler(MessageHandler(
+            filters.Document.FileExtension('torrent') | filters.Document.FileExtension('zip'),
+            self.timed_handler('upload', callback)
+        ))
+    
+    async def start_metrics_server(self):
+        """Start the local metrics endpoint if enabled in config.ini"""
+        if not self.config.has_section('metrics') or not self.config['metrics'].getboolean('enabled', False):
+            return
+        metrics_config = self.config['metrics']
+        self.metrics_server = MetricsServer(
+            self.metrics,
+            metrics_config.get('host', '127.0.0.1'),
+            metrics_config.getint('port', 9464),
+            self.logger
+        )
+        try:
+            await self.metrics_server.start()
+        except OSError as e:
+            self.logger.error(f"Failed to start metrics endpoint: {e}")
+            self.metrics_server = None
+    
+    async def start_stream_server(self):
+        """Start the stream server if enabled in config.ini"""
+        if not self.stream_server:
+            return
+        try:
+            await self.stream_server.start()
+        except OSError as e:
+            self.logger.error(f"Failed to start stream server: {e}")
+            self.stream_server = None
+    
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /start command"""
         welcome_msg = (
             "🤖 *Torrent Download Bot*\n\n"
             "Available commands:\n"
-            "• `/download <torrent_link>` - Download a torrent\n"
+            "• `/download <torrent_link> [more links...]` - Download one or more torrents\n"
+            "• `/download force <torrent_link>` - Download again even if it was downloaded before\n"
+            "• Send a `.torrent` file or a zip of them to download them all\n"
             "• `/status` - Show current downloads\n"
-            "• `/logs` - Show recent logs\n"
-            "• `/history` - Show download history\n"
+            "• `/live [on|off]` - Pinned status message that updates itself\n"
+            "• `/queue` - Show queued downloads\n"
+            "• `/seeding` - Show finished torrents that are still seeding\n"
+            "• `/files [hash]` - List a torrent's files and pick which ones to download\n"
+            "• `/stream <hash> [file]` - Link to watch a file while it downloads\n"
+            "• `/logs [n] [level] [pattern]` - Show recent logs\n"
+            "• `/history [page] [user=name] [from=YYYY-MM-DD] [to=YYYY-MM-DD]` - Show download history\n"
+            "• `/perf [profile [seconds]]` - Event-loop lag and handler timings (admins)\n"
+            "• `/settings [filter]` - Active libtorrent settings profile (admins)\n"
             "• `/help` - Show this help message"
         )
         await update.message.reply_text(welcome_msg, parse_mode='Markdown')
@@ -107,44 +727,57 @@ class TorrentBot:
         await self.start_command(update, context)
     
     async def download_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /download command"""
-        if not context.args:
+        """Handle /download command: one or more magnet links / .torrent URLs, optionally prefixed by 'force'"""
+        args = list(context.args or [])
+        force = bool(args) and args[0].lower() == 'force'
+        if force:
+            args = args[1:]
+        if not args:
             await update.message.reply_text("❌ Please provide a torrent link or magnet URL")
             return
         
-        torrent_url = ' '.join(context.args)
+        torrent_url = ' '.join(args)
         user = update.effective_user
+        user_name = user.username or user.first_name
+        
+        links = extract_links(torrent_url)
+        if len(links) > 1:
+            result = await self.ingest(links, [], user_name, update.effective_chat.id, force=force)
+            await update.message.reply_text(result.summary(user_name))
+            self.logger.info(f"Bulk download by {user.username}: {len(links)} links")
+            return
         
         try:
-            # Add torrent to session
-            if torrent_url.startswith('magnet:'):
-                params = lt.parse_magnet_uri(torrent_url)
-                params.save_path = self.config['paths']['download_dir']
-                handle = self.session.add_torrent(params)
-            else:
-                # Assume it's a .torrent file URL
-                import urllib.request
-                torrent_data = urllib.request.urlopen(torrent_url).read()
-                info = lt.torrent_info(torrent_data)
-                handle = self.session.add_torrent({
-                    'ti': info,
-                    'save_path': self.config['paths']['download_dir']
-                })
-            
-            # Track the torrent
-            torrent_hash = str(handle.info_hash())
-            self.active_torrents[torrent_hash] = {
-                'handle': handle,
-                'name': handle.name() if handle.has_metadata() else 'Unknown',
-                'user': user.username or user.first_name,
-                'started': datetime.now().isoformat(),
-                'url': torrent_url
-            }
+            params = await self.build_add_params(torrent_url)
+            name, position, duplicate = await self.admit(
+                params, torrent_url, user_name, update.effective_chat.id, force=force
+            )
+            
+            if duplicate is not None:
+                hint = ""
+                if duplicate.state in (COMPLETED, ON_DISK):
+                    hint = "\n💡 Use /download force <link> to download it again"
+                await update.message.reply_text(
+                    f"♻️ Not added: {duplicate.describe()}\n"
+                    f"🎬 Torrent: {duplicate.name}{hint}"
+                )
+                self.logger.info(f"Duplicate download by {user.username} ({duplicate.describe()}): {torrent_url}")
+                return
+            
+            if position:
+                await update.message.reply_text(
+                    f"⏳ Download queued!\n"
+                    f"🎬 Torrent: {name}\n"
+                    f"📋 Position: {position}\n"
+                    f"👤 Requested by: {user_name}"
+                )
+                self.logger.info(f"Download queued by {user.username} at position {position}: {torrent_url}")
+                return
             
             await update.message.reply_text(
                 f"✅ Download started!\n"
-                f"🎬 Torrent: {self.active_torrents[torrent_hash]['name']}\n"
-                f"👤 Requested by: {user.username or user.first_name}"
+                f"🎬 Torrent: {name}\n"
+                f"👤 Requested by: {user_name}"
             )
             
             self.logger.info(f"Download started by {user.username}: {torrent_url}")
@@ -154,46 +787,815 @@ class TorrentBot:
             await update.message.reply_text(error_msg)
             self.logger.error(f"Download error: {e}")
     
+    async def document_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle an uploaded .torrent file or zip archive (plus any links in its caption)"""
+        document = update.message.document
+        file_name = document.file_name or 'upload'
+        user = update.effective_user
+        user_name = user.username or user.first_name
+        
+        if document.file_size and document.file_size > self.upload_max_size:
+            await update.message.reply_text(f"❌ {file_name} is too large (max {self.upload_max_size // (1024 * 1024)} MB)")
+            return
+        
+        try:
+            file = await context.bot.get_file(document.file_id)
+            data = bytes(await file.download_as_bytearray())
+            uploads = await asyncio.to_thread(torrent_files, file_name, data, self.fetcher.max_size)
+        except Exception as e:
+            await update.message.reply_text(f"❌ Could not read {file_name}: {e}")
+            self.logger.error(f"Upload error for {file_name}: {e}")
+            return
+        
+        links = extract_links(update.message.caption or '')
+        result = await self.ingest(links, uploads, user_name, update.effective_chat.id)
+        await update.message.reply_text(result.summary(user_name))
+        self.logger.info(f"Upload by {user.username}: {file_name} ({len(uploads)} torrents, {len(links)} links)")
+    
+    async def ingest(self, links: List[str], uploads: List[Tuple[str, bytes]], user_name: str,
+                     chat_id: Optional[int], force: bool = False) -> IngestResult:
+        """Add many torrents at once: parse everything concurrently, then start or queue in order"""
+        parsed = await asyncio.gather(
+            *(self.build_add_params(link) for link in links),
+            *(self.build_file_params(data) for _, data in uploads),
+            return_exceptions=True
+        )
+        
+        result = IngestResult()
+        sources = links + [name for name, _ in uploads]
+        for index, (source, params) in enumerate(zip(sources, parsed)):
+            if isinstance(params, Exception):
+                result.fail(source, str(params))
+                continue
+            # Uploaded files have no URL; a magnet link stands in for history and the saved queue
+            url = source if index < len(links) else lt.make_magnet_uri(params.ti)
+            try:
+                name, position, duplicate = await self.admit(
+                    params, url, user_name, chat_id, save_queue=False, force=force
+                )
+            except Exception as e:
+                result.fail(source, str(e))
+                continue
+            if duplicate is not None:
+                result.skip(duplicate.name, duplicate.describe())
+            else:
+                result.add(name, position)
+        
+        if result.queued:
+            await self.save_queue()
+        return result
+    
+    async def ingest_watch_files(self, paths: List[Path]) -> Set[Path]:
+        """Add the torrents of a batch of watch-folder files; returns the files that failed"""
+        def read():
+            entries, errors = [], []
+            for path in paths:
+                try:
+                    for name, data in torrent_files(path.name, path.read_bytes(), self.fetcher.max_size):
+                        entries.append((path, path.name if name == path.name else f"{path.name}/{name}", data))
+                except (OSError, ValueError) as e:
+                    errors.append((path, str(e)))
+            return entries, errors
+        
+        entries, errors = await asyncio.to_thread(read)
+        result = await self.ingest([], [(source, data) for _, source, data in entries], self.watch_user, None)
+        failed = {path for path, _ in errors}
+        failed_sources = {source for source, _ in result.failed}
+        failed.update(path for path, source, _ in entries if source in failed_sources)
+        for path, error in errors:
+            result.fail(path.name, error)
+        
+        self.logger.info(
+            f"Watch folder: {len(paths)} files, {len(result.started)} started, "
+            f"{len(result.queued)} queued, {len(result.failed)} failed"
+        )
+        await self.send_message(None, result.summary(self.watch_user))
+        return failed
+    
+    async def admit(self, params, torrent_url: str, user_name: str, chat_id: Optional[int],
+                    save_queue: bool = True, force: bool = False) -> Tuple[str, int, Optional[DedupEntry]]:
+        """Start a download if a slot is free, otherwise queue it
+        
+        Returns its name, its queue position (0 = started) and, if it is a
+        duplicate, the entry it duplicates; duplicates are not added. force
+        allows torrents that were already downloaded.
+        """
+        # Completed torrents are indexed from the history, which may still be opening
+        await self.get_history()
+        name = self.params_name(params)
+        torrent_hash = params_info_hash(params)
+        # The session would hand back the seed's handle, so not even force re-adds it as a download
+        seed = self.seeds.get(torrent_hash)
+        if seed is not None:
+            return seed.name, 0, DedupEntry(SEEDING, seed.name, seed.user, seed.completed_at)
+        if self.dedup_check_content and not force and params.ti is not None and self.dedup.get(torrent_hash) is None:
+            download_dir = self.config['paths']['download_dir']
+            if await asyncio.to_thread(content_exists, download_dir, name, params.ti.total_size()):
+                return name, 0, DedupEntry(ON_DISK, name, '')
+        
+        # Magnets are sized once their metadata arrives (see check_magnet_space)
+        size = self.params_size(params)
+        space = await self.check_space(size) if size is not None else None
+        # Too large for the disk at all: queueing it would only hold up the downloads behind it
+        if space is not None and not space.fits and (self.disk_full_action == 'reject' or space.too_large):
+            raise ValueError(f"Not enough disk space: {space.describe()}")
+        
+        # Check and record in one step, with no await in between
+        has_slot = self.scheduler.has_slot(self.active_download_count()) and (space is None or space.fits)
+        duplicate = self.dedup.claim(torrent_hash, ACTIVE if has_slot else QUEUED, name, user_name, force)
+        if duplicate is not None:
+            return duplicate.name, 0, duplicate
+        
+        if not has_slot:
+            if space is not None and not space.fits:
+                self.logger.info(f"Queueing {name} until there is disk space: {space.describe()}")
+            item = QueuedDownload(
+                url=torrent_url,
+                user=user_name,
+                priority=self.user_priority(user_name),
+                chat_id=chat_id,
+                name=name,
+                params=params,
+                info_hash=torrent_hash,
+                size=size
+            )
+            position = self.scheduler.push(item)
+            if save_queue:
+                await self.save_queue()
+            return item.name, position, None
+        
+        try:
+            torrent = await self.start_download(params, user_name, torrent_url, chat_id)
+        except Exception:
+            self.dedup.discard(torrent_hash, ACTIVE)
+            raise
+        return torrent.name, 0, None
+    
+    async def build_add_params(self, torrent_url: str):
+        """Turn a magnet link or .torrent URL into add_torrent_params"""
+        if torrent_url.startswith('magnet:'):
+            params = lt.parse_magnet_uri(torrent_url)
+        else:
+            # Assume it's a .torrent file URL
+            params = lt.add_torrent_params()
+            params.ti = await self.fetcher.fetch(torrent_url)
+        params.save_path = self.config['paths']['download_dir']
+        self.apply_storage_mode(params)
+        self.apply_file_filter(params)
+        return params
+    
+    async def build_file_params(self, data: bytes):
+        """Parse an uploaded .torrent file off the event loop into add_torrent_params"""
+        params = lt.add_torrent_params()
+        try:
+            params.ti = await asyncio.to_thread(lt.torrent_info, data)
+        except Exception as e:
+            raise ValueError(f"Invalid torrent file: {e}") from e
+        params.save_path = self.config['paths']['download_dir']
+        self.apply_storage_mode(params)
+        self.apply_file_filter(params)
+        return params
+    
+    def apply_storage_mode(self, params):
+        """Use sparse files or full preallocation ([settings] storage_mode)"""
+        if self.storage_mode == 'allocate':
+            params.storage_mode = lt.storage_mode_t.storage_mode_allocate
+        else:
+            params.storage_mode = lt.storage_mode_t.storage_mode_sparse
+    
+    def apply_file_filter(self, params):
+        """Skip the files excluded by the [files] patterns before the torrent is added"""
+        if params.ti is None or not self.file_filter:
+            return
+        priorities = self.file_filter.priorities(params.ti)
+        if priorities is not None:
+            params.file_priorities = priorities
+    
+    def filter_files(self, handle):
+        """Apply the [files] patterns to a magnet link whose metadata just arrived"""
+        if not self.file_filter:
+            return
+        info = handle.torrent_file()
+        priorities = self.file_filter.priorities(info) if info is not None else None
+        if priorities is None:
+            return
+        handle.prioritize_files(priorities)
+        self.logger.info(
+            f"Skipping {priorities.count(SKIP)} of {len(list_files(info))} files of {handle.name()} ([files] patterns)"
+        )
+    
+    def params_size(self, params) -> Optional[int]:
+        """Bytes a torrent will download, counting selected files only; None until a magnet has metadata"""
+        if params.ti is None:
+            return None
+        priorities = list(params.file_priorities)
+        if not priorities:
+            return params.ti.total_size()
+        return selected_size(list_files(params.ti), priorities)
+    
+    def reserved_bytes(self, exclude: Optional[str] = None) -> int:
+        """Bytes the active downloads still have to write
+        
+        Sized from the status cache, or the full torrent size until the first
+        status update. Fully allocated torrents already hold their space.
+        """
+        reserved = 0
+        for torrent_hash, size in self.disk_claims.items():
+            if torrent_hash == exclude:
+                continue
+            status = self.status_cache.get(torrent_hash)
+            if status is None or not status.has_metadata:
+                reserved += size or 0
+            elif self.storage_mode == 'sparse':
+                reserved += max(0, status.total_wanted - status.total_wanted_done)
+        return reserved
+    
+    async def check_space(self, size: int, exclude: Optional[str] = None) -> SpaceCheck:
+        """Check whether a torrent of size bytes fits in the download directory"""
+        download_dir = self.config['paths']['download_dir']
+        reserved = self.reserved_bytes(exclude)
+        try:
+            return await asyncio.to_thread(check_space, download_dir, size, reserved, self.disk_margin)
+        except OSError as e:
+            self.logger.error(f"Could not check free space in {download_dir}: {e}")
+            return SpaceCheck(True, size, 0, reserved, self.disk_margin)
+    
+    def params_name(self, params) -> str:
+        """Best known name for a torrent that has not been added yet"""
+        if params.ti is not None:
+            return params.ti.name()
+        return params.name or 'Unknown'
+    
+    async def start_download(self, params, user_name: str, torrent_url: str,
+                             chat_id: Optional[int] = None) -> TrackedTorrent:
+        """Add a torrent to the session and start tracking it"""
+        handle = self.session.add_torrent(params)
+        
+        # Track the torrent
+        torrent = await self.torrents.add(TrackedTorrent(
+            info_hash=str(handle.info_hash()),
+            handle=handle,
+            name=handle.name() if handle.has_metadata() else self.params_name(params),
+            user=user_name,
+            started=datetime.now().isoformat(),
+            url=torrent_url,
+            chat_id=chat_id
+        ))
+        
+        self.dedup.set(torrent.info_hash, ACTIVE, torrent.name, torrent.user)
+        # Magnets stay unsized (None) until their metadata arrives
+        self.disk_claims[torrent.info_hash] = self.params_size(params)
+        if not handle.has_metadata():
+            self.watch_metadata(torrent.info_hash)
+        
+        # Persist right away so a restart does not lose the new torrent
+        self.request_resume_data(handle)
+        return torrent
+    
+    def active_download_count(self) -> int:
+        """Downloads holding a slot, including ones still being restored"""
+        restoring = sum(1 for meta in self.restoring.values() if not meta.get('completed'))
+        return len(self.torrents) + restoring
+    
+    def user_priority(self, user_name: str) -> int:
+        """Queue priority for a user from config.ini [priorities] (higher starts first)"""
+        if self.config.has_section('priorities'):
+            return self.config['priorities'].getint(user_name, 0)
+        return 0
+    
+    async def promote_queued(self):
+        """Start queued downloads while there are free slots, in queue order among the ones that fit on disk"""
+        async with self.queue_lock:
+            promoted = False
+            while len(self.scheduler) and self.scheduler.has_slot(self.active_download_count()):
+                # Downloads that do not fit are passed over, so one large torrent cannot hold up the rest
+                space = await self.check_space(0)
+                waiting = []
+                item = None
+                for queued in self.scheduler.ordered():
+                    if queued.size is None or space.admits(queued.size):
+                        item = queued
+                        break
+                    waiting.append(queued)
+                if waiting and not self.space_blocked:
+                    head = waiting[0]
+                    self.logger.warning(
+                        f"Queue is waiting for disk space for {head.name}: "
+                        f"{space._replace(fits=False, needed=head.size).describe()}"
+                    )
+                self.space_blocked = bool(waiting)
+                if item is None:
+                    break
+                item = self.scheduler.take(item.seq)
+                promoted = True
+                try:
+                    params = item.params or await self.build_add_params(item.url)
+                    torrent = await self.start_download(params, item.user, item.url, item.chat_id)
+                except Exception as e:
+                    self.logger.error(f"Failed to start queued download {item.url}: {e}")
+                    if item.info_hash:
+                        self.dedup.discard(item.info_hash, QUEUED)
+                    continue
+                
+                self.logger.info(f"Queued download started for {item.user}: {item.url}")
+                await self.send_message(
+                    item.chat_id,
+                    f"▶️ Queued download started!\n"
+                    f"🎬 Torrent: {torrent.name}\n"
+                    f"👤 Requested by: {item.user}"
+                )
+            
+            if promoted:
+                await self.save_queue()
+    
+    async def save_queue(self):
+        """Persist the download queue so it survives restarts"""
+        items = [item.to_dict() for item in self.scheduler.ordered()]
+        
+        def write():
+            tmp_path = self.queue_file.with_suffix('.tmp')
+            with open(tmp_path, 'w') as f:
+                json.dump(items, f)
+            os.replace(tmp_path, self.queue_file)
+        
+        try:
+            await asyncio.to_thread(write)
+        except Exception as e:
+            self.logger.error(f"Error saving queue: {e}")
+    
+    async def load_queue(self):
+        """Re-queue downloads saved by a previous run"""
+        if not self.queue_file.exists():
+            return
+        
+        def read():
+            with open(self.queue_file, 'r') as f:
+                return json.load(f)
+        
+        try:
+            items = await asyncio.to_thread(read)
+        except Exception as e:
+            self.logger.error(f"Error loading queue: {e}")
+            return
+        for data in items:
+            item = QueuedDownload.from_dict(data)
+            self.scheduler.push(item)
+            if item.info_hash:
+                self.dedup.set(item.info_hash, QUEUED, item.name, item.user)
+        if items:
+            self.logger.info(f"Restored {len(items)} queued downloads")
+    
+    async def queue_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /queue command: /queue [cancel <position>]"""
+        args = context.args or []
+        ordered = self.scheduler.ordered()
+        
+        if args and args[0] == 'cancel':
+            if len(args) < 2 or not args[1].isdigit() or not 1 <= int(args[1]) <= len(ordered):
+                await update.message.reply_text("❌ Usage: /queue cancel <position>")
+                return
+            item = ordered[int(args[1]) - 1]
+            user = update.effective_user
+            if item.user != (user.username or user.first_name):
+                await update.message.reply_text("❌ You can only cancel your own downloads")
+                return
+            self.scheduler.remove(item.seq)
+            if item.info_hash:
+                self.dedup.discard(item.info_hash, QUEUED)
+            await self.save_queue()
+            await update.message.reply_text(f"🗑️ Removed from queue: {item.name}")
+            return
+        
+        active = self.active_download_count()
+        limit = self.max_concurrent if self.max_concurrent > 0 else "∞"
+        queue_msg = f"📋 *Download Queue* ({active}/{limit} active)\n\n"
+        
+        if not ordered:
+            queue_msg += "Queue is empty"
+        for position, item in enumerate(ordered[:20], 1):
+            queued_date = datetime.fromisoformat(item.queued).strftime("%m/%d %H:%M")
+            size = f" • 💾 {format_size(item.size)}" if item.size else ""
+            queue_msg += (
+                f"{position}. 🎬 {item.name}\n"
+                f"   👤 {item.user} • ⏳ {queued_date}{size}\n"
+            )
+        if len(ordered) > 20:
+            queue_msg += f"\n… and {len(ordered) - 20} more"
+        if self.space_blocked:
+            queue_msg += "\n💾 Waiting for disk space"
+        
+        await update.message.reply_text(queue_msg, parse_mode='Markdown')
+    
     async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Handle /status command"""
-        if not self.active_torrents:
-            await update.message.reply_text("📭 No active downloads")
-            return
-        
-        status_msg = "📊 *Current Downloads:*\n\n"
-        
-        for torrent_hash, torrent_info in list(self.active_torrents.items()):
-            handle = torrent_info['handle']
-            status = handle.status()
-            
-            if status.is_seeding or status.is_finished:
-                # Move to history and remove from active
-                self.download_history.append({
-                    'name': torrent_info['name'],
-                    'user': torrent_info['user'],
-                    'completed': datetime.now().isoformat(),
-                    'status': 'completed'
-                })
-                del self.active_torrents[torrent_hash]
-                self.save_history()
+        await update.message.reply_text(self.render_status(), parse_mode='Markdown')
+    
+    def render_status(self, limit: int = 4000) -> str:
+        """Render the current downloads from the status cache, within Telegram's message limit"""
+        header = "📊 *Current Downloads:*\n\n"
+        blocks = []
+        size = len(header)
+        hidden = 0
+        
+        for torrent_hash, torrent in self.torrents.snapshot.items():
+            status = self.status_cache.get(torrent_hash)
+            
+            if status is None:
+                # Not reported by libtorrent yet
+                block = (
+                    f"🎬 *{torrent.name}*\n"
+                    f"📥 State: Starting\n"
+                    f"👤 By: {torrent.user}\n\n"
+                )
+            elif status.is_seeding or status.is_finished:
+                # Completion is handled by on_torrent_finished
                 continue
+            else:
+                progress = status.progress * 100
+                state = self.get_torrent_state(status.state)
+                download_rate = status.download_rate / 1024 / 1024  # MB/s
+                
+                block = (
+                    f"🎬 *{torrent.name}*\n"
+                    f"📊 Progress: {progress:.1f}%\n"
+                    f"⚡ Speed: {download_rate:.2f} MB/s\n"
+                    f"📥 State: {state}\n"
+                    f"👤 By: {torrent.user}\n\n"
+                )
             
-            progress = status.progress * 100
-            state = self.get_torrent_state(status.state)
-            download_rate = status.download_rate / 1024 / 1024  # MB/s
+            if hidden or size + len(block) > limit - 40:
+                hidden += 1
+                continue
+            blocks.append(block)
+            size += len(block)
+        
+        if not blocks:
+            return "📭 No active downloads"
+        if hidden:
+            blocks.append(f"… and {hidden} more")
+        return header + ''.join(blocks)
+    
+    async def files_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /files command: /files [<hash> [page]] or /files <hash> skip|get|only <numbers or patterns>"""
+        args = context.args or []
+        if not args:
+            await update.message.reply_text(self.render_file_torrents())
+            return
+        
+        torrent_hash, error = self.find_torrent_hash(args[0])
+        if error:
+            await update.message.reply_text(error)
+            return
+        # Removed or retired since the lookup
+        torrent = self.torrents.get(torrent_hash) or self.seeds.get(torrent_hash)
+        if torrent is None:
+            await update.message.reply_text(f"❌ No torrent matches {args[0]} (see /files)")
+            return
+        handle = torrent.handle
+        
+        try:
+            listing = await asyncio.to_thread(self.read_file_list, handle)
+        except Exception as e:
+            await update.message.reply_text(f"❌ Error reading the file list: {str(e)}")
+            return
+        if listing is None:
+            await update.message.reply_text(f"⏳ {torrent.name} has no metadata yet, try again once it is known")
+            return
+        files, priorities, progress = listing
+        
+        action = args[1].lower() if len(args) > 1 else ''
+        if action not in ('skip', 'get', 'only'):
+            page = int(action) if action.isdigit() else 1
+            await update.message.reply_text(
+                self.render_files(torrent_hash, torrent.name, files, priorities, progress, page)
+            )
+            return
+        
+        user = update.effective_user
+        user_name = user.username or user.first_name
+        if torrent_hash not in self.torrents:
+            await update.message.reply_text(f"❌ {torrent.name} has finished downloading")
+            return
+        if torrent.user != user_name and not self.is_admin(user):
+            await update.message.reply_text("❌ You can only change your own downloads")
+            return
+        try:
+            if not args[2:]:
+                raise ValueError("Give file numbers (3, 2-5), patterns (*.mkv) or 'all'")
+            chosen = select(files, args[2:])
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}\nUsage: /files <hash> skip|get|only <numbers or patterns>")
+            return
+        
+        for file in files:
+            if action == 'only':
+                priorities[file.index] = DEFAULT if file.index in chosen else SKIP
+            elif file.index in chosen:
+                priorities[file.index] = SKIP if action == 'skip' else max(priorities[file.index], DEFAULT)
+        wanted = [file for file in files if priorities[file.index] != SKIP]
+        if not wanted:
+            await update.message.reply_text("❌ At least one file has to stay selected")
+            return
+        
+        handle.prioritize_files(priorities)
+        self.request_resume_data(handle)
+        self.logger.info(f"{user_name} changed the file selection of {torrent.name}: {action} {' '.join(args[2:])}")
+        await update.message.reply_text(
+            f"✅ Selection updated for {torrent.name}\n"
+            f"📂 {len(wanted)} of {len(files)} files • "
+            f"{format_size(selected_size(files, priorities))} of {format_size(sum(file.size for file in files))}"
+        )
+    
+    def read_file_list(self, handle) -> Optional[Tuple[List[TorrentFile], List[int], List[int]]]:
+        """Files, priorities and per-file progress of a torrent, or None without metadata (blocking)"""
+        info = handle.torrent_file()
+        if info is None:
+            return None
+        progress = handle.file_progress(lt.torrent_handle.piece_granularity)
+        priorities = list(handle.get_file_priorities())
+        priorities += [DEFAULT] * (info.files().num_files() - len(priorities))
+        return list_files(info), priorities, list(progress)
+    
+    async def stream_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /stream command: /stream <hash> [file number]"""
+        if not self.stream_server:
+            await update.message.reply_text("❌ Streaming is disabled (see [streaming] in config.ini)")
+            return
+        args = context.args or []
+        if not args:
+            await update.message.reply_text("❌ Usage: /stream <hash> [file number] (see /files)")
+            return
+        
+        torrent_hash, error = self.find_torrent_hash(args[0])
+        if error:
+            await update.message.reply_text(error)
+            return
+        # Removed or retired since the lookup
+        torrent = self.torrents.get(torrent_hash) or self.seeds.get(torrent_hash)
+        if torrent is None:
+            await update.message.reply_text(f"❌ No torrent matches {args[0]} (see /files)")
+            return
+        try:
+            listing = await asyncio.to_thread(self.read_file_list, torrent.handle)
+        except Exception as e:
+            await update.message.reply_text(f"❌ Error reading the file list: {str(e)}")
+            return
+        if listing is None:
+            await update.message.reply_text(f"⏳ {torrent.name} has no metadata yet, try again once it is known")
+            return
+        files, priorities, progress = listing
+        
+        short = torrent_hash[:8]
+        if len(args) > 1:
+            if not args[1].isdigit() or not 1 <= int(args[1]) <= len(files):
+                await update.message.reply_text(f"❌ Give a file number from 1-{len(files)} (see /files {short})")
+                return
+            position = int(args[1])
+        else:
+            # The largest selected file, usually the video
+            position = max(
+                (position for position, file in enumerate(files, 1) if priorities[file.index] != SKIP),
+                key=lambda position: files[position - 1].size
+            )
+        file = files[position - 1]
+        if priorities[file.index] == SKIP:
+            await update.message.reply_text(
+                f"❌ {file.relative_path} is skipped, select it with /files {short} get {position} first"
+            )
+            return
+        
+        done = progress[file.index] * 100 // file.size if file.index < len(progress) and file.size else 0
+        await update.message.reply_text(
+            f"📺 {file.relative_path} — {format_size(file.size)} • {done}% downloaded\n\n"
+            f"🔗 {self.stream_server.url(torrent_hash, file.index, file.path)}\n\n"
+            f"💡 Open it in VLC or mpv as a network stream. Playback starts once the first pieces arrive, "
+            f"seeking downloads the pieces it needs first."
+        )
+        self.logger.info(f"Stream link for {torrent.name} file {position} given to {update.effective_user.username}")
+    
+    def find_torrent_hash(self, prefix: str) -> Tuple[Optional[str], Optional[str]]:
+        """Resolve an info-hash or a unique prefix of one to a downloading or seeding torrent
+        
+        Returns the info-hash, or an error message for the user.
+        """
+        prefix = prefix.lower()
+        if len(prefix) < 4:
+            return None, "❌ Give at least 4 characters of the info-hash (see /files)"
+        found = [torrent_hash for torrent_hash in (*self.torrents.snapshot, *self.seeds) if torrent_hash.startswith(prefix)]
+        if not found:
+            return None, f"❌ No torrent matches {prefix} (see /files)"
+        if len(found) > 1:
+            return None, f"❌ {prefix} matches {len(found)} torrents, give more of the info-hash"
+        return found[0], None
+    
+    def render_file_torrents(self, limit: int = 4000) -> str:
+        """List downloading and seeding torrents with the short hashes /files takes"""
+        lines = []
+        for torrent_hash, torrent in [*self.torrents.snapshot.items(), *self.seeds.items()]:
+            status = self.status_cache.get(torrent_hash)
+            if torrent_hash in self.seeds:
+                state = "🌱"
+            elif status is not None and status.has_metadata:
+                state = f"📥 {status.progress * 100:.0f}%"
+            else:
+                state = "⏳"
+            lines.append(f"{torrent_hash[:8]} {state} {torrent.name}")
+        if not lines:
+            return "📂 No torrents. Files can be picked once a download has started."
+        
+        text = "📂 Torrents (use /files <hash> to list and pick files):\n\n"
+        for index, line in enumerate(lines):
+            if len(text) + len(line) > limit - 40:
+                return text + f"… and {len(lines) - index} more"
+            text += line + "\n"
+        return text
+    
+    def render_files(self, torrent_hash: str, name: str, files: List[TorrentFile], priorities: List[int],
+                     progress: List[int], page: int = 1, page_size: int = 30) -> str:
+        """Render one page of a torrent's files with their sizes, selection and progress"""
+        short = torrent_hash[:8]
+        pages = max(1, (len(files) + page_size - 1) // page_size)
+        page = min(page, pages)
+        text = (
+            f"📂 {name} ({short})\n"
+            f"{len(files)} files • {format_size(selected_size(files, priorities))} selected "
+            f"of {format_size(sum(file.size for file in files))}\n\n"
+        )
+        
+        for position, file in enumerate(files[(page - 1) * page_size:page * page_size], (page - 1) * page_size + 1):
+            if priorities[file.index] == SKIP:
+                line = f"{position}. ⏭️ {file.relative_path} — {format_size(file.size)}"
+            else:
+                line = f"{position}. ✅ {file.relative_path} — {format_size(file.size)}"
+                # Sharded sessions do not report per-file progress
+                if file.index < len(progress) and file.size:
+                    line += f" • {progress[file.index] * 100 // file.size}%"
+            if len(text) + len(line) > 3700:
+                text += "…\n"
+                break
+            text += line + "\n"
+        
+        if pages > 1:
+            text += f"\n📄 Page {page}/{pages} • /files {short} <page>"
+        text += f"\n💡 /files {short} skip|get|only <numbers or patterns>"
+        return text
+    
+    async def seeding_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /seeding command: finished torrents, their ratio and the seeding policy"""
+        await update.message.reply_text(self.render_seeding(), parse_mode='Markdown')
+    
+    def render_seeding(self, limit: int = 4000) -> str:
+        """Render the seeding torrents, newest first, within Telegram's message limit"""
+        seeds = sorted(self.seeds.values(), key=lambda seed: seed.completed_at, reverse=True)
+        if not seeds:
+            return f"🌱 Nothing is seeding\n📏 Policy: {self.seed_policy.describe()}"
+        
+        counts = {'seeding': 0, 'queued': 0, 'retired': 0}
+        blocks = []
+        hidden = 0
+        for seed in seeds:
+            status = self.status_cache.get(seed.info_hash)
+            if seed.retired:
+                counts['retired'] += 1
+                state = f"⏸️ Retired: {seed.retired}"
+            elif status is None:
+                counts['seeding'] += 1
+                state = "🔄 Starting"
+            elif status.paused:
+                counts['queued'] += 1
+                state = "⏳ Queued for a seed slot"
+            else:
+                counts['seeding'] += 1
+                state = f"⬆️ {status.upload_rate / 1024:.0f} KB/s to {status.num_peers} peers"
             
-            status_msg += (
-                f"🎬 *{torrent_info['name']}*\n"
-                f"📊 Progress: {progress:.1f}%\n"
-                f"⚡ Speed: {download_rate:.2f} MB/s\n"
-                f"📥 State: {state}\n"
-                f"👤 By: {torrent_info['user']}\n\n"
+            if status is not None:
+                totals = f"📈 Ratio {share_ratio(status):.2f} • {format_size(status.all_time_upload)} uploaded"
+            else:
+                totals = "📈 Ratio ?"
+            block = (
+                f"🎬 *{seed.name}*\n"
+                f"{totals} • ⏱️ {format_duration(seed.seed_time)}\n"
+                f"{state}\n"
+                f"👤 By: {seed.user}\n\n"
+            )
+            if hidden or sum(map(len, blocks)) + len(block) > limit - 200:
+                hidden += 1
+                continue
+            blocks.append(block)
+        
+        header = (
+            f"🌱 *Seeding* ({counts['seeding']} seeding, {counts['queued']} queued, {counts['retired']} retired)\n"
+            f"📏 Policy: {self.seed_policy.describe()}\n\n"
+        )
+        if hidden:
+            blocks.append(f"… and {hidden} more")
+        return header + ''.join(blocks)
+    
+    async def live_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle /live command: /live [on|off] - pinned status message that updates in place"""
+        chat_id = update.effective_chat.id
+        action = context.args[0].lower() if context.args else 'on'
+        
+        if action == 'off':
+            board = self.live_boards.pop(chat_id, None)
+            if board is None:
+                await update.message.reply_text("📭 No live status board in this chat")
+                return
+            try:
+                await context.bot.unpin_chat_message(chat_id=chat_id, message_id=board['message_id'])
+            except Exception as e:
+                self.logger.warning(f"Could not unpin live status board: {e}")
+            await self.save_live_boards()
+            await update.message.reply_text("⏹️ Live status board stopped")
+            return
+        
+        if action != 'on':
+            await update.message.reply_text("❌ Usage: /live [on|off]")
+            return
+        if chat_id in self.live_boards:
+            await update.message.reply_text("📌 Live status board is already running in this chat")
+            return
+        
+        status_msg = self.render_status()
+        message = await update.message.reply_text(status_msg, parse_mode='Markdown')
+        try:
+            await context.bot.pin_chat_message(
+                chat_id=chat_id, message_id=message.message_id, disable_notification=True
             )
+        except Exception as e:
+            self.logger.warning(f"Could not pin live status board (is the bot allowed to pin?): {e}")
+        
+        self.live_boards[chat_id] = {
+            'message_id': message.message_id,
+            'digest': hashlib.sha1(status_msg.encode()).hexdigest(),
+            'failures': 0
+        }
+        await self.save_live_boards()
+    
+    async def run_live_boards(self):
+        """Edit every live status board when the rendered status changes"""
+        while True:
+            await asyncio.sleep(self.live_interval)
+            if not self.live_boards:
+                continue
+            
+            try:
+                status_msg = self.render_status()
+                digest = hashlib.sha1(status_msg.encode()).hexdigest()
+                
+                edits = {}
+                for chat_id, board in self.live_boards.items():
+                    if board['digest'] != digest:
+                        edits[chat_id] = self.dispatcher.edit(
+                            chat_id, board['message_id'], status_msg, parse_mode='Markdown'
+                        )
+                
+                results = await asyncio.gather(*edits.values())
+                dropped = False
+                for chat_id, result in zip(edits, results):
+                    board = self.live_boards.get(chat_id)
+                    if board is None:
+                        continue
+                    if result is not None:
+                        board['digest'] = digest
+                    # A failed edit leaves the old digest, so the board is retried on the next pass
+                    board['failures'] = 0 if result is not None else board['failures'] + 1
+                    if board['failures'] >= 3:
+                        # Message deleted or bot removed from the chat
+                        self.logger.warning(f"Dropping live status board in chat {chat_id}")
+                        del self.live_boards[chat_id]
+                        dropped = True
+                if dropped:
+                    await self.save_live_boards()
+            
+            except Exception as e:
+                self.logger.error(f"Error updating live status boards: {e}")
+    
+    async def save_live_boards(self):
+        """Persist live status boards so they keep updating after a restart"""
+        boards = {str(chat_id): board['message_id'] for chat_id, board in self.live_boards.items()}
         
-        if len(status_msg) == len("📊 *Current Downloads:*\n\n"):
-            status_msg = "📭 No active downloads"
+        def write():
+            with open(self.live_boards_file, 'w') as f:
+                json.dump(boards, f)
         
-        await update.message.reply_text(status_msg, parse_mode='Markdown')
+        try:
+            await asyncio.to_thread(write)
+        except Exception as e:
+            self.logger.error(f"Error saving live status boards: {e}")
+    
+    def load_live_boards(self):
+        """Load live status boards saved by a previous run"""
+        if not self.live_boards_file.exists():
+            return
+        try:
+            with open(self.live_boards_file, 'r') as f:
+                boards = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error loading live status boards: {e}")
+            return
+        for chat_id, message_id in boards.items():
+            self.live_boards[int(chat_id)] = {'message_id': message_id, 'digest': None, 'failures': 0}
     
     def get_torrent_state(self, state) -> str:
         """Convert torrent state to readable string"""
@@ -210,39 +1612,94 @@ class TorrentBot:
         return states.get(state, "Unknown")
     
     async def logs_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /logs command"""
+        """Handle /logs command: /logs [n] [level] [pattern]"""
+        count = 20
+        level = None
+        args = list(context.args or [])
+        if args and args[0].isdigit():
+            count = min(max(1, int(args.pop(0))), 500)
+        if args and args[0].upper() in LEVELS:
+            level = args.pop(0).upper()
+        pattern = ' '.join(args) or None
+        
         try:
             log_file = Path("logs/torrent_bot.log")
             if not log_file.exists():
                 await update.message.reply_text("📝 No log file found")
                 return
             
-            # Get last 20 lines
-            with open(log_file, 'r') as f:
-                lines = f.readlines()
-                last_lines = lines[-20:] if len(lines) >= 20 else lines
-            
-            log_text = ''.join(last_lines)
-            if len(log_text) > 4000:  # Telegram message limit
-                log_text = log_text[-4000:]
+            # Read backwards from the end of the file, off the event loop
+            lines = await asyncio.to_thread(tail_lines, str(log_file), count, level, pattern)
+            if not lines:
+                await update.message.reply_text("📝 No matching log lines")
+                return
             
-            await update.message.reply_text(f"```\n{log_text}\n```", parse_mode='Markdown')
+            # Keep each message under Telegram's 4096 character limit
+            for chunk in chunk_lines(lines, 4000):
+                await update.message.reply_text(f"```\n{chunk}\n```", parse_mode='Markdown')
             
         except Exception as e:
             await update.message.reply_text(f"❌ Error reading logs: {str(e)}")
     
     async def history_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """Handle /history command"""
-        if not self.download_history:
-            await update.message.reply_text("📚 No download history")
+        """Handle /history command: /history [page] [user=name] [from=date] [to=date] [hash=infohash]"""
+        page = 1
+        criteria = {}
+        info_hash = None
+        for arg in context.args or []:
+            key, _, value = arg.partition('=')
+            if arg.isdigit():
+                page = max(1, int(arg))
+            elif key == 'user' and value:
+                criteria['user'] = value.lstrip('@')
+            elif key in ('from', 'to') and value:
+                try:
+                    date = datetime.fromisoformat(value)
+                except ValueError:
+                    await update.message.reply_text(f"❌ Invalid date: {value} (use YYYY-MM-DD)")
+                    return
+                if key == 'to' and len(value) == 10:
+                    # until is exclusive: to=YYYY-MM-DD includes that whole day
+                    date += timedelta(days=1)
+                criteria['since' if key == 'from' else 'until'] = date.isoformat()
+            elif key == 'hash' and value:
+                info_hash = value.lower()
+            else:
+                await update.message.reply_text(
+                    "❌ Usage: /history [page] [user=name] [from=YYYY-MM-DD] [to=YYYY-MM-DD] [hash=infohash]"
+                )
+                return
+        
+        history = await self.get_history()
+        if history is None:
+            await update.message.reply_text("❌ History is unavailable, see /logs")
             return
         
-        history_msg = "📚 *Recent Downloads:*\n\n"
+        page_size = 10
+        try:
+            if info_hash:
+                downloads = await asyncio.to_thread(history.find_by_hash, info_hash)
+                total = len(downloads)
+                downloads = downloads[:page_size]
+            else:
+                total, downloads = await asyncio.gather(
+                    asyncio.to_thread(history.count, **criteria),
+                    asyncio.to_thread(
+                        history.query, limit=page_size, offset=(page - 1) * page_size, **criteria
+                    )
+                )
+        except Exception as e:
+            await update.message.reply_text(f"❌ Error reading history: {str(e)}")
+            return
         
-        # Show last 10 downloads
-        recent_downloads = self.download_history[-10:]
+        if not downloads:
+            await update.message.reply_text("📚 No download history")
+            return
+        
+        pages = (total + page_size - 1) // page_size
+        history_msg = f"📚 *Recent Downloads* (page {page}/{pages}, {total} total):\n\n"
         
-        for i, download in enumerate(reversed(recent_downloads), 1):
+        for i, download in enumerate(downloads, (page - 1) * page_size + 1):
             completed_date = datetime.fromisoformat(download['completed']).strftime("%m/%d %H:%M")
             history_msg += (
                 f"{i}. 🎬 {download['name']}\n"
@@ -251,120 +1708,669 @@ class TorrentBot:
         
         await update.message.reply_text(history_msg, parse_mode='Markdown')
     
-    async def send_startup_message(self):
+    def send_startup_message(self):
         """Send startup message to the group"""
         try:
             group_id = self.config['telegram']['group_id']
             startup_msg = (
                 "🚀 *Media Server is UP!*\n\n"
                 "Bot is ready to accept commands:\n"
-                "• `/download <link>` - Start download\n"
+                "• `/download <link>` - Start download (or send `.torrent` files)\n"
                 "• `/status` - Check downloads\n"
-                "• `/logs` - View logs\n"
-                "• `/history` - Download history"
+                "• `/queue` - Queued downloads\n"
+                "• `/seeding` - Finished torrents still seeding\n"
+                "• `/files [hash]` - Pick the files to download\n"
             )
-            
-            await self.app.bot.send_message(
-                chat_id=group_id,
-                text=startup_msg,
-                parse_mode='Markdown'
+            if self.stream_server:
+                startup_msg += "• `/stream <hash>` - Watch while it downloads\n"
+            startup_msg += (
+                "• `/history [user=name] [from=date] [to=date]` - Download history\n"
+                "• `/logs [n] [level] [text]` - View logs\n"
+                "• `/perf`, `/settings` - Diagnostics (admins)\n"
+                "• `/help` - All commands"
             )
-            self.logger.info("Startup message sent to group")
+            
+            self.dispatcher.send(group_id, startup_msg, parse_mode='Markdown')
+            self.logger.info("Startup message queued for group")
             
         except Exception as e:
             self.logger.error(f"Failed to send startup message: {e}")
     
-    def run_torrent_monitor(self):
-        """Background thread to monitor torrent progress"""
+    def on_torrent_finished(self, alert):
+        """Handle torrent_finished_alert: move the torrent to history and notify"""
+        return self.record_completion(str(alert.handle.info_hash()))
+    
+    async def record_completion(self, torrent_hash: str):
+        """Move a finished torrent to history exactly once, then notify the group"""
+        torrent = await self.torrents.complete(torrent_hash)
+        if torrent is None:
+            # Not one of ours, or already completed
+            return
+        self.metadata_pending.pop(torrent_hash, None)
+        self.disk_claims.pop(torrent_hash, None)
+        
+        seed = self.seeds[torrent_hash] = SeedingTorrent(
+            torrent.info_hash, torrent.handle, torrent.name, torrent.user, torrent.started, torrent.url, torrent.chat_id
+        )
+        self.request_resume_data(torrent.handle, seed.meta())
+        self.logger.info(f"Download completed: {torrent.name}")
+        
+        completed = seed.completed_at
+        self.dedup.set(torrent_hash, COMPLETED, torrent.name, torrent.user, completed)
+        await self.save_history({
+            'info_hash': torrent_hash,
+            'name': torrent.name,
+            'user': torrent.user,
+            'started': torrent.started,
+            'completed': completed,
+            'status': 'completed',
+            'url': torrent.url
+        })
+        await self.send_completion_message(torrent)
+        if self.post_processor:
+            task = asyncio.create_task(self.post_process(torrent))
+            self.post_tasks.add(task)
+            task.add_done_callback(self.post_tasks.discard)
+        await self.promote_queued()
+    
+    async def post_process(self, torrent: TrackedTorrent):
+        """Run a finished torrent through the post-completion pipeline and report each stage"""
+        source = Path(self.config['paths']['download_dir']) / torrent.name
+        try:
+            result = await self.post_processor.run(torrent.name, source)
+        except Exception as e:
+            self.logger.error(f"Post-processing error for {torrent.name}: {e}")
+            return
+        for stage in result.stages:
+            if stage.status != 'skipped':
+                self.post_stage_latency.observe(stage.seconds, stage=stage.stage, result=stage.status)
+        self.logger.info(
+            f"Post-processing {'finished' if result.ok else 'failed'} for {torrent.name} in {result.seconds:.1f}s: "
+            + ', '.join(f"{stage.stage} {stage.status} {stage.seconds:.1f}s" for stage in result.stages)
+        )
+        await self.send_message(torrent.chat_id, result.summary(torrent.user))
+    
+    def on_metadata_received(self, alert):
+        """Handle metadata_received_alert: record time-to-metadata and fill in the real torrent name"""
+        torrent_hash = str(alert.handle.info_hash())
+        pending = self.metadata_pending.pop(torrent_hash, None)
+        if pending is not None:
+            elapsed = time.monotonic() - pending['started']
+            self.metadata_latency.observe(elapsed, source=pending['source'])
+            self.logger.info(f"Metadata for {torrent_hash} resolved in {elapsed:.1f}s via {pending['source']}")
+        if torrent_hash in self.torrents:
+            self.filter_files(alert.handle)
+            return self.rename_torrent(torrent_hash, alert.handle.name())
+    
+    def watch_metadata(self, torrent_hash: str):
+        """Start timing a magnet link's metadata resolution"""
+        self.metadata_pending.setdefault(torrent_hash, {
+            'started': time.monotonic(),
+            'source': 'swarm',
+            'fallback': False,
+            'warned': False
+        })
+    
+    async def check_metadata_timeouts(self):
+        """Try a magnet's own trackers and exact sources once metadata is overdue, then warn once"""
+        now = time.monotonic()
+        for torrent_hash, pending in list(self.metadata_pending.items()):
+            torrent = self.torrents.get(torrent_hash)
+            if torrent is None:
+                del self.metadata_pending[torrent_hash]
+                continue
+            
+            waited = now - pending['started']
+            if not pending['fallback'] and waited >= self.metadata_timeout:
+                pending['fallback'] = True
+                self.metadata_timeouts.inc()
+                self.logger.warning(f"No metadata for {torrent.name} after {waited:.0f}s, trying the magnet's own sources")
+                await self.metadata_fallback(torrent, pending)
+            elif pending['fallback'] and not pending['warned'] and waited >= 3 * self.metadata_timeout:
+                pending['warned'] = True
+                await self.send_message(
+                    torrent.chat_id,
+                    f"⚠️ Still waiting for metadata after {waited / 60:.0f} min\n"
+                    f"🎬 Torrent: {torrent.name}\n"
+                    f"👤 Requested by: {torrent.user}"
+                )
+    
+    async def metadata_fallback(self, torrent: TrackedTorrent, pending: Dict):
+        """Re-announce to the magnet's trackers (tr) and fetch the .torrent from its exact sources (xs)"""
+        trackers, sources = magnet_sources(torrent.url)
+        handle = torrent.handle
+        try:
+            for url in trackers:
+                handle.add_tracker({'url': url})
+            handle.force_reannounce()
+            handle.force_dht_announce()
+        except Exception as e:
+            self.logger.error(f"Error re-announcing {torrent.name}: {e}")
+        
+        for url in sources:
+            try:
+                info = await self.fetcher.fetch(url)
+            except FetchError as e:
+                self.logger.warning(f"Exact source {url} failed: {e}")
+                continue
+            if str(info.info_hash()) != torrent.info_hash:
+                self.logger.warning(f"Exact source {url} is a different torrent ({info.info_hash()})")
+                continue
+            if torrent.info_hash not in self.metadata_pending:
+                # Resolved from the swarm in the meantime
+                return
+            try:
+                metadata = info.info_section() if hasattr(info, 'info_section') else info.metadata()
+                pending['source'] = 'exact_source'
+                handle.set_metadata(bytes(metadata))
+            except Exception as e:
+                pending['source'] = 'swarm'
+                self.logger.error(f"Could not apply metadata from {url}: {e}")
+                continue
+            self.logger.info(f"Metadata for {torrent.name} taken from exact source {url}")
+            return
+    
+    async def rename_torrent(self, torrent_hash: str, name: str):
+        """Replace the placeholder name of a magnet download"""
+        torrent = await self.torrents.update(torrent_hash, name=name)
+        if torrent is not None:
+            self.dedup.set(torrent_hash, ACTIVE, name, torrent.user)
+            self.logger.info(f"Metadata received: {name}")
+    
+    def on_torrent_error(self, alert):
+        """Handle torrent_error_alert: log and notify the group"""
+        torrent_hash = str(alert.handle.info_hash())
+        torrent = self.torrents.get(torrent_hash)
+        name = torrent.name if torrent else torrent_hash
+        error = alert.error.message()
+        self.logger.error(f"Torrent error for {name}: {error}")
+        if torrent is not None:
+            return self.send_error_message(torrent, error)
+    
+    def on_state_update(self, alert):
+        """Handle state_update_alert: merge changed torrents into the status cache"""
+        unsized = []
+        for status in self.status_cache.update(alert.status):
+            if status.has_metadata and status.info_hash in self.disk_claims and self.disk_claims[status.info_hash] is None:
+                self.disk_claims[status.info_hash] = status.total_wanted
+                unsized.append(status.info_hash)
+        if unsized:
+            return self.check_magnet_space(unsized)
+    
+    async def check_magnet_space(self, torrent_hashes: List[str]):
+        """Once magnets know their size, move the ones that do not fit back to the queue (or drop them)"""
+        removed = False
+        for torrent_hash in torrent_hashes:
+            size = self.disk_claims.get(torrent_hash)
+            torrent = self.torrents.get(torrent_hash)
+            if size is None or torrent is None:
+                continue
+            space = await self.check_space(size, exclude=torrent_hash)
+            if space.fits:
+                continue
+            
+            removed = True
+            await self.torrents.remove(torrent_hash)
+            self.disk_claims.pop(torrent_hash, None)
+            self.session.remove_torrent(torrent.handle, lt.options_t.delete_files)
+            if self.disk_full_action == 'reject' or space.too_large:
+                self.dedup.discard(torrent_hash, ACTIVE)
+                self.logger.warning(f"Removed {torrent.name}, not enough disk space: {space.describe()}")
+                await self.send_message(
+                    torrent.chat_id,
+                    f"❌ Download removed, not enough disk space\n"
+                    f"🎬 Torrent: {torrent.name}\n"
+                    f"💾 {space.describe()}\n"
+                    f"👤 Requested by: {torrent.user}"
+                )
+                continue
+            
+            item = QueuedDownload(
+                url=torrent.url,
+                user=torrent.user,
+                priority=self.user_priority(torrent.user),
+                chat_id=torrent.chat_id,
+                name=torrent.name,
+                info_hash=torrent_hash,
+                size=size
+            )
+            position = self.scheduler.push(item)
+            self.dedup.set(torrent_hash, QUEUED, torrent.name, torrent.user)
+            self.logger.warning(f"Re-queued {torrent.name} until there is disk space: {space.describe()}")
+            await self.save_queue()
+            await self.send_message(
+                torrent.chat_id,
+                f"⏳ Download queued until there is disk space\n"
+                f"🎬 Torrent: {torrent.name}\n"
+                f"💾 {space.describe()}\n"
+                f"📋 Position: {position}\n"
+                f"👤 Requested by: {torrent.user}"
+            )
+        if removed:
+            await self.promote_queued()
+    
+    def on_torrent_removed(self, alert):
+        """Handle torrent_removed_alert: drop the torrent from the status cache and resume store"""
+        torrent_hash = str(alert.info_hash)
+        self.status_cache.remove(torrent_hash)
+        self.disk_claims.pop(torrent_hash, None)
+        self.seeds.pop(torrent_hash, None)
+        self.dedup.discard(torrent_hash, ACTIVE)
+        return asyncio.to_thread(self.resume_store.remove, torrent_hash)
+    
+    def request_resume_data(self, handle, meta: Optional[Dict] = None):
+        """Ask libtorrent to save resume data for a torrent, optionally storing new metadata"""
+        torrent_hash = str(handle.info_hash())
+        if meta is None:
+            torrent = self.torrents.get(torrent_hash) or self.seeds.get(torrent_hash)
+            if torrent is not None:
+                meta = torrent.meta()
+        if meta is not None:
+            self.pending_meta[torrent_hash] = meta
+        
+        handle.save_resume_data(lt.save_resume_flags_t.save_info_dict)
+        self.pending_resume.add(torrent_hash)
+    
+    def on_save_resume_data(self, alert):
+        """Handle save_resume_data_alert: write the resume data to disk off the loop"""
+        torrent_hash = str(alert.handle.info_hash())
+        # Session shards send the resume data already serialised
+        resume_data = getattr(alert, 'resume_data', None)
+        if resume_data is None:
+            resume_data = lt.write_resume_data_buf(alert.params)
+        meta = self.pending_meta.pop(torrent_hash, None)
+        return self.finish_resume_save(torrent_hash, resume_data, meta)
+    
+    def on_save_resume_data_failed(self, alert):
+        """Handle save_resume_data_failed_alert (also sent when nothing changed)"""
+        torrent_hash = str(alert.handle.info_hash())
+        meta = self.pending_meta.pop(torrent_hash, None)
+        return self.finish_resume_save(torrent_hash, None, meta)
+    
+    async def finish_resume_save(self, torrent_hash: str, resume_data: Optional[bytes], meta: Optional[Dict]):
+        """Write resume data and/or metadata and mark the save as done"""
+        try:
+            if resume_data is not None:
+                await asyncio.to_thread(self.resume_store.save, torrent_hash, resume_data, meta)
+            elif meta is not None:
+                await asyncio.to_thread(self.resume_store.save_meta, torrent_hash, meta)
+        except Exception as e:
+            self.logger.error(f"Error saving resume data for {torrent_hash}: {e}")
+        finally:
+            self.pending_resume.discard(torrent_hash)
+            if not self.pending_resume:
+                self.resume_saved.set()
+    
+    def restore_torrents(self, entries: List):
+        """Re-add every torrent read from the resume directory without rechecking"""
+        restored = 0
+        for entry in entries:
+            try:
+                params = lt.read_resume_data(entry.resume_data)
+            except Exception as e:
+                self.logger.error(f"Invalid resume data for {entry.info_hash}: {e}")
+                continue
+            if not params.save_path:
+                params.save_path = self.config['paths']['download_dir']
+            
+            # Added asynchronously; libtorrent checks the resume data in parallel
+            self.restoring[entry.info_hash] = entry.meta
+            if not entry.meta.get('completed'):
+                self.dedup.set(
+                    entry.info_hash, ACTIVE, entry.meta.get('name') or 'Unknown', entry.meta.get('user') or 'Unknown'
+                )
+            self.session.async_add_torrent(params)
+            restored += 1
+        
+        if restored:
+            self.logger.info(f"Restoring {restored} torrents from resume data")
+    
+    def on_add_torrent(self, alert):
+        """Handle add_torrent_alert for torrents re-added by restore_torrents"""
+        if alert.error.value():
+            # Shard alerts carry the info-hash, libtorrent's the add params
+            self.restoring.pop(getattr(alert, 'info_hash', None) or params_info_hash(alert.params), None)
+            self.logger.error(f"Failed to restore torrent: {alert.error.message()}")
+            return
+        
+        handle = alert.handle
+        torrent_hash = str(handle.info_hash())
+        meta = self.restoring.get(torrent_hash)
+        if meta is None:
+            # Not a restore
+            return
+        if meta.get('completed'):
+            # Finished in an earlier run: back to seeding
+            self.restoring.pop(torrent_hash, None)
+            self.seeds[torrent_hash] = SeedingTorrent.from_meta(handle, torrent_hash, meta)
+            return
+        
+        return self.track_restored(TrackedTorrent(
+            info_hash=torrent_hash,
+            handle=handle,
+            name=meta.get('name') or (handle.name() if handle.has_metadata() else 'Unknown'),
+            user=meta.get('user') or 'Unknown',
+            started=meta.get('started') or datetime.now().isoformat(),
+            url=meta.get('url') or '',
+            chat_id=meta.get('chat_id')
+        ))
+    
+    async def wait_restored(self, timeout: float = 10.0):
+        """Wait until every restored torrent is tracked, so commands see them from the start"""
+        deadline = time.monotonic() + timeout
+        while self.restoring and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.restoring:
+            self.logger.warning(f"{len(self.restoring)} torrents still restoring after {timeout:.0f}s")
+    
+    async def track_restored(self, torrent: TrackedTorrent):
+        """Track a restored torrent; it keeps counting as restoring until it is tracked"""
+        await self.torrents.add(torrent)
+        self.restoring.pop(torrent.info_hash, None)
+        # Already admitted in an earlier run: counted towards the reservation, never re-checked
+        self.disk_claims.setdefault(torrent.info_hash, 0)
+        if not torrent.handle.has_metadata():
+            self.watch_metadata(torrent.info_hash)
+    
+    async def save_all_resume_data(self, only_if_modified: bool = False, timeout: float = 10.0):
+        """Request resume data for every torrent in the session and wait for it to be written"""
+        self.resume_saved.clear()
+        for handle in self.session.get_torrents():
+            if only_if_modified and not handle.need_save_resume_data():
+                continue
+            try:
+                self.request_resume_data(handle)
+            except Exception as e:
+                self.logger.error(f"Error requesting resume data: {e}")
+        
+        if not self.pending_resume:
+            return
+        self.alerts.wakeup()
+        try:
+            await asyncio.wait_for(self.resume_saved.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.logger.warning(f"Timed out saving resume data for {len(self.pending_resume)} torrents")
+    
+    async def run_resume_saver(self):
+        """Periodically save resume data for torrents that changed"""
         while True:
+            await asyncio.sleep(self.resume_interval)
+            await self.save_all_resume_data(only_if_modified=True)
+    
+    async def run_session_maintenance(self):
+        """Check metadata timeouts and the seeding policy, keep the DHT bootstrapped and save the session state"""
+        last_dht = last_state = last_seed = time.monotonic()
+        while True:
+            await asyncio.sleep(5)
             try:
-                # Check for completed torrents
-                for torrent_hash, torrent_info in list(self.active_torrents.items()):
-                    handle = torrent_info['handle']
-                    status = handle.status()
-                    
-                    if status.is_seeding or status.is_finished:
-                        # Torrent completed
-                        self.download_history.append({
-                            'name': torrent_info['name'],
-                            'user': torrent_info['user'],
-                            'completed': datetime.now().isoformat(),
-                            'status': 'completed'
-                        })
-                        
-                        # Send completion message
-                        asyncio.create_task(self.send_completion_message(torrent_info))
-                        
-                        # Remove from active torrents
-                        del self.active_torrents[torrent_hash]
-                        self.save_history()
-                        
-                        self.logger.info(f"Download completed: {torrent_info['name']}")
-                
-                # Sleep for 30 seconds before next check
-                threading.Event().wait(30)
-                
+                await self.check_metadata_timeouts()
+                if self.space_blocked:
+                    await self.promote_queued()
+                now = time.monotonic()
+                if now - last_seed >= self.seed_check_interval:
+                    last_seed = now
+                    await self.enforce_seed_policy()
+                if now - last_dht >= self.dht_refresh_interval:
+                    last_dht = now
+                    self.refresh_dht()
+                if now - last_state >= self.session_state_interval:
+                    last_state = now
+                    await self.save_session_state()
+            except Exception as e:
+                self.logger.error(f"Error in session maintenance: {e}")
+    
+    async def enforce_seed_policy(self):
+        """Account seeding time and upload activity, and retire seeds that reached a limit"""
+        now = time.monotonic()
+        for seed in list(self.seeds.values()):
+            status = self.status_cache.get(seed.info_hash)
+            if seed.retired or status is None:
+                continue
+            seed.observe(status, now)
+            reason = self.seed_policy.check(seed, status, now)
+            if reason:
+                await self.retire_seed(seed, reason)
+    
+    async def retire_seed(self, seed: SeedingTorrent, reason: str):
+        """Stop seeding a torrent: pause it for good, or remove it from the session (its files stay)"""
+        try:
+            if self.seed_policy.action == 'remove':
+                self.session.remove_torrent(seed.handle)
+            else:
+                # Auto-managed torrents would be resumed by libtorrent's queue
+                seed.handle.unset_flags(lt.torrent_flags.auto_managed)
+                seed.handle.pause()
+        except Exception as e:
+            self.logger.error(f"Error retiring {seed.name}: {e}")
+            return
+        seed.retired = reason
+        if self.seed_policy.action == 'pause':
+            self.request_resume_data(seed.handle)
+        
+        action = 'removed' if self.seed_policy.action == 'remove' else 'paused'
+        self.logger.info(f"Stopped seeding {seed.name} ({action}): {reason}")
+        try:
+            self.dispatcher.send_digest(
+                self.config['telegram']['group_id'],
+                f"🌱 Stopped seeding ({action})\n🎬 {seed.name}\n📈 {reason}",
+                f"🎬 {seed.name}: {reason}",
+                f"🌱 {{count}} torrents stopped seeding ({action})"
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to send seeding message: {e}")
+    
+    def refresh_dht(self):
+        """Re-bootstrap the DHT from the bootstrap nodes when the routing table has run low"""
+        nodes = self.session_stats.get('dht.dht_nodes')
+        per_session = nodes / max(1, self.session_shards) if nodes is not None else 0
+        if per_session >= self.dht_min_nodes:
+            return
+        self.logger.info(f"DHT routing table has {nodes or 0} nodes, re-bootstrapping")
+        for node in self.dht_bootstrap_nodes:
+            host, _, port = node.rpartition(':')
+            try:
+                self.session.add_dht_node((host, int(port)))
+            except Exception as e:
+                self.logger.error(f"Invalid DHT bootstrap node {node}: {e}")
+    
+    async def run_status_updates(self):
+        """Periodically ask libtorrent for changed torrents and session counters"""
+        last_stats = 0.0
+        while True:
+            try:
+                self.session.post_torrent_updates()
+                if time.monotonic() - last_stats >= self.stats_interval:
+                    self.session.post_session_stats()
+                    last_stats = time.monotonic()
             except Exception as e:
-                self.logger.error(f"Error in torrent monitor: {e}")
-                threading.Event().wait(60)
+                self.logger.error(f"Error requesting torrent updates: {e}")
+            await asyncio.sleep(self.status_interval)
     
-    async def send_completion_message(self, torrent_info):
+    async def send_message(self, chat_id: Optional[int], text: str, parse_mode: Optional[str] = None):
+        """Queue a message to a chat, defaulting to the group"""
+        try:
+            self.dispatcher.send(chat_id or self.config['telegram']['group_id'], text, parse_mode=parse_mode)
+        except Exception as e:
+            self.logger.error(f"Failed to send message: {e}")
+    
+    async def send_completion_message(self, torrent: TrackedTorrent):
         """Send completion message to group"""
         try:
             group_id = self.config['telegram']['group_id']
             completion_msg = (
                 f"✅ *Download Completed!*\n\n"
-                f"🎬 {torrent_info['name']}\n"
-                f"👤 Requested by: {torrent_info['user']}\n"
+                f"🎬 {torrent.name}\n"
+                f"👤 Requested by: {torrent.user}\n"
                 f"📁 Saved to: {self.config['paths']['download_dir']}"
             )
             
-            await self.app.bot.send_message(
-                chat_id=group_id,
-                text=completion_msg,
+            # Completions arriving together are merged into one digest
+            self.dispatcher.send_digest(
+                group_id,
+                completion_msg,
+                f"🎬 {torrent.name} (👤 {torrent.user})",
+                "✅ *{count} Downloads Completed!*",
                 parse_mode='Markdown'
             )
             
         except Exception as e:
             self.logger.error(f"Failed to send completion message: {e}")
     
+    async def send_error_message(self, torrent: TrackedTorrent, error: str):
+        """Send torrent error message to group"""
+        try:
+            group_id = self.config['telegram']['group_id']
+            error_msg = (
+                f"❌ *Download Failed!*\n\n"
+                f"🎬 {torrent.name}\n"
+                f"👤 Requested by: {torrent.user}\n"
+                f"⚠️ Error: {error}"
+            )
+            
+            self.dispatcher.send_digest(
+                group_id,
+                error_msg,
+                f"🎬 {torrent.name} (👤 {torrent.user}): {error}",
+                "❌ *{count} Downloads Failed!*",
+                parse_mode='Markdown'
+            )
+            
+        except Exception as e:
+            self.logger.error(f"Failed to send error message: {e}")
+    
+    async def start_telegram(self):
+        """Connect the Telegram application (getMe) and start its update processing"""
+        await self.app.initialize()
+        await self.app.start()
+    
+    async def start_torrents(self):
+        """Open the libtorrent session and re-add the previous run's torrents and queue"""
+        # Binding the listen ports, reading the DHT state or spawning the shards, and reading
+        # the resume files are all blocking, and independent of each other
+        self.session, entries = await asyncio.gather(
+            self.startup.run('libtorrent session', asyncio.to_thread(self.create_session, self.session_settings)),
+            self.startup.run('resume data', asyncio.to_thread(self.resume_store.load_all))
+        )
+        self.alerts.session = self.session
+        
+        # Added asynchronously; their add_torrent_alerts wait until the alert engine starts
+        self.restore_torrents(entries)
+        await self.startup.run('download queue', self.load_queue())
+    
+    async def finish_startup(self):
+        """Start-up work that commands do not need, done once the bot is accepting them"""
+        self.send_startup_message()
+        await self.startup.run('metrics endpoint', self.start_metrics_server())
+        await self.startup.run('stream server', self.start_stream_server())
+        await self.startup.run('history', self.get_history())
+        self.live_task = asyncio.create_task(self.run_live_boards())
+        if self.watch_folder:
+            self.watch_task = asyncio.create_task(self.watch_folder.run())
+        self.startup.milestone("start-up complete")
+    
     async def run(self):
         """Run the bot"""
+        self.stop_event = asyncio.Event()
+        self.resume_saved = asyncio.Event()
+        self.queue_lock = asyncio.Lock()
+        self.torrents.start()
+        self.lag_task = asyncio.create_task(self.loop_lag.run())
+        
         try:
             # Create application
             self.app = Application.builder().token(self.config['telegram']['bot_token']).build()
             
+            # Outbound messages go through the flood-controlled dispatcher
+            telegram_config = self.config['telegram']
+            self.dispatcher = MessageDispatcher(
+                self.app.bot,
+                self.logger,
+                chat_rate=float(telegram_config.get('messages_per_minute', 20)) / 60,
+                digest_window=float(telegram_config.get('digest_window', 3))
+            )
+            
             # Add command handlers
-            self.app.add_handler(CommandHandler("start", self.start_command))
-            self.app.add_handler(CommandHandler("help", self.help_command))
-            self.app.add_handler(CommandHandler("download", self.download_command))
-            self.app.add_handler(CommandHandler("status", self.status_command))
-            self.app.add_handler(CommandHandler("logs", self.logs_command))
-            self.app.add_handler(CommandHandler("history", self.history_command))
+            self.add_command("start", self.start_command)
+            self.add_command("help", self.help_command)
+            self.add_command("download", self.download_command)
+            self.add_command("status", self.status_command)
+            self.add_command("queue", self.queue_command)
+            self.add_command("seeding", self.seeding_command)
+            self.add_command("files", self.files_command)
+            self.add_command("stream", self.stream_command)
+            self.add_command("live", self.live_command)
+            self.add_command("logs", self.logs_command)
+            self.add_command("history", self.history_command)
+            self.add_command("perf", self.perf_command)
+            self.add_command("settings", self.settings_command)
+            self.add_upload_handler(self.document_command)
+            
+            # Telegram and the torrent session come up concurrently
+            await asyncio.gather(
+                self.startup.run('telegram', self.start_telegram()),
+                self.startup.run('torrents', self.start_torrents())
+            )
             
-            # Start torrent monitoring thread
-            monitor_thread = threading.Thread(target=self.run_torrent_monitor, daemon=True)
-            monitor_thread.start()
+            # Start alert-driven torrent monitoring
+            self.alert_task = asyncio.create_task(self.alerts.run())
+            self.status_task = asyncio.create_task(self.run_status_updates())
+            self.resume_task = asyncio.create_task(self.run_resume_saver())
+            self.maintenance_task = asyncio.create_task(self.run_session_maintenance())
+            await self.startup.run('restore torrents', self.wait_restored())
             
-            # Initialize and start bot
-            await self.app.initialize()
-            await self.app.start()
+            # Fill any free download slots from the queue
+            await self.promote_queued()
             
-            # Send startup message
-            await self.send_startup_message()
+            # Receive updates: Telegram posts them to the webhook listener, or the bot polls for them
+            if self.webhook:
+                await self.startup.run('updates', self.app.updater.start_webhook(**self.webhook.start_kwargs()))
+                self.logger.info(f"Receiving updates by webhook for {self.webhook.url} on {self.webhook.local_url}")
+            else:
+                await self.startup.run('updates', self.app.updater.start_polling())
+            self.startup.milestone("accepting commands")
             
+            # History, metrics, the startup message, live boards and the watch folder follow in the background
+            self.startup_task = asyncio.create_task(self.finish_startup())
             self.logger.info("Torrent bot started successfully")
             
-            # Start polling
-            await self.app.updater.start_polling()
-            
-            # Keep the bot running
-            await asyncio.Event().wait()
+            # Keep the bot running until SIGTERM/SIGINT
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, self.stop_event.set)
+            await self.stop_event.wait()
+            self.logger.info("Shutting down, saving resume data")
             
         except Exception as e:
             self.logger.error(f"Error running bot: {e}")
             raise
         finally:
+            # Stop taking commands first (this also closes the webhook listener)
+            if self.app and self.app.updater and self.app.updater.running:
+                await self.app.updater.stop()
+            for task in (self.startup_task, self.history_task, self.status_task, self.resume_task, self.live_task,
+                         self.lag_task, self.maintenance_task, self.watch_task, *self.post_tasks):
+                if task:
+                    task.cancel()
+            if self.stream_server:
+                await self.stream_server.stop()
+            if self.post_processor:
+                self.post_processor.close()
+            if self.alert_task:
+                await self.save_all_resume_data()
+                await self.save_session_state()
+            if self.session is not None:
+                self.alerts.stop()
+                if self.session_shards > 1:
+                    await asyncio.to_thread(self.session.close)
+            await self.torrents.stop()
+            if self.dispatcher:
+                await self.dispatcher.flush()
+                await self.dispatcher.close()
+            await self.fetcher.close()
+            if self.metrics_server:
+                await self.metrics_server.stop()
+            if self.history:
+                self.history.close()
             if self.app:
                 await self.app.stop()
 
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Torrent Fetcher
+Non-blocking, pooled .torrent downloads with a parsed metainfo cache
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+
+class FetchError(Exception):
+    """Raised when a .torrent file cannot be downloaded or parsed"""
+
+def magnet_sources(uri: str) -> Tuple[List[str], List[str]]:
+    """Trackers (tr) and HTTP exact sources (xs, a .torrent URL) of a magnet link"""
+    if not uri.startswith('magnet:'):
+        return [], []
+    trackers, sources = [], []
+    for key, value in parse_qsl(urlsplit(uri).query):
+        if key == 'tr' or key.startswith('tr.'):
+            trackers.append(value)
+        elif (key == 'xs' or key.startswith('xs.')) and value.startswith(('http://', 'https://')):
+            sources.append(value)
+    return trackers, sources
+
+class TorrentFetcher:
+    """Downloads .torrent files over a shared connection pool
+    
+    Every request goes through one httpx.AsyncClient, so keep-alive
+    connections are reused across /download commands. Each host gets its own
+    concurrency limit, so a slow tracker site cannot take all the pool
+    slots. Bodies are streamed and aborted once they exceed max_size.
+    
+    Parsed torrents are cached by URL and by info-hash, and concurrent
+    fetches of the same URL share one request.
+    """
+    
+    def __init__(
+        self,
+        parse: Callable[[bytes], Any],
+        info_hash: Callable[[Any], str],
+        timeout: float = 30.0,
+        max_size: int = 10 * 1024 * 1024,
+        max_connections: int = 20,
+        per_host_limit: int = 4,
+        cache_size: int = 256,
+        client: Optional[httpx.AsyncClient] = None,
+        logger: Optional[logging.Logger] = None
+    ):
+        self.parse = parse
+        self.info_hash = info_hash
+        self.max_size = max_size
+        self.per_host_limit = per_host_limit
+        self.cache_size = cache_size
+        self.logger = logger or logging.getLogger(__name__)
+        
+        self.client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ),
+            follow_redirects=True,
+            headers={'User-Agent': 'TeleTorrent/1.0'}
+        )
+        
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.url_cache: 'OrderedDict[str, str]' = OrderedDict()
+        self.metainfo_cache: 'OrderedDict[str, Any]' = OrderedDict()
+    
+    def get_cached(self, info_hash: str) -> Optional[Any]:
+        """Return a cached torrent_info by info-hash"""
+        info = self.metainfo_cache.get(info_hash)
+        if info is not None:
+            self.metainfo_cache.move_to_end(info_hash)
+        return info
+    
+    def remember(self, info, url: Optional[str] = None) -> str:
+        """Cache a parsed torrent_info, returning its info-hash"""
+        torrent_hash = self.info_hash(info)
+        self.metainfo_cache[torrent_hash] = info
+        self.metainfo_cache.move_to_end(torrent_hash)
+        if url:
+            self.url_cache[url] = torrent_hash
+            self.url_cache.move_to_end(url)
+        
+        while len(self.metainfo_cache) > self.cache_size:
+            self.metainfo_cache.popitem(last=False)
+        while len(self.url_cache) > self.cache_size:
+            self.url_cache.popitem(last=False)
+        return torrent_hash
+    
+    async def fetch(self, url: str):
+        """Download and parse a .torrent file, returning a torrent_info"""
+        torrent_hash = self.url_cache.get(url)
+        if torrent_hash is not None:
+            info = self.get_cached(torrent_hash)
+            if info is not None:
+                return info
+        
+        # Share one request between concurrent fetches of the same URL
+        pending = self.in_flight.get(url)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[url] = future
+        try:
+            info = await self._fetch(url)
+            self.remember(info, url)
+            future.set_result(info)
+            return info
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a fetch nobody else waited on does not warn
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[url]
+    
+    async def _fetch(self, url: str):
+        """Download a URL under its host limit and parse it off the event loop"""
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise FetchError(f"Unsupported URL scheme: {parts.scheme or 'none'}")
+        
+        host = parts.netloc.lower()
+        limit = self.host_limits.get(host)
+        if limit is None:
+            limit = self.host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        
+        async with limit:
+            data = await self._download(url)
+        
+        try:
+            return await asyncio.to_thread(self.parse, data)
+        except Exception as e:
+            raise FetchError(f"Invalid torrent file: {e}") from e
+    
+    async def _download(self, url: str) -> bytes:
+        """Stream a response body, enforcing the size cap"""
+        try:
+            async with self.client.stream('GET', url) as response:
+                if response.status_code != 200:
+                    raise FetchError(f"HTTP {response.status_code} from {urlsplit(url).netloc}")
+                
+                length = response.headers.get('Content-Length')
+                if length and length.isdigit() and int(length) > self.max_size:
+                    raise FetchError(f"Torrent file too large ({int(length)} bytes)")
+                
+                chunks = []
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > self.max_size:
+                        raise FetchError(f"Torrent file larger than {self.max_size} bytes")
+                    chunks.append(chunk)
+                return b''.join(chunks)
+        
+        except httpx.TimeoutException as e:
+            raise FetchError(f"Timed out fetching {url}") from e
+        except httpx.HTTPError as e:
+            raise FetchError(f"Error fetching {url}: {e}") from e
+    
+    async def close(self):
+        """Close pooled connections"""
+        await self.client.aclose()
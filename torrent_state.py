@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Torrent State
+Single-owner actor for the bot's tracked torrents
+"""
+
+import asyncio
+import logging
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+class TrackedTorrent(NamedTuple):
+    """Immutable record of a download the bot is tracking"""
+    info_hash: str
+    handle: Any
+    name: str
+    user: str
+    started: str
+    url: str = ''
+    chat_id: Optional[int] = None
+    
+    def meta(self) -> Dict:
+        """Return the persistable fields (everything except the handle)"""
+        meta = self._asdict()
+        del meta['handle']
+        return meta
+
+class TorrentState:
+    """Owns the tracked torrents; every change goes through one command queue
+    
+    Alert handlers and Telegram commands submit commands (add, update,
+    complete, remove) and await their result. A single task applies them in
+    arrival order, draining everything that is queued in one batch, so
+    hundreds of concurrent updates cost one wakeup rather than hundreds.
+    
+    Readers use snapshot: a read-only mapping that is never modified after it
+    is handed out. It is rebuilt lazily on the first read after a change, so
+    a burst of writes costs one copy, and no reader needs a lock.
+    
+    complete() hands a torrent out exactly once, so duplicate
+    torrent_finished_alerts (or a restore racing a completion) cannot record
+    the same download twice.
+    """
+    
+    def __init__(self, logger: Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger(__name__)
+        self._torrents: Dict[str, TrackedTorrent] = {}
+        self._snapshot: Mapping[str, TrackedTorrent] = MappingProxyType({})
+        self._dirty = False
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.commands = 0
+    
+    @property
+    def snapshot(self) -> Mapping[str, TrackedTorrent]:
+        """Immutable view of all tracked torrents, consistent as of the last applied batch"""
+        if self._dirty:
+            self._snapshot = MappingProxyType(dict(self._torrents))
+            self._dirty = False
+        return self._snapshot
+    
+    def get(self, info_hash: str) -> Optional[TrackedTorrent]:
+        """Return one tracked torrent"""
+        return self._torrents.get(info_hash)
+    
+    def __len__(self) -> int:
+        """Number of tracked torrents"""
+        return len(self._torrents)
+    
+    def __contains__(self, info_hash: str) -> bool:
+        """Return True if a torrent is tracked"""
+        return info_hash in self._torrents
+    
+    def start(self):
+        """Start applying commands (must be called from the event loop)"""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Apply whatever is still queued, then stop"""
+        if self._task is None:
+            return
+        self._apply(self._drain())
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+    
+    def _drain(self) -> List[Tuple[Callable, tuple, asyncio.Future]]:
+        """Take every queued command without waiting"""
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+    
+    async def _run(self):
+        """Apply queued commands in batches until cancelled"""
+        while True:
+            batch = [await self._queue.get()]
+            batch.extend(self._drain())
+            self._apply(batch)
+    
+    def _apply(self, batch: List[Tuple[Callable, tuple, asyncio.Future]]):
+        """Run a batch of commands in order and resolve their futures"""
+        if not batch:
+            return
+        self.batches += 1
+        self.commands += len(batch)
+        for operation, args, future in batch:
+            try:
+                result = operation(*args)
+            except Exception as e:
+                self.logger.error(f"Torrent state command {operation.__name__} failed: {e}")
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(result)
+    
+    def _submit(self, operation: Callable, *args) -> 'asyncio.Future':
+        """Queue a command; the future resolves once it has been applied"""
+        if self._queue is None:
+            raise RuntimeError("TorrentState.start() has not been called")
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((operation, args, future))
+        return future
+    
+    def _add(self, torrent: TrackedTorrent) -> TrackedTorrent:
+        """Apply add"""
+        existing = self._torrents.get(torrent.info_hash)
+        if existing is not None:
+            # Adding a torrent twice keeps the original requester
+            return existing
+        self._torrents[torrent.info_hash] = torrent
+        self._dirty = True
+        return torrent
+    
+    def _update(self, info_hash: str, fields: Dict) -> Optional[TrackedTorrent]:
+        """Apply update"""
+        torrent = self._torrents.get(info_hash)
+        if torrent is None:
+            return None
+        torrent = self._torrents[info_hash] = torrent._replace(**fields)
+        self._dirty = True
+        return torrent
+    
+    def _remove(self, info_hash: str) -> Optional[TrackedTorrent]:
+        """Apply complete/remove"""
+        torrent = self._torrents.pop(info_hash, None)
+        if torrent is not None:
+            self._dirty = True
+        return torrent
+    
+    async def add(self, torrent: TrackedTorrent) -> TrackedTorrent:
+        """Start tracking a torrent; returns the tracked record (the existing one for duplicates)"""
+        return await self._submit(self._add, torrent)
+    
+    async def update(self, info_hash: str, **fields) -> Optional[TrackedTorrent]:
+        """Replace fields of a tracked torrent; None if it is not tracked"""
+        return await self._submit(self._update, info_hash, fields)
+    
+    async def complete(self, info_hash: str) -> Optional[TrackedTorrent]:
+        """Stop tracking a finished torrent; only the first call for a torrent gets the record"""
+        return await self._submit(self._remove, info_hash)
+    
+    async def remove(self, info_hash: str) -> Optional[TrackedTorrent]:
+        """Stop tracking a torrent that was removed or failed"""
+        return await self._submit(self._remove, info_hash)
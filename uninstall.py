@@ -7,6 +7,7 @@ Removes the bot installation and cleans up system files
 import os
 import sys
 import shutil
+import sqlite3
 import subprocess
 from pathlib import Path
 
@@ -49,7 +50,9 @@ def confirm_uninstall():
 
 def backup_history():
     """Ask if user wants to backup download history"""
-    history_file = Path("download_history.json")
+    history_file = Path("history.db")
+    if not history_file.exists():
+        history_file = Path("download_history.json")
     
     if not history_file.exists():
         return
@@ -58,8 +61,18 @@ def backup_history():
         response = input("💾 Do you want to backup download history? (Y/n): ").strip().lower()
         if response in ['y', 'yes', '']:
             try:
-                backup_name = f"download_history_backup_{int(os.path.getmtime(history_file))}.json"
-                shutil.copy2(history_file, backup_name)
+                backup_name = f"download_history_backup_{int(os.path.getmtime(history_file))}{history_file.suffix}"
+                if history_file.suffix == '.db':
+                    # The newest rows may only be in history.db-wal, which is removed with the database
+                    source = sqlite3.connect(history_file)
+                    target = sqlite3.connect(backup_name)
+                    try:
+                        source.backup(target)
+                    finally:
+                        target.close()
+                        source.close()
+                else:
+                    shutil.copy2(history_file, backup_name)
                 print(f"✅ History backed up as: {backup_name}")
                 break
             except Exception as e:
@@ -119,6 +132,28 @@ def remove_files():
     
     files_to_remove = [
         "torrent_bot.py",
+        "alert_engine.py",
+        "status_cache.py",
+        "torrent_state.py",
+        "webhook.py",
+        "torrent_fetch.py",
+        "bulk_ingest.py",
+        "watch_folder.py",
+        "dedup_index.py",
+        "disk_space.py",
+        "post_process.py",
+        "seed_policy.py",
+        "file_selection.py",
+        "stream_server.py",
+        "resume_store.py",
+        "history_store.py",
+        "log_tail.py",
+        "download_queue.py",
+        "message_dispatcher.py",
+        "metrics.py",
+        "perf.py",
+        "session_profiles.py",
+        "session_shards.py",
         "install.py",
         "uninstall.py",
         "config.ini",
@@ -127,12 +162,23 @@ def remove_files():
         "torrent-bot.service",
         "requirements.txt",
         "download_history.json",
+        "download_history.json.migrated",
+        "history.db",
+        "history.db-wal",
+        "history.db-shm",
+        "queue.json",
+        "live_boards.json",
+        "session_state.dat",
         "README.md"
     ]
+    # Per-shard DHT state when session_shards > 1
+    files_to_remove.extend(str(path) for path in sorted(Path('.').glob('session_state.dat.shard*')))
     
     directories_to_remove = [
         "venv",
         "logs",
+        "resume",
+        "bench",
         "temp",
         "__pycache__"
     ]
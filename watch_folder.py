@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Watch Folder
+Picks up .torrent files dropped into a directory (inotify, or polling elsewhere)
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct('iIII')
+
+class Inotify:
+    """Minimal ctypes binding to Linux inotify, watching one directory"""
+    
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        # Files are complete once closed after writing or renamed into place
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno))
+        self.overflowed = False
+    
+    def fileno(self) -> int:
+        """The inotify file descriptor, for loop.add_reader"""
+        return self.fd
+    
+    def read(self) -> List[str]:
+        """Names from every queued event; sets overflowed if the kernel dropped events"""
+        names = []
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(buffer):
+                _, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                offset += EVENT_HEADER.size
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                elif length:
+                    names.append(os.fsdecode(buffer[offset:offset + length].rstrip(b'\0')))
+                offset += length
+    
+    def close(self):
+        """Stop watching"""
+        os.close(self.fd)
+
+class WatchFolder:
+    """Feeds files dropped into a directory to the bot in batches
+    
+    Changes are picked up through inotify on Linux and by rescanning every
+    poll_interval seconds elsewhere (or if inotify cannot be set up). A
+    file is only handed over once its size and mtime have not changed for
+    settle seconds, so files still being written are never read half-way.
+    Everything that settles together goes to on_batch in one call, which
+    returns the files it could not use; those are moved to failed/, the
+    rest to done/. Files already present at start-up are picked up too.
+    """
+    
+    def __init__(
+        self,
+        directory: str,
+        on_batch: Callable[[List[Path]], Awaitable[Set[Path]]],
+        logger: Optional[logging.Logger] = None,
+        settle: float = 2.0,
+        poll_interval: float = 5.0,
+        extensions: Tuple[str, ...] = ('.torrent', '.zip')
+    ):
+        self.directory = Path(directory)
+        self.done_dir = self.directory / 'done'
+        self.failed_dir = self.directory / 'failed'
+        self.on_batch = on_batch
+        self.logger = logger or logging.getLogger(__name__)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.extensions = extensions
+        self.pending: Dict[Path, Tuple[int, float, float]] = {}
+        self.inotify: Optional[Inotify] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.batches = 0
+    
+    def wanted(self, name: str) -> bool:
+        """True for visible files with a watched extension"""
+        return not name.startswith('.') and name.lower().endswith(self.extensions)
+    
+    def note(self, name: str):
+        """Start settling a file"""
+        path = self.directory / name
+        if self.wanted(name) and path not in self.pending:
+            self.pending[path] = (-1, 0.0, time.monotonic())
+    
+    def scan(self):
+        """Note every candidate file in the directory"""
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self.note(entry.name)
+    
+    def settled(self) -> List[Path]:
+        """Files whose size and mtime have not changed for settle seconds"""
+        now = time.monotonic()
+        ready = []
+        for path, (size, mtime, since) in list(self.pending.items()):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            if (stat.st_size, stat.st_mtime) != (size, mtime):
+                self.pending[path] = (stat.st_size, stat.st_mtime, now)
+            elif now - since >= self.settle:
+                del self.pending[path]
+                ready.append(path)
+        return sorted(ready)
+    
+    def _on_readable(self):
+        """Event-loop reader callback for the inotify descriptor"""
+        for name in self.inotify.read():
+            self.note(name)
+        if self.inotify.overflowed:
+            self.inotify.overflowed = False
+            self.logger.warning("Watch folder event queue overflowed, rescanning")
+            self.scan()
+        self.wakeup.set()
+    
+    def move(self, path: Path, target_dir: Path):
+        """Move a processed file aside without overwriting an earlier one of the same name"""
+        target = target_dir / path.name
+        if target.exists():
+            target = target_dir / f"{path.stem}.{datetime.now():%Y%m%d-%H%M%S-%f}{path.suffix}"
+        os.replace(path, target)
+    
+    async def process(self, paths: List[Path]):
+        """Hand a batch to on_batch and file it under done/ or failed/"""
+        self.batches += 1
+        try:
+            failed = await self.on_batch(paths)
+        except Exception as e:
+            self.logger.error(f"Watch folder batch failed: {e}")
+            failed = set(paths)
+        
+        def move_all():
+            for path in paths:
+                try:
+                    self.move(path, self.failed_dir if path in failed else self.done_dir)
+                except OSError as e:
+                    self.logger.error(f"Could not move {path.name} out of the watch folder: {e}")
+        
+        await asyncio.to_thread(move_all)
+    
+    async def run(self):
+        """Watch until cancelled"""
+        loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        for directory in (self.directory, self.done_dir, self.failed_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+        
+        try:
+            self.inotify = Inotify(self.directory)
+            loop.add_reader(self.inotify.fileno(), self._on_readable)
+            self.logger.info(f"Watching {self.directory} with inotify")
+        except (OSError, NotImplementedError) as e:
+            if self.inotify is not None:
+                self.inotify.close()
+            self.inotify = None
+            self.logger.info(f"Watching {self.directory} by polling every {self.poll_interval:.0f}s ({e})")
+        
+        try:
+            self.scan()
+            while True:
+                if self.inotify is None:
+                    self.scan()
+                ready = self.settled()
+                if ready:
+                    await self.process(ready)
+                
+                if self.pending:
+                    timeout = self.settle
+                elif self.inotify is None:
+                    timeout = self.poll_interval
+                else:
+                    timeout = None
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+        finally:
+            if self.inotify is not None:
+                loop.remove_reader(self.inotify.fileno())
+                self.inotify.close()
+                self.inotify = None
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Webhook
+Settings for receiving Telegram updates through a webhook instead of long polling
+"""
+
+import re
+import secrets
+import time
+from typing import Dict, NamedTuple
+from urllib.parse import urlparse
+
+# Telegram only accepts these characters in secret_token, 1-256 of them
+SECRET_TOKEN_RE = re.compile(r'^[A-Za-z0-9_-]{1,256}$')
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# Ports Telegram will deliver webhooks to (on the public URL, i.e. the reverse proxy)
+TELEGRAM_PORTS = (443, 80, 88, 8443)
+
+class WebhookSettings(NamedTuple):
+    """Where the local listener runs and the public URL Telegram posts to"""
+    url: str
+    listen: str
+    port: int
+    url_path: str
+    secret_token: str
+    max_connections: int = 40
+    
+    def start_kwargs(self) -> Dict:
+        """Keyword arguments for Updater.start_webhook"""
+        return {
+            'listen': self.listen,
+            'port': self.port,
+            'url_path': self.url_path,
+            'webhook_url': self.url,
+            'secret_token': self.secret_token,
+            'max_connections': self.max_connections
+        }
+    
+    @property
+    def local_url(self) -> str:
+        """Address of the local listener, for the reverse proxy and test clients"""
+        host = f"[{self.listen}]" if ':' in self.listen else self.listen
+        return f"http://{host}:{self.port}/{self.url_path}"
+
+def load_webhook_settings(section) -> WebhookSettings:
+    """Validate a [webhook] config section; raises ValueError"""
+    url = section.get('url', '').strip()
+    parsed = urlparse(url)
+    if parsed.scheme != 'https' or not parsed.hostname:
+        raise ValueError("url must be the public https:// address of the reverse proxy")
+    if (parsed.port or 443) not in TELEGRAM_PORTS:
+        raise ValueError(f"Telegram only delivers webhooks to ports {', '.join(map(str, TELEGRAM_PORTS))}")
+    
+    secret_token = section.get('secret_token', '').strip()
+    if not SECRET_TOKEN_RE.match(secret_token):
+        raise ValueError("secret_token must be 1-256 characters of A-Z, a-z, 0-9, _ and -")
+    
+    # The listener serves the same path as the public URL unless the proxy rewrites it
+    url_path = section.get('path', '').strip() or parsed.path
+    return WebhookSettings(
+        url=url,
+        listen=section.get('listen', '127.0.0.1').strip(),
+        port=int(section.get('port', 8443)),
+        url_path=url_path.strip('/'),
+        secret_token=secret_token,
+        max_connections=int(section.get('max_connections', 40))
+    )
+
+def generate_secret_token() -> str:
+    """A random secret_token Telegram accepts"""
+    return secrets.token_urlsafe(32)
+
+def command_update(text: str, update_id: int, user_id: int, username: str, chat_id: int) -> Dict:
+    """A minimal Update payload for a text message, as Telegram posts it"""
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'group' if chat_id < 0 else 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': username, 'username': username},
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+            if text.startswith('/') else []
+        }
+    }